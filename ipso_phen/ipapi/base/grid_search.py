@@ -0,0 +1,145 @@
+import os
+import random
+import logging
+import multiprocessing as mp
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(os.path.splitext(__name__)[-1].replace(".", ""))
+
+# Concurrent evaluations, most OpenCV calls release the GIL
+GRID_SEARCH_WORKERS = max(1, min(8, mp.cpu_count()))
+
+
+def decode_grid_search_value(value: str):
+    return int(value) if str.isdigit(value) else value
+
+
+def get_grid_search_combinations(
+    tool,
+    random_sampling: bool = False,
+    max_combinations: int = 0,
+) -> list:
+    """Returns the parameters to evaluate, in itertools.product order
+
+    Combinations are built from their index so that sampling a few of them
+    does not build the whole product.
+
+    Arguments:
+        tool {IptBase} -- tool with grid search options set
+
+    Keyword Arguments:
+        random_sampling {bool} -- draw combinations randomly (default: {False})
+        max_combinations {int} -- maximum combinations, 0 for all (default: {0})
+
+    Returns:
+        list -- one dictionary of parameters by combination
+    """
+    keys = [p.name for p in tool.gizmos]
+    options = [p.decode_grid_search_options() for p in tool.gizmos]
+    total = 1
+    for values in options:
+        total *= len(values)
+    count = total if max_combinations <= 0 else min(total, max_combinations)
+    indexes = random.sample(range(total), count) if random_sampling else range(count)
+
+    def combination_at(index: int) -> dict:
+        values = []
+        for option in reversed(options):
+            index, value_index = divmod(index, len(option))
+            values.append(option[value_index])
+        return {k: decode_grid_search_value(v) for k, v in zip(keys, reversed(values))}
+
+    return [combination_at(i) for i in indexes]
+
+
+def run_grid_search(
+    evaluate,
+    combinations: list,
+    max_workers: int = GRID_SEARCH_WORKERS,
+):
+    """Evaluates combinations on a thread pool
+
+    At most 2 * max_workers evaluations are queued. Closing the generator, by
+    breaking out of the loop for example, cancels those not started.
+
+    Arguments:
+        evaluate {callable} -- called with a parameters dictionary
+        combinations {list} -- parameters dictionaries
+
+    Yields:
+        tuple -- combination index, parameters and evaluate result in completion
+            order, result is None if evaluate raised an exception
+    """
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        pending = {}
+        items = iter(enumerate(combinations))
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and len(pending) < max_workers * 2:
+                    item = next(items, None)
+                    if item is None:
+                        exhausted = True
+                    else:
+                        pending[executor.submit(evaluate, item[1])] = item
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, params = pending.pop(future)
+                    try:
+                        res = future.result()
+                    except Exception as e:
+                        logger.exception(f"Grid search failed for {params}: {repr(e)}")
+                        res = None
+                    yield index, params, res
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def aggregate_grid_search_results(combinations: list, records: list) -> pd.DataFrame:
+    """Summarizes evaluations of each combination over several images
+
+    Arguments:
+        combinations {list} -- parameters dictionaries
+        records {list} -- one dictionary by evaluation with keys "combination"
+            (index in combinations), "luid", "failed", "mask_area" and "elapsed"
+
+    Returns:
+        pd.DataFrame -- one row by combination with parameters, images count,
+            failures count, mask area mean and variance and runtime
+    """
+    by_combination = [[] for _ in combinations]
+    for record in records:
+        by_combination[record["combination"]].append(record)
+    rows = []
+    for index, (params, evaluations) in enumerate(zip(combinations, by_combination)):
+        areas = np.array(
+            [
+                e["mask_area"]
+                for e in evaluations
+                if not e["failed"] and e["mask_area"] is not None
+            ],
+            dtype=np.float64,
+        )
+        times = np.array(
+            [e["elapsed"] for e in evaluations if e["elapsed"] is not None],
+            dtype=np.float64,
+        )
+        rows.append(
+            dict(
+                params,
+                combination=index,
+                images=len(evaluations),
+                failures=sum(1 for e in evaluations if e["failed"]),
+                mask_area_mean=areas.mean() if areas.size else np.nan,
+                mask_area_var=areas.var() if areas.size else np.nan,
+                runtime_mean=times.mean() if times.size else np.nan,
+                runtime_total=times.sum(),
+            )
+        )
+    return pd.DataFrame(rows)
@@ -7,8 +7,12 @@ import ipso_phen.ipapi.file_handlers.fh_base as fh
 class ImageWrapper:
     """Class wrapping an image item importing using the TPMP standard name"""
 
-    def __init__(self, file_path, database):
-        self._file_handler = fh.file_handler_factory(file_path, database)
+    def __init__(self, file_path, database, use_memo: bool = False):
+        self._file_handler = fh.file_handler_factory(
+            file_path,
+            database,
+            use_memo=use_memo,
+        )
 
     def __repr__(self):  # Serialization
         return self.file_path
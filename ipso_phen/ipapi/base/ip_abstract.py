@@ -1,4 +1,5 @@
 import os
+import copy
 from typing import Any, Union
 import logging
 
@@ -20,6 +21,8 @@ from ipso_phen.ipapi.tools.regions import (
     AbstractRegion,
 )
 from ipso_phen.ipapi.tools.common_functions import force_directories
+from ipso_phen.ipapi.tools.image_store import ImageStore, StoredImage
+from ipso_phen.ipapi.tools.distance_map import DistanceMap
 
 matplotlib.use("agg")
 
@@ -32,6 +35,15 @@ KLC_NO_BIG_ENOUGH = dict(val=5, color=ipc.C_FUCHSIA)
 KLC_NO_CLOSE_ENOUGH = dict(val=6, color=ipc.C_ORANGE)
 KLC_OUTSIDE = dict(val=7, color=ipc.C_RED)
 KLC_BIG_ENOUGH_TO_IGNORE_DISTANCE = dict(val=8, color=ipc.C_LIME)
+# Classifications of contours that are kept
+KLC_KEPT = [
+    KLC_FULLY_INSIDE,
+    KLC_OVERLAPS,
+    KLC_PROTECTED_DIST_OK,
+    KLC_PROTECTED_SIZE_OK,
+    KLC_OK_TOLERANCE,
+    KLC_BIG_ENOUGH_TO_IGNORE_DISTANCE,
+]
 
 logger = logging.getLogger(os.path.splitext(__name__)[-1].replace(".", ""))
 
@@ -39,7 +51,7 @@ logger = logging.getLogger(os.path.splitext(__name__)[-1].replace(".", ""))
 class ImageListHolder:
     def __init__(self, file_list, database):
         self.image_list = [
-            file_handler_factory(file_path_, database=database)
+            file_handler_factory(file_path_, database=database, use_memo=True)
             for file_path_ in file_list
         ]
 
@@ -131,6 +143,57 @@ class BaseImageProcessor(ImageWrapper):
         self.image_transformations = []
         self._current_image = self.source_image
 
+    def fork(self):
+        """Returns a copy that can be processed concurrently with this wrapper
+
+        Images are shared as read only views, containers are copied so that
+        changes made to the copy do not affect this wrapper.
+        """
+        # Load images once for all copies
+        _ = self.current_image
+        res = copy.copy(self)
+        res._file_handler = copy.copy(self._file_handler)
+        res._file_handler._shared_checksums = dict(self._file_handler._shared_checksums)
+        res._options = dict(self._options)
+        res.image_list = list(self.image_list)
+        res.forced_storage_images_list = list(self.forced_storage_images_list)
+        res._rois_list = list(self._rois_list)
+        res.data_output = dict(self.data_output)
+        res.image_transformations = list(self.image_transformations)
+        res._built_channels = dict(self._built_channels)
+        res.csv_data_holder = copy.deepcopy(self.csv_data_holder)
+        # Values replaced on the copy are told apart from these by identity
+        res._forked_data = dict(res.csv_data_holder.data_list)
+        return res
+
+    def merge_fork(self, fork):
+        """Adds images, ROIs and data stored on a copy made by fork
+
+        The wrapper must not have changed since the copy was made.
+        """
+        known = {id(dic) for dic in self.image_list}
+        for dic in fork.image_list:
+            if id(dic) not in known:
+                self.image_list.remove_named(dic["name"])
+                self.image_list.append(dic)
+        known = {id(roi) for roi in self._rois_list}
+        self.add_rois(roi_list=[roi for roi in fork._rois_list if id(roi) not in known])
+        forked_data = getattr(fork, "_forked_data", {})
+        self.csv_data_holder.data_list.update(
+            {
+                k: v
+                for k, v in fork.csv_data_holder.data_list.items()
+                if k not in forked_data or forked_data[k] is not v
+            }
+        )
+        self.data_output.update(
+            {
+                k: v
+                for k, v in fork.data_output.items()
+                if k not in self.data_output or self.data_output[k] is not v
+            }
+        )
+
     def init_csv_writer(self):
         """Creates a csv writer with the variables specified in the class
         child classes should override this method
@@ -531,28 +594,31 @@ class BaseImageProcessor(ImageWrapper):
         :param text_overlay: Text to be printed on top of stored image
         :param force_store: Bypass storage options
         :return: Dictionary containing stored image data
+
+        Image may be a function returning the image, it is only called if the
+        image is stored, so that debug images cost nothing when discarded.
         """
 
+        is_stored = self.is_kept_image(text, force_store=force_store)
+
         if self.owner is not None:
             target = self.owner
             text = f"{self.angle}_{self.wavelength}_{text}"
         else:
             target = self
 
-        for dic in target.image_list:
-            if dic["name"].lower() == text:
-                target.image_list.remove(dic)
+        target.image_list.remove_named(text)
 
-        if (
-            (text and (target.store_images or (text.lower() == "mosaic")))
-            or force_store
-            or (text in self.forced_storage_images_list)
-        ):
-            # Create dummy image if issue
-            if image is not None:
+        if is_stored:
+            if callable(image):
+                image = image()
+            # Create dummy image if issue, read only images are shared
+            if image is None:
+                cp = np.full((100, 100, 3), ipc.C_FUCHSIA, np.uint8)
+            elif image.flags.writeable or rois or text_overlay:
                 cp = image.copy()
             else:
-                cp = np.full((100, 100, 3), ipc.C_FUCHSIA, np.uint8)
+                cp = image
 
             # Ensure image is 3D
             if (rois or text_overlay) and (
@@ -581,7 +647,7 @@ class BaseImageProcessor(ImageWrapper):
                     fnt_color=font_color,
                 )
 
-            new_dict = dict(name=text, image=cp, written=False)
+            new_dict = StoredImage(name=text, image=cp, written=False)
             target.image_list.append(new_dict)
             if target.write_images == "plot":
                 target.plot_image(img_dict=new_dict, destroy_window=True)
@@ -709,9 +775,9 @@ class BaseImageProcessor(ImageWrapper):
         if dict_name.lower() == "":
             return None
         else:
-            for dic in self.image_list:
-                if dic["name"].lower() == dict_name.lower():
-                    return dic
+            dic = self.image_list.get_named(dict_name)
+            if dic is not None:
+                return dic
             if dict_name.lower() == "source":
                 return self.store_image(self.source_image, "source")
             if dict_name.lower() == "mask":
@@ -835,12 +901,10 @@ class BaseImageProcessor(ImageWrapper):
         :return mask: numpy array
         """
 
-        ori_img = np.copy(img)
-        if len(ori_img.shape) == 2:
-            ori_img = np.dstack((ori_img, ori_img, ori_img))
-            mask = np.zeros_like(a=ori_img, dtype=np.uint8)
+        if len(img.shape) == 2:
+            mask = np.zeros(img.shape + (3,), dtype=np.uint8)
         else:
-            mask = np.zeros_like(a=ori_img[:, :, 0], dtype=np.uint8)
+            mask = np.zeros(img.shape[:2], dtype=np.uint8)
 
         stack = np.zeros((len(contours), 1))
 
@@ -855,7 +919,8 @@ class BaseImageProcessor(ImageWrapper):
             group = np.vstack([contours[i] for i in ids])
             cv2.drawContours(mask, contours, -1, 255, -1, hierarchy=hierarchy)
 
-            if self.store_images:
+            if self.is_kept_image("objcomp"):
+                ori_img = img if len(img.shape) == 3 else np.dstack((img, img, img))
                 dbg_img = self.draw_image(
                     src_image=ori_img,
                     src_mask=mask,
@@ -890,7 +955,9 @@ class BaseImageProcessor(ImageWrapper):
         """
 
         obj, mask = self.prepare_analysis(
-            self.draw_image(src_mask=mask, background="silver", foreground="source"),
+            lambda: self.draw_image(
+                src_mask=mask, background="silver", foreground="source"
+            ),
             mask,
         )
 
@@ -1104,8 +1171,10 @@ class BaseImageProcessor(ImageWrapper):
                     n = int(n)
                     if kind.lower() == "width":
                         msk_dt = ipc.MaskData(mask)
-                        qtl_img = np.zeros_like(mask)
-                        qtl_img = np.dstack((qtl_img, qtl_img, qtl_img))
+                        draw_quantiles = self.is_kept_image(f"quantiles_width_{n}")
+                        if draw_quantiles:
+                            qtl_img = np.zeros_like(mask)
+                            qtl_img = np.dstack((qtl_img, qtl_img, qtl_img))
                         for i in range(n):
                             (
                                 total_,
@@ -1137,6 +1206,8 @@ class BaseImageProcessor(ImageWrapper):
                             self.csv_data_holder.update_csv_value(
                                 f"quantile_width_{i + 1}_{n}_std_{kind}", std_, True
                             )
+                            if not draw_quantiles:
+                                continue
                             p_qt_msk = msk_dt.height_quantile_mask(
                                 total=n, index=i, colour=int((i + 1) / (n + 1) * 255)
                             )
@@ -1146,7 +1217,8 @@ class BaseImageProcessor(ImageWrapper):
                                     (np.zeros_like(mask), p_qt_msk, np.zeros_like(mask))
                                 ),
                             )
-                        self.store_image(qtl_img, f"quantiles_width_{n}")
+                        if draw_quantiles:
+                            self.store_image(qtl_img, f"quantiles_width_{n}")
 
                         self.csv_data_holder.data_list.pop(k, None)
         else:
@@ -1389,37 +1461,51 @@ class BaseImageProcessor(ImageWrapper):
         ):
             return True
 
-        masked = cv2.bitwise_and(img, img, mask=mask)
+        # Masked pixels are extracted once, visible channels are computed from them
+        foreground = mask > 0
+        pixels = img[foreground] if len(img.shape) == 3 else None
+        space_pixels = {}
+
+        def get_masked_values(channel):
+            if pixels is not None and channel in ipc.CHANNEL_PLANES:
+                color_space, index = ipc.CHANNEL_PLANES[channel]
+                if color_space not in space_pixels:
+                    space_pixels[color_space] = ipc.convert_pixels(pixels, color_space)
+                return space_pixels[color_space][:, index]
+            if "masked" not in space_pixels:
+                space_pixels["masked"] = cv2.bitwise_and(img, img, mask=mask)
+            data = self.get_channel(src_img=space_pixels["masked"], channel=channel)
+            return None if data is None else data[foreground]
 
         channel_data = {}
         for c in self.file_handler.channels_data:
+            values = get_masked_values(c["ck"])
             channel_data[c["ck"]] = dict(
                 color_space=c["cs"],
                 channel_name=c["cn"],
-                data=self.get_channel(src_img=masked, channel=c["ck"]),
+                counts=None
+                if values is None
+                else np.bincount(values.ravel(), minlength=256),
                 graph_color=ipc.channel_color(c["ck"]),
             )
 
         self.csv_data_holder.update_csv_value("hist_bins", f"{256}")
 
         for k, v in channel_data.items():
-            if v["data"] is None:
+            if v["counts"] is None:
                 logger.warning(f"Missing channel {ipc.get_hr_channel_name(k)}")
                 continue
-            tmp_tuple = cv2.meanStdDev(
-                src=v["data"].reshape(v["data"].shape[1] * v["data"].shape[0]),
-                mask=mask.reshape(mask.shape[1] * mask.shape[0]),
-            )
-            v["hist"] = cv2.calcHist([v["data"]], [0], mask, [256], [0, (256 - 1)])
+            mean, std_dev = ipc.mean_std_from_counts(v["counts"])
+            v["hist"] = ipc.histogram_from_counts(v["counts"], 256)
             seed_ = f'{v["color_space"]}_{k}'
             self.csv_data_holder.update_csv_value(
                 key=f"{seed_}_std_dev",
-                value=tmp_tuple[1][0][0],
+                value=std_dev,
                 force_pair=self.csv_data_holder.has_csv_key("color_std_dev"),
             )
             self.csv_data_holder.update_csv_value(
                 key=f"{seed_}_mean",
-                value=tmp_tuple[0][0][0],
+                value=mean,
                 force_pair=self.csv_data_holder.has_csv_key("color_mean"),
             )
 
@@ -1433,7 +1519,7 @@ class BaseImageProcessor(ImageWrapper):
         if self.store_images:
             fig = plt.figure(figsize=(10, 10), dpi=100)
             for k, v in channel_data.items():
-                if v["data"] is None:
+                if v["counts"] is None:
                     continue
                 plt.plot(v["hist"], label=v["channel_name"])
                 plt.xlim([0, 256 - 1])
@@ -1471,15 +1557,15 @@ class BaseImageProcessor(ImageWrapper):
                 *_, n = k.split("_")
                 n = int(n)
                 for c, v in channel_data.items():
-                    if v["data"] is None:
+                    if v["counts"] is None:
                         logger.warning(
                             f'Missing channel {v["color_space"]}, {v["channel_name"]}'
                         )
                         continue
                     seed_ = f'{v["color_space"]}_{c}'
-                    hist = cv2.calcHist([v["data"]], [0], mask, [n], [0, (256 - 1)])
+                    hist = ipc.histogram_from_counts(v["counts"], n)
                     total_pixels = np.sum(hist)
-                    for i, qtt in enumerate([hist_val[0] for hist_val in hist]):
+                    for i, qtt in enumerate(hist):
                         self.csv_data_holder.update_csv_value(
                             f"quantile_color_{seed_}_{i + 1}_{n}_percent",
                             qtt / total_pixels * 100,
@@ -1607,42 +1693,28 @@ class BaseImageProcessor(ImageWrapper):
         """
 
         def last_chance_(test_cnt):
-            roi = self.get_roi(roi_name=safe_roi, exists_only=True)
-
-            ok_size = (tolerance_area is not None) and (
-                (tolerance_area < 0) or cv2.contourArea(test_cnt) >= tolerance_area
-            )
-            if ok_size and keep_safe_big_enough and roi.intersects_contour(test_cnt):
-                return KLC_PROTECTED_SIZE_OK
-
-            ok_dist = (tolerance_distance is not None) and (
-                tolerance_distance < 0 or min_dist <= tolerance_distance
+            return self._classify_outside_hull(
+                test_cnt=test_cnt,
+                area=cv2.contourArea(test_cnt),
+                min_dist=min_dist,
+                roi=self.get_roi(roi_name=safe_roi, exists_only=True),
+                tolerance_area=tolerance_area,
+                tolerance_distance=tolerance_distance,
+                keep_safe_close_enough=keep_safe_close_enough,
+                keep_safe_big_enough=keep_safe_big_enough,
+                area_override_size=area_override_size,
             )
-            if ok_dist and keep_safe_close_enough and roi.intersects_contour(test_cnt):
-                return KLC_PROTECTED_DIST_OK
-
-            if ok_size and ok_dist:
-                return KLC_OK_TOLERANCE
-            elif (
-                area_override_size > 0
-                and cv2.contourArea(test_cnt) > area_override_size
-            ):
-                return KLC_BIG_ENOUGH_TO_IGNORE_DISTANCE
-            elif not ok_size and not ok_dist:
-                return KLC_OUTSIDE
-            elif not ok_size:
-                return KLC_NO_BIG_ENOUGH
-            elif not ok_dist:
-                return KLC_NO_CLOSE_ENOUGH
 
         # Check hull intersection
         if (dilation_iter < 0) and (
             cv2.contourArea(cmp_hull) > cv2.contourArea(master_hull)
         ):
-            cmp_img = np.full(mask.shape, 0, np.uint8)
-            cv2.drawContours(cmp_img, [cmp_hull], -1, 255, -1)
-            master_img = np.full(mask.shape, 0, np.uint8)
-            cv2.drawContours(master_img, [master_hull], -1, 255, -1)
+            # Both hulls are drawn in the rectangle holding them
+            x, y, w, h = cv2.boundingRect(np.concatenate((cmp_hull, master_hull)))
+            cmp_img = np.full((h, w), 0, np.uint8)
+            cv2.drawContours(cmp_img, [cmp_hull], -1, 255, -1, offset=(-x, -y))
+            master_img = np.full((h, w), 0, np.uint8)
+            cv2.drawContours(master_img, [master_hull], -1, 255, -1, offset=(-x, -y))
             test_img = cv2.bitwise_and(cmp_img, cmp_img, mask=master_img)
             if np.array_equal(test_img, cmp_img):
                 return KLC_FULLY_INSIDE
@@ -1684,6 +1756,221 @@ class BaseImageProcessor(ImageWrapper):
         else:
             return last_chance_(cmp_hull)
 
+    @staticmethod
+    def _classify_outside_hull(
+        test_cnt,
+        area,
+        min_dist,
+        roi,
+        tolerance_area,
+        tolerance_distance,
+        keep_safe_close_enough,
+        keep_safe_big_enough,
+        area_override_size,
+    ):
+        """Classifies a hull with no point inside its master hull
+
+        Arguments:
+            test_cnt {numpy array} -- hull to classify
+            area {float} -- area of test_cnt
+            min_dist {float} -- distance from test_cnt to master hull
+            roi {AbstractRegion} -- safe ROI, None if missing
+
+        Returns:
+            dict -- KLC_* classification
+        """
+        ok_size = (tolerance_area is not None) and (
+            (tolerance_area < 0) or area >= tolerance_area
+        )
+        if ok_size and keep_safe_big_enough and roi.intersects_contour(test_cnt):
+            return KLC_PROTECTED_SIZE_OK
+
+        ok_dist = (tolerance_distance is not None) and (
+            tolerance_distance < 0 or min_dist <= tolerance_distance
+        )
+        if ok_dist and keep_safe_close_enough and roi.intersects_contour(test_cnt):
+            return KLC_PROTECTED_DIST_OK
+
+        if ok_size and ok_dist:
+            return KLC_OK_TOLERANCE
+        elif area_override_size > 0 and area > area_override_size:
+            return KLC_BIG_ENOUGH_TO_IGNORE_DISTANCE
+        elif not ok_size and not ok_dist:
+            return KLC_OUTSIDE
+        elif not ok_size:
+            return KLC_NO_BIG_ENOUGH
+        elif not ok_dist:
+            return KLC_NO_CLOSE_ENOUGH
+
+    def classify_hulls(
+        self,
+        mask,
+        cmp_hulls,
+        master_hulls,
+        tolerance_area=None,
+        tolerance_distance=None,
+        dilation_iter=0,
+        keep_safe_close_enough=False,
+        keep_safe_big_enough=False,
+        safe_roi=None,
+        area_override_size=0,
+    ) -> list:
+        """Compares hulls to a group of master hulls, rules are those of check_hull
+
+        Masters are drawn once, hull points are looked up in the drawing and their
+        distances in its distance transform instead of testing every pair of points.
+        A hull is kept if check_hull would keep it against any of the masters.
+
+        Arguments:
+            mask {numpy array} -- mask the hulls were extracted from
+            cmp_hulls {list} -- hulls to be compared
+            master_hulls {list} -- master hulls
+
+        Returns:
+            list -- KLC_* classification of each hull of cmp_hulls
+        """
+        if len(cmp_hulls) == 0:
+            return []
+
+        # Only the rectangle holding all hulls is drawn
+        left, top, width, height = cv2.boundingRect(
+            np.concatenate(list(cmp_hulls) + list(master_hulls))
+        )
+        # Drawn one by one, filling all at once leaves nested hulls empty
+        master_ids = np.full((height, width), -1, dtype=np.int32)
+        for i, hull in enumerate(master_hulls):
+            cv2.drawContours(master_ids, [hull], 0, i, -1, offset=(-left, -top))
+        master_img = (master_ids >= 0).astype(np.uint8) * 255
+
+        points = np.concatenate([hull.reshape(-1, 2) for hull in cmp_hulls])
+        points -= (left, top)
+        points_count = np.array([len(hull) for hull in cmp_hulls])
+        starts = np.concatenate(([0], np.cumsum(points_count)[:-1]))
+        lefts = np.minimum.reduceat(points[:, 0], starts)
+        tops = np.minimum.reduceat(points[:, 1], starts)
+        rights = np.maximum.reduceat(points[:, 0], starts) + 1
+        bottoms = np.maximum.reduceat(points[:, 1], starts) + 1
+        points_inside = master_img[points[:, 1], points[:, 0]] > 0
+        inside_count = np.add.reduceat(points_inside.astype(np.int32), starts)
+        areas = [cv2.contourArea(hull) for hull in cmp_hulls]
+
+        # Drawn hulls hold pixels up to a pixel outside of their polygon, points on
+        # their edge are checked against the polygon drawn there
+        inner_img = cv2.erode(master_img, np.ones((3, 3), np.uint8))
+        on_edge = points_inside & (inner_img[points[:, 1], points[:, 0]] == 0)
+        off_polygon = np.zeros(len(points), dtype=np.int32)
+        for j in np.flatnonzero(on_edge):
+            x, y = int(points[j, 0]), int(points[j, 1])
+            off_polygon[j] = (
+                cv2.pointPolygonTest(
+                    master_hulls[master_ids[y, x]], (x + left, y + top), False
+                )
+                < 0
+            )
+        uncertain = np.add.reduceat(off_polygon, starts) > 0
+
+        # Distances are only needed for hulls with all points outside and only
+        # compared to tolerance_distance, farther masters can be ignored
+        min_dists = np.full(len(cmp_hulls), np.inf)
+        if (
+            (tolerance_distance is not None)
+            and (tolerance_distance >= 0)
+            and np.any(inside_count == 0)
+        ):
+            outside = np.flatnonzero(inside_count == 0)
+            min_dists[outside] = DistanceMap.from_mask(
+                master_img, offset=(left, top)
+            ).min_distances(
+                [cmp_hulls[i] for i in outside], max_distance=tolerance_distance
+            )
+            uncertain |= np.abs(min_dists - tolerance_distance) <= 1
+
+        # With erosion, a hull bigger than a master it encloses overlaps it
+        encloses = np.zeros(len(cmp_hulls), dtype=bool)
+        if dilation_iter < 0:
+            areas_map = np.full((height, width), np.inf, dtype=np.float32)
+            for hull in master_hulls:
+                x, y, w, h = cv2.boundingRect(hull)
+                fill = np.zeros((h, w), dtype=np.uint8)
+                cv2.drawContours(fill, [hull], 0, 255, -1, offset=(-x, -y))
+                hull_areas = areas_map[y - top : y - top + h, x - left : x - left + w]
+                hull_areas[fill > 0] = np.minimum(
+                    hull_areas[fill > 0], cv2.contourArea(hull)
+                )
+            for i, hull in enumerate(cmp_hulls):
+                if inside_count[i] > 0:
+                    continue
+                hull_areas = areas_map[tops[i] : bottoms[i], lefts[i] : rights[i]]
+                if hull_areas.min() >= areas[i]:
+                    continue
+                fill = np.zeros(hull_areas.shape, dtype=np.uint8)
+                cv2.drawContours(
+                    fill,
+                    [hull],
+                    0,
+                    255,
+                    -1,
+                    offset=(-left - int(lefts[i]), -top - int(tops[i])),
+                )
+                encloses[i] = np.any(hull_areas[fill > 0] < areas[i])
+
+        if keep_safe_close_enough or keep_safe_big_enough:
+            roi = self.get_roi(roi_name=safe_roi, exists_only=True)
+        else:
+            roi = None
+        master_boxes = [
+            (x - left, y - top, w, h)
+            for x, y, w, h in (cv2.boundingRect(hull) for hull in master_hulls)
+        ]
+        gap = 2 if tolerance_distance is None else max(tolerance_distance, 0) + 2
+        res = []
+        for i, hull in enumerate(cmp_hulls):
+            if inside_count[i] == points_count[i]:
+                res.append(KLC_FULLY_INSIDE)
+            elif inside_count[i] > 0 or encloses[i]:
+                res.append(KLC_OVERLAPS)
+            else:
+                res.append(
+                    self._classify_outside_hull(
+                        test_cnt=hull,
+                        area=areas[i],
+                        min_dist=min_dists[i],
+                        roi=roi,
+                        tolerance_area=tolerance_area,
+                        tolerance_distance=tolerance_distance,
+                        keep_safe_close_enough=keep_safe_close_enough,
+                        keep_safe_big_enough=keep_safe_big_enough,
+                        area_override_size=area_override_size,
+                    )
+                )
+            if not uncertain[i]:
+                continue
+            # Close call, compare hull to the polygons of the masters around it
+            pair_results = [
+                self.check_hull(
+                    mask=mask,
+                    cmp_hull=hull,
+                    master_hull=master_hull,
+                    tolerance_area=tolerance_area,
+                    tolerance_distance=tolerance_distance,
+                    dilation_iter=dilation_iter,
+                    keep_safe_close_enough=keep_safe_close_enough,
+                    keep_safe_big_enough=keep_safe_big_enough,
+                    safe_roi=safe_roi,
+                    area_override_size=area_override_size,
+                )
+                for master_hull, (x, y, w, h) in zip(master_hulls, master_boxes)
+                if x - gap < rights[i]
+                and lefts[i] < x + w + gap
+                and y - gap < bottoms[i]
+                and tops[i] < y + h + gap
+            ]
+            if pair_results:
+                res[i] = next(
+                    (pr for pr in pair_results if pr in KLC_KEPT), pair_results[-1]
+                )
+        return res
+
     # @time_method
     def keep_biggest_contour(self, **kwargs):
         """
@@ -1705,6 +1992,8 @@ class BaseImageProcessor(ImageWrapper):
                 f'Source & mask are mandatory for keep linked contours "{str(self)}'
             )
             return None
+        # Contours are drawn on the source image
+        src_image = src_image.copy()
         dilation_iter = kwargs.get("dilation_iter", 0)
         roi = kwargs.get("roi", self.get_roi("main_roi"))
         root_position = kwargs.get("root_position", "BOTTOM_CENTER")
@@ -1726,12 +2015,12 @@ class BaseImageProcessor(ImageWrapper):
             mask=dil_mask, retrieve_mode=cv2.RETR_LIST, method=cv2.CHAIN_APPROX_SIMPLE
         )
         self.store_image(
-            cv2.drawContours(dil_mask.copy(), contours, -1, ipc.C_LIME, 2, 8),
+            lambda: cv2.drawContours(dil_mask.copy(), contours, -1, ipc.C_LIME, 2, 8),
             "img_dilated_cnt",
         )
 
         self.store_image(
-            cv2.drawContours(src_image.copy(), contours, -1, ipc.C_GREEN, 2, 8),
+            lambda: cv2.drawContours(src_image.copy(), contours, -1, ipc.C_GREEN, 2, 8),
             "src_img_with_cnt",
         )
 
@@ -1740,9 +2029,10 @@ class BaseImageProcessor(ImageWrapper):
         eps = 0.001
         for cnt in contours:
             hulls.append(cv2.approxPolyDP(cnt, eps * cv2.arcLength(cnt, True), True))
-        hull_img = src_image.copy()
-        cv2.drawContours(hull_img, hulls, -1, (0, 255, 0), 4)
-        self.store_image(hull_img, "src_img_with_cnt_approx_{}".format(eps))
+        self.store_image(
+            lambda: cv2.drawContours(src_image.copy(), hulls, -1, (0, 255, 0), 4),
+            "src_img_with_cnt_approx_{}".format(eps),
+        )
 
         # Find the largest hull
         main_hull = hulls[0]
@@ -1753,19 +2043,28 @@ class BaseImageProcessor(ImageWrapper):
             else:
                 dist_max = math.sqrt(roi.width**2 + roi.height**2)
 
-            hull_img = src_image.copy()
+            if self.is_kept_image("src_img_with_cnt_distance_map"):
+                hull_img = src_image.copy()
+            else:
+                hull_img = None
             max_area = 0
             for hull in hulls:
                 morph_dict = self.get_distance_data(hull, roi_root, dist_max)
                 cl_cmp = morph_dict["dist_scaled_inverted"] * 255
-                cv2.drawContours(
-                    hull_img, [hull], 0, (0, int(cl_cmp), int((1 - cl_cmp) * 255)), 2
-                )
+                if hull_img is not None:
+                    cv2.drawContours(
+                        hull_img,
+                        [hull],
+                        0,
+                        (0, int(cl_cmp), int((1 - cl_cmp) * 255)),
+                        2,
+                    )
                 if morph_dict["scaled_area"] > max_area:
                     max_area = morph_dict["scaled_area"]
                     main_hull = hull
 
-            self.store_image(hull_img, "src_img_with_cnt_distance_map")
+            if hull_img is not None:
+                self.store_image(hull_img, "src_img_with_cnt_distance_map")
         else:  # No ROI defined
             max_area = cv2.contourArea(hulls[0])
             for i, hull in enumerate(hulls):
@@ -1778,29 +2077,29 @@ class BaseImageProcessor(ImageWrapper):
         contours = ipc.get_contours(
             mask=src_mask, retrieve_mode=cv2.RETR_LIST, method=cv2.CHAIN_APPROX_SIMPLE
         )
-        for cnt in contours:
-            hull = cv2.approxPolyDP(cnt, eps * cv2.arcLength(cnt, True), True)
-            res = self.check_hull(
-                mask=src_mask,
-                cmp_hull=hull,
-                master_hull=main_hull,
-                dilation_iter=dilation_iter,
-                keep_safe_big_enough=keep_safe_big_enough,
-                keep_safe_close_enough=keep_safe_close_enough,
-                safe_roi=safe_roi_name,
-            )
-            if res in [
-                KLC_FULLY_INSIDE,
-                KLC_OVERLAPS,
-                KLC_PROTECTED_DIST_OK,
-                KLC_PROTECTED_SIZE_OK,
-                KLC_OK_TOLERANCE,
-                KLC_BIG_ENOUGH_TO_IGNORE_DISTANCE,
-            ]:
-                cv2.drawContours(src_image, [cnt], 0, (0, 255, 0), 2)
-            else:
-                cv2.drawContours(src_image, [cnt], 0, (0, 0, 255), 2)
-                cv2.drawContours(src_mask, [cnt], 0, (0, 0, 0), -1)
+        results = self.classify_hulls(
+            mask=src_mask,
+            cmp_hulls=[
+                cv2.approxPolyDP(cnt, eps * cv2.arcLength(cnt, True), True)
+                for cnt in contours
+            ],
+            master_hulls=[main_hull],
+            dilation_iter=dilation_iter,
+            keep_safe_big_enough=keep_safe_big_enough,
+            keep_safe_close_enough=keep_safe_close_enough,
+            safe_roi=safe_roi_name,
+        )
+        rejected = [i for i, res in enumerate(results) if res not in KLC_KEPT]
+        cv2.drawContours(
+            src_image,
+            [cnt for cnt, res in zip(contours, results) if res in KLC_KEPT],
+            -1,
+            (0, 255, 0),
+            2,
+        )
+        cv2.drawContours(src_image, [contours[i] for i in rejected], -1, (0, 0, 255), 2)
+        for i in rejected:
+            cv2.drawContours(src_mask, [contours[i]], 0, (0, 0, 0), -1)
 
         self.store_image(src_image, "img_wth_tagged_cnt", force_store=True)
         self.store_image(src_mask, "mask_lnk_cnts")
@@ -1833,6 +2132,8 @@ class BaseImageProcessor(ImageWrapper):
                 f'Source & mask are mandatory for keep linked contours "{str(self)}',
             )
             return None
+        # Contours are drawn on the source image
+        src_image = src_image.copy()
         dilation_iter = kwargs.get("dilation_iter", 0)
         tolerance_distance = kwargs.get("tolerance_distance", 0)
         tolerance_area = kwargs.get("tolerance_area", 0)
@@ -1860,13 +2161,17 @@ class BaseImageProcessor(ImageWrapper):
                 retrieve_mode=cv2.RETR_LIST,
                 method=cv2.CHAIN_APPROX_SIMPLE,
             )
-            small_img = src_mask.copy()
-            small_img = np.dstack((small_img, small_img, small_img))
+            if self.is_kept_image("small_removed_mask"):
+                small_img = np.dstack((src_mask, src_mask, src_mask))
+            else:
+                small_img = None
             for cnt in contours:
                 area_ = cv2.contourArea(cnt)
                 if area_ < delete_all_bellow:
                     # Delete
                     cv2.drawContours(src_mask, [cnt], 0, (0, 0, 0), -1)
+                    if small_img is None:
+                        continue
                     # Print debug image
                     x, y, w, h = cv2.boundingRect(cnt)
                     x += w // 2 - 10
@@ -1881,9 +2186,10 @@ class BaseImageProcessor(ImageWrapper):
                         ipc.C_FUCHSIA,
                         2,
                     )
-                else:
+                elif small_img is not None:
                     cv2.drawContours(small_img, [cnt], -1, ipc.C_GREEN, -1)
-            self.store_image(small_img, "small_removed_mask")
+            if small_img is not None:
+                self.store_image(small_img, "small_removed_mask")
 
         if dilation_iter > 0:
             dil_mask = self.dilate(src_mask, proc_times=dilation_iter)
@@ -1898,7 +2204,7 @@ class BaseImageProcessor(ImageWrapper):
             method=cv2.CHAIN_APPROX_SIMPLE,
         )
         self.store_image(
-            cv2.drawContours(dil_mask.copy(), contours, -1, ipc.C_LIME, 2, 8),
+            lambda: cv2.drawContours(dil_mask.copy(), contours, -1, ipc.C_LIME, 2, 8),
             "img_dilated_cnt",
         )
 
@@ -1910,17 +2216,20 @@ class BaseImageProcessor(ImageWrapper):
             )
             return None
 
-        img_cnt = cv2.drawContours(src_image.copy(), contours, -1, ipc.C_GREEN, 2, 8)
-        self.store_image(img_cnt, "src_img_with_cnt")
+        self.store_image(
+            lambda: cv2.drawContours(src_image.copy(), contours, -1, ipc.C_GREEN, 2, 8),
+            "src_img_with_cnt",
+        )
 
         # Transform all contours into approximations
         hulls = []
         eps = 0.001
         for cnt in contours:
             hulls.append(cv2.approxPolyDP(cnt, eps * cv2.arcLength(cnt, True), True))
-        hull_img = src_image.copy()
-        cv2.drawContours(hull_img, hulls, -1, (0, 255, 0), 4)
-        self.store_image(hull_img, "src_img_with_cnt_approx_{}".format(eps))
+        self.store_image(
+            lambda: cv2.drawContours(src_image.copy(), hulls, -1, (0, 255, 0), 4),
+            "src_img_with_cnt_approx_{}".format(eps),
+        )
 
         # Find the largest hull
         big_hull = hulls[0]
@@ -1932,30 +2241,35 @@ class BaseImageProcessor(ImageWrapper):
             else:
                 dist_max = math.sqrt(roi.width**2 + roi.height**2)
 
-            hull_img = src_image.copy()
+            if self.is_kept_image("src_img_with_cnt_distance_map"):
+                hull_img = src_image.copy()
+            else:
+                hull_img = None
             max_area = 0
             for i, hull in enumerate(hulls):
 
                 morph_dict = self.get_distance_data(hull, roi_root, dist_max)
                 # cnt_data.append(morph_dict)
 
-                cv2.drawContours(
-                    hull_img,
-                    [hull],
-                    0,
-                    (
+                if hull_img is not None:
+                    cv2.drawContours(
+                        hull_img,
+                        [hull],
                         0,
-                        int(morph_dict["dist_scaled_inverted"] * 255),
-                        int((1 - morph_dict["dist_scaled_inverted"]) * 255),
-                    ),
-                    2,
-                )
+                        (
+                            0,
+                            int(morph_dict["dist_scaled_inverted"] * 255),
+                            int((1 - morph_dict["dist_scaled_inverted"]) * 255),
+                        ),
+                        2,
+                    )
                 if morph_dict["scaled_area"] > max_area:
                     max_area = morph_dict["scaled_area"]
                     big_hull = hull
                     big_idx = i
 
-            self.store_image(hull_img, "src_img_with_cnt_distance_map")
+            if hull_img is not None:
+                self.store_image(hull_img, "src_img_with_cnt_distance_map")
         else:  # No ROI defined
             max_area = cv2.contourArea(hulls[0])
             for i, hull in enumerate(hulls):
@@ -1966,112 +2280,75 @@ class BaseImageProcessor(ImageWrapper):
                     big_idx = i
         # parse all hulls and switch
         good_hulls = [hulls.pop(big_idx)]
+        hull_kwargs = dict(
+            mask=src_mask,
+            tolerance_area=tolerance_area,
+            tolerance_distance=tolerance_distance,
+            dilation_iter=dilation_iter,
+            keep_safe_big_enough=keep_safe_big_enough,
+            keep_safe_close_enough=keep_safe_close_enough,
+            safe_roi=safe_roi_name,
+            area_override_size=area_override_size,
+        )
+        results = self.classify_hulls(
+            cmp_hulls=hulls, master_hulls=good_hulls, **hull_kwargs
+        )
         unknown_hulls = []
-        hull_img = src_image.copy()
-        cv2.drawContours(hull_img, [good_hulls[0]], 0, (0, 255, 0), 4)
-
-        while len(hulls) > 0:
-            hull = hulls.pop()
-            res = self.check_hull(
-                mask=src_mask,
-                cmp_hull=hull,
-                master_hull=big_hull,
-                tolerance_area=tolerance_area,
-                tolerance_distance=tolerance_distance,
-                dilation_iter=dilation_iter,
-                keep_safe_big_enough=keep_safe_big_enough,
-                keep_safe_close_enough=keep_safe_close_enough,
-                safe_roi=safe_roi_name,
-                area_override_size=area_override_size,
-            )
-            cv2.drawContours(hull_img, [hull], 0, res["color"], 2)
+        for hull, res in zip(hulls, results):
             if res == KLC_FULLY_INSIDE:
                 pass
-            elif res in [
-                KLC_OVERLAPS,
-                KLC_PROTECTED_DIST_OK,
-                KLC_PROTECTED_SIZE_OK,
-                KLC_OK_TOLERANCE,
-                KLC_BIG_ENOUGH_TO_IGNORE_DISTANCE,
-            ]:
+            elif res in KLC_KEPT:
                 good_hulls.append(hull)
             else:
                 unknown_hulls.append(hull)
 
-        safe_roi = self.get_roi("safe", exists_only=True)
-        if safe_roi is not None:
-            hull_img = safe_roi.draw_to(dst_img=hull_img, line_width=self.width // 200)
-        self.store_image(hull_img, "src_img_with_cnt_as_hull_init")
+        if self.is_kept_image("src_img_with_cnt_as_hull_init"):
+            hull_img = src_image.copy()
+            cv2.drawContours(hull_img, [big_hull], 0, (0, 255, 0), 4)
+            for hull, res in zip(hulls, results):
+                cv2.drawContours(hull_img, [hull], 0, res["color"], 2)
+            safe_roi = self.get_roi("safe", exists_only=True)
+            if safe_roi is not None:
+                hull_img = safe_roi.draw_to(
+                    dst_img=hull_img, line_width=self.width // 200
+                )
+            self.store_image(hull_img, "src_img_with_cnt_as_hull_init")
 
-        hull_img = src_image.copy()
-        cv2.drawContours(hull_img, good_hulls, -1, KLC_FULLY_INSIDE["color"], 4)
-        self.store_image(hull_img, "init_good_hulls")
+        self.store_image(
+            lambda: cv2.drawContours(
+                src_image.copy(), good_hulls, -1, KLC_FULLY_INSIDE["color"], 4
+            ),
+            "init_good_hulls",
+        )
         # Try to aggregate unknown hulls to good hulls
+        iter_count = 1
         stable = False
-        while not stable:
-            stable = True
-            i = 0
-            iter_count = 1
-            hull_img = src_image.copy()
-            while i < len(unknown_hulls):
-                hull = unknown_hulls[i]
-                res = KLC_OUTSIDE
-                for good_hull in good_hulls:
-                    res = self.check_hull(
-                        mask=src_mask,
-                        cmp_hull=hull,
-                        master_hull=good_hull,
-                        tolerance_area=tolerance_area,
-                        tolerance_distance=tolerance_distance,
-                        dilation_iter=dilation_iter,
-                        keep_safe_big_enough=keep_safe_big_enough,
-                        keep_safe_close_enough=keep_safe_close_enough,
-                        safe_roi=safe_roi_name,
-                        area_override_size=area_override_size,
-                    )
-                    if res == KLC_FULLY_INSIDE:
-                        del unknown_hulls[i]
-                        stable = False
-                        break
-                    elif res in [
-                        KLC_PROTECTED_SIZE_OK,
-                        KLC_PROTECTED_DIST_OK,
-                        KLC_OVERLAPS,
-                        KLC_OK_TOLERANCE,
-                        KLC_BIG_ENOUGH_TO_IGNORE_DISTANCE,
-                    ]:
-                        draw_hull = unknown_hulls.pop(i)
-                        good_hulls.append(draw_hull)
-                        cv2.drawContours(hull_img, [draw_hull], -1, res["color"], 2)
-                        stable = False
-                        break
-                    elif res in [KLC_OUTSIDE, KLC_NO_BIG_ENOUGH, KLC_NO_CLOSE_ENOUGH]:
-                        pass
-                    # else:
-                    #     raise
-                if res in [KLC_OUTSIDE, KLC_NO_BIG_ENOUGH, KLC_NO_CLOSE_ENOUGH]:
-                    i += 1
-                if isinstance(res, dict):
-                    cv2.drawContours(
-                        hull_img, [hull], -1, res.get("color", ipc.C_CABIN_BLUE), 2
-                    )
-                else:
-                    logger.error(f"Unknown check_hull res {str(res)}")
-            self.store_image(hull_img, f"src_img_with_cnt_after_agg_iter_{iter_count}")
+        while not stable and len(unknown_hulls) > 0:
+            results = self.classify_hulls(
+                cmp_hulls=unknown_hulls, master_hulls=good_hulls, **hull_kwargs
+            )
+            stable = all(res not in KLC_KEPT for res in results)
+            if self.is_kept_image(f"src_img_with_cnt_after_agg_iter_{iter_count}"):
+                hull_img = src_image.copy()
+                for hull, res in zip(unknown_hulls, results):
+                    cv2.drawContours(hull_img, [hull], -1, res["color"], 2)
+                self.store_image(
+                    hull_img, f"src_img_with_cnt_after_agg_iter_{iter_count}"
+                )
+            good_hulls.extend(
+                hull
+                for hull, res in zip(unknown_hulls, results)
+                if res in KLC_KEPT and res != KLC_FULLY_INSIDE
+            )
+            unknown_hulls = [
+                hull for hull, res in zip(unknown_hulls, results) if res not in KLC_KEPT
+            ]
             iter_count += 1
 
         hull_img = src_image.copy()
         fnt = (cv2.FONT_HERSHEY_SIMPLEX, 0.6)
-        for gh in good_hulls:
-            x, y, w, h = cv2.boundingRect(gh)
-            x += w // 2 - 10
-            y += h // 2
-            cv2.drawContours(hull_img, [gh], -1, KLC_FULLY_INSIDE["color"], 8)
-        for uh in unknown_hulls:
-            x, y, w, h = cv2.boundingRect(uh)
-            x += w // 2 - 10
-            y += h // 2
-            cv2.drawContours(hull_img, [uh], -1, KLC_OUTSIDE["color"], 8)
+        cv2.drawContours(hull_img, good_hulls, -1, KLC_FULLY_INSIDE["color"], 8)
+        cv2.drawContours(hull_img, unknown_hulls, -1, KLC_OUTSIDE["color"], 8)
         for gh in good_hulls:
             area_ = cv2.contourArea(gh)
             if area_ > 0:
@@ -2100,40 +2377,29 @@ class BaseImageProcessor(ImageWrapper):
         contours = ipc.get_contours(
             mask=src_mask, retrieve_mode=cv2.RETR_LIST, method=cv2.CHAIN_APPROX_SIMPLE
         )
-        for cnt in contours:
-            hull = cv2.approxPolyDP(cnt, eps * cv2.arcLength(cnt, True), True)
-            is_good_one = False
-            for good_hull in good_hulls:
-                res = self.check_hull(
-                    mask=src_mask,
-                    cmp_hull=hull,
-                    master_hull=good_hull,
-                    tolerance_area=tolerance_area,
-                    tolerance_distance=tolerance_distance,
-                    dilation_iter=dilation_iter,
-                    keep_safe_big_enough=keep_safe_big_enough,
-                    keep_safe_close_enough=keep_safe_close_enough,
-                    safe_roi=safe_roi_name,
-                    area_override_size=area_override_size,
-                )
-                if res in [
-                    KLC_FULLY_INSIDE,
-                    KLC_OVERLAPS,
-                    KLC_PROTECTED_DIST_OK,
-                    KLC_PROTECTED_SIZE_OK,
-                    KLC_OK_TOLERANCE,
-                    KLC_BIG_ENOUGH_TO_IGNORE_DISTANCE,
-                ]:
-                    is_good_one = True
-                    break
-
-            if is_good_one:
-                cv2.drawContours(src_image, [cnt], 0, (0, 255, 0), 2)
-            else:
-                cv2.drawContours(src_image, [cnt], 0, (0, 0, 255), 2)
-                cv2.drawContours(src_mask, [cnt], 0, (0, 0, 0), -1)
-
-        self.store_image(src_image, "img_wth_tagged_cnt")
+        results = self.classify_hulls(
+            cmp_hulls=[
+                cv2.approxPolyDP(cnt, eps * cv2.arcLength(cnt, True), True)
+                for cnt in contours
+            ],
+            master_hulls=good_hulls,
+            **hull_kwargs,
+        )
+        rejected = [i for i, res in enumerate(results) if res not in KLC_KEPT]
+        if self.is_kept_image("img_wth_tagged_cnt"):
+            cv2.drawContours(
+                src_image,
+                [cnt for cnt, res in zip(contours, results) if res in KLC_KEPT],
+                -1,
+                (0, 255, 0),
+                2,
+            )
+            cv2.drawContours(
+                src_image, [contours[i] for i in rejected], -1, (0, 0, 255), 2
+            )
+            self.store_image(src_image, "img_wth_tagged_cnt")
+        for i in rejected:
+            cv2.drawContours(src_mask, [contours[i]], 0, (0, 0, 0), -1)
         self.store_image(src_mask, "mask_lnk_cnts")
 
         return src_mask
@@ -2143,7 +2409,8 @@ class BaseImageProcessor(ImageWrapper):
         """Builds objects and mask needed for analysis
 
         Arguments:
-            img {numpy array} -- source image
+            img {numpy array, callable} -- source image, or function building a BGR
+              image the size of mask, only called when debug images are stored
             mask {numpy array} -- final mask from
 
         Returns:
@@ -2151,12 +2418,21 @@ class BaseImageProcessor(ImageWrapper):
             numpy array -- mask
         """
 
+        if callable(img):
+            if self.is_kept_image("masked_whole_cnts") or self.is_kept_image(
+                "objcomp"
+            ):
+                img = img()
+            else:
+                # Only its shape matters when nothing is drawn
+                img = np.broadcast_to(mask[:, :, np.newaxis], mask.shape[:2] + (3,))
+
         # Identify objects
         id_objects, obj_hierarchy = ipc.get_contours_and_hierarchy(
             mask=mask, retrieve_mode=cv2.RETR_TREE, method=cv2.CHAIN_APPROX_NONE
         )
 
-        if self.store_images:
+        if self.is_kept_image("masked_whole_cnts"):
             ori_img = np.copy(img)
             for i, _ in enumerate(id_objects):
                 cv2.drawContours(
@@ -3060,7 +3336,18 @@ class BaseImageProcessor(ImageWrapper):
             numpy array -- channel component
         """
 
-        c = self.file_handler.get_channel(src_img=src_img, channel=channel)
+        if channel in ipc.CHANNEL_PLANES and (
+            src_img is None or len(src_img.shape) == 3
+        ):
+            color_space, index = ipc.CHANNEL_PLANES[channel]
+            c = self.get_color_space_planes(src_img=src_img, color_space=color_space)[
+                index
+            ]
+            if not c.flags.writeable:
+                # Cached planes are shared, callers are free to modify the channel
+                c = c.copy()
+        else:
+            c = self.file_handler.get_channel(src_img=src_img, channel=channel)
 
         if c is None:
             if src_img is None:
@@ -3117,6 +3404,58 @@ class BaseImageProcessor(ImageWrapper):
 
         return c
 
+    def _get_channel_cache_key(self, image):
+        """Returns a key identifying a read only image, None if it may change"""
+        root = image
+        while isinstance(root.base, np.ndarray):
+            root = root.base
+        if image.flags.writeable or root.flags.writeable:
+            return None
+        return (
+            id(root),
+            image.__array_interface__["data"][0],
+            image.shape,
+            image.strides,
+        )
+
+    def get_color_space_planes(self, src_img=None, color_space: str = ipc.HSV):
+        """Returns the channels of a BGR image converted to a colour space
+
+        Conversions of read only images, like current_image, are cached by image
+        and colour space, their channels are shared read only arrays.
+
+        Keyword Arguments:
+            src_img {numpy array} -- source image (default: {current_image})
+            color_space {str} -- one of ipc.HSV, ipc.LAB or ipc.RGB (default: {ipc.HSV})
+
+        Returns:
+            tuple -- channels in colour space order
+        """
+        img = self.current_image if src_img is None else src_img
+        key = self._get_channel_cache_key(img)
+        cached = self._built_channels.get(color_space, None)
+        if key is not None and cached is not None and cached[0] == key:
+            return cached[2]
+
+        if color_space == ipc.HSV:
+            planes = tuple(cv2.split(cv2.cvtColor(img, cv2.COLOR_BGR2HSV)))
+        elif color_space == ipc.LAB:
+            planes = tuple(cv2.split(cv2.cvtColor(img, cv2.COLOR_BGR2Lab)))
+        elif color_space == ipc.RGB:
+            planes = tuple(cv2.split(img))
+        else:
+            raise NameError(f"Unknown colour space {color_space}")
+
+        if key is not None:
+            root = img
+            while isinstance(root.base, np.ndarray):
+                root = root.base
+            for plane in planes:
+                plane.setflags(write=False)
+            # Keeping the image alive prevents its id from being reused
+            self._built_channels[color_space] = (key, root, planes)
+        return planes
+
     def get_channel_stats(
         self, src_img=None, channel="l", normalize=False, median_filter_size=0
     ):
@@ -3202,40 +3541,27 @@ class BaseImageProcessor(ImageWrapper):
         iter_ = 0
         all_lines = []
         while not stable_ and (iter_ < max_iter):
-            stable_ = True
             iter_ += 1
-            msk_data = ipc.MaskData(mask=c)
-            for l in msk_data.lines_data:
-                if (l.solidity >= 0.99) and (l.nz_span >= msk_data.mask_width - 4):
-                    ld_up, ld_down = msk_data.find_top_bottom_non_full_lines(
-                        l.height_pos
-                    )
-                    l.merge_or(ld_up, ld_down)
-                    all_lines.append([(l.height_pos, 0, msk_data.mask_width)])
-                    c[l.height_pos] = 0
-                    for i in l.nz_pos:
-                        c[l.height_pos][i] = 255
-                else:
-                    lines = msk_data.horizontal_lines_at(
-                        l.height_pos, min_line_size, fully_isolated
-                    )
-                    if not lines:
-                        continue
-                    all_lines.append(lines)
-                    for i, line in enumerate(lines):
-                        stable_ = False
-                        cv2.line(c, (line[1], line[0]), (line[2], line[0]), 0, 1)
-            self.store_image(c, f"cleaned_image_iter{iter_}")
+            lines, stable_ = ipc.remove_horizontal_noise_pass(
+                mask=c, min_line_size=min_line_size, fully_isolated=fully_isolated
+            )
+            all_lines.extend(lines)
+            if self.store_images:
+                self.store_image(c, f"cleaned_image_iter{iter_}")
 
         return dict(mask=c, lines=all_lines)
 
-    def retrieve_stored_image(self, img_name):
+    def retrieve_stored_image(self, img_name, target_size: tuple = None):
         """Retrieves stored image from image_list using key.
         For some keys, image will be generated even if not present in image_list
 
         Arguments:
             img_name {str} -- key to stored image
 
+        Keyword Arguments:
+            target_size {tuple} -- if set, (width, height) generated images are
+              downscaled to fit before drawing, except ROI ones (default: {None})
+
         Generated keys details:
             * If key contains 'exp_fixed', exposure fixed image will be used as base if present,
               if not current_image will be used
@@ -3268,31 +3594,53 @@ class BaseImageProcessor(ImageWrapper):
         elif img_name.lower() == "mask" and self.mask is not None:
             return self.mask.copy()
         else:
-            for dic in self.image_list:
-                if dic["name"].lower() == img_name.lower():
-                    return dic["image"]
+            dic = self.image_list.get_named(img_name)
+            if dic is not None:
+                return dic["image"]
             if "exp_fixed" in img_name.lower():
                 foreground = self.retrieve_stored_image("exposure_fixed")
                 if foreground is None:
                     foreground = self.current_image
+                mask = self.mask
+                scale = 1
+                if target_size is not None and not img_name.lower().endswith("roi"):
+                    scale = min(
+                        target_size[0] / foreground.shape[1],
+                        target_size[1] / foreground.shape[0],
+                        1,
+                    )
+                if scale < 1:
+                    size = (
+                        max(round(foreground.shape[1] * scale), 1),
+                        max(round(foreground.shape[0] * scale), 1),
+                    )
+                    foreground = cv2.resize(
+                        foreground, size, interpolation=cv2.INTER_AREA
+                    )
+                    if mask is not None:
+                        mask = cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST)
+
+                def scaled(thickness):
+                    return max(round(thickness * scale), 1)
+
                 if img_name.lower() == "mask_on_exp_fixed_bw_with_morph":
                     return self.draw_image(
                         src_image=foreground,
-                        src_mask=self.mask,
+                        src_mask=mask,
                         background="bw",
                         foreground="source",
                         bck_grd_luma=120,
-                        contour_thickness=6,
-                        hull_thickness=6,
-                        width_thickness=6,
-                        height_thickness=6,
-                        centroid_width=20,
-                        centroid_line_width=8,
+                        contour_thickness=scaled(6),
+                        hull_thickness=scaled(6),
+                        width_thickness=scaled(6),
+                        height_thickness=scaled(6),
+                        centroid_width=scaled(20),
+                        centroid_line_width=scaled(8),
                     )
                 elif img_name.lower() == "mask_on_exp_fixed_bw":
                     return self.draw_image(
                         src_image=foreground,
-                        src_mask=self.mask,
+                        src_mask=mask,
                         background="bw",
                         foreground="source",
                         bck_grd_luma=120,
@@ -3316,7 +3664,7 @@ class BaseImageProcessor(ImageWrapper):
                     return self.draw_image(
                         src_image=foreground,
                         channel="l",
-                        src_mask=self.mask,
+                        src_mask=mask,
                         foreground="false_colour",
                         background="bw",
                         normalize_before=True,
@@ -3435,13 +3783,21 @@ class BaseImageProcessor(ImageWrapper):
         background_color: tuple = (125, 125, 125),
         padding: tuple = 2,
         images_dict: dict = {},
+        max_width: int = 0,
     ) -> np.ndarray:
         """Creates a mosaic aggregating stored images
 
+        Images are only retrieved or generated when not in images_dict,
+        generated ones are drawn at tile size.
+
         Arguments:
             shape {numpy array} -- height, width, channel count
             image_names {array, list} -- array of image names
 
+        Keyword Arguments:
+            max_width {int} -- if shape is not set, tiles are shrunk so that
+              the mosaic is not wider, 0 for full resolution (default: {0})
+
         Returns:
             numpy array -- image containing the mosaic
         """
@@ -3455,9 +3811,16 @@ class BaseImageProcessor(ImageWrapper):
         column_count = len(image_names[0])
         line_count = len(image_names)
         if shape is None:
+            tile_width, tile_height = self.width, self.height
+            full_width = tile_width * column_count + padding * column_count + padding
+            if 0 < max_width < full_width:
+                tile_width = max(
+                    (max_width - padding * (column_count + 1)) // column_count, 1
+                )
+                tile_height = max(round(self.height * tile_width / self.width), 1)
             shape = (
-                self.height * line_count + padding * line_count + padding,
-                self.width * column_count + padding * column_count + padding,
+                tile_height * line_count + padding * line_count + padding,
+                tile_width * column_count + padding * column_count + padding,
                 3,
             )
 
@@ -3467,22 +3830,24 @@ class BaseImageProcessor(ImageWrapper):
 
         def parse_line(a_line, a_line_idx, a_cnv):
             for c, column in enumerate(a_line):
-                if isinstance(column, str):
-                    src_img = images_dict.get(
-                        column, self.retrieve_stored_image(column)
-                    )
-                else:
+                r = RectangleRegion(
+                    left=int((shape[1] / column_count) * c),
+                    width=int(shape[1] / column_count),
+                    top=int((shape[0] / line_count) * a_line_idx),
+                    height=int(shape[0] / line_count),
+                )
+                r.expand(-padding)
+                if not isinstance(column, str):
                     src_img = column
+                elif column in images_dict:
+                    src_img = images_dict[column]
+                else:
+                    src_img = self.retrieve_stored_image(
+                        column, target_size=(r.width, r.height)
+                    )
                 if src_img is None:
                     continue
                 else:
-                    r = RectangleRegion(
-                        left=int((shape[1] / column_count) * c),
-                        width=int(shape[1] / column_count),
-                        top=int((shape[0] / line_count) * a_line_idx),
-                        height=int(shape[0] / line_count),
-                    )
-                    r.expand(-padding)
                     a_cnv = ipc.enclose_image(a_cnv, src_img, r)
 
         try:
@@ -3848,6 +4213,7 @@ class BaseImageProcessor(ImageWrapper):
     @current_image.setter
     def current_image(self, value):
         self.file_handler.current_image = value
+        self._built_channels = {}
 
     def _get_mask(self):
         if self._mask is not None:
@@ -3866,6 +4232,22 @@ class BaseImageProcessor(ImageWrapper):
             (self.store_mosaic.lower() != "none") and (name.lower() == "mosaic")
         )
 
+    def is_kept_image(self, name: str, force_store: bool = False) -> bool:
+        """Returns True if store_image will keep an image named name
+
+        Checking first avoids building debug images that would be discarded.
+        """
+        if self.owner is not None:
+            target = self.owner
+            name = f"{self.angle}_{self.wavelength}_{name}"
+        else:
+            target = self
+        return bool(
+            (name and (target.store_images or (name.lower() == "mosaic")))
+            or force_store
+            or (name in self.forced_storage_images_list)
+        )
+
     def is_save_image(self, name):
         return (self.write_images == "print") or (
             (name == "mosaic") and (self.write_mosaic == "print")
@@ -3911,6 +4293,14 @@ class BaseImageProcessor(ImageWrapper):
         else:
             self._options["write_images"] = "none"
 
+    @property
+    def image_list(self):
+        return self._image_list
+
+    @image_list.setter
+    def image_list(self, value):
+        self._image_list = ImageStore(value if value is not None else [])
+
     @property
     def store_images(self):
         return self._options.get("store_images", False)
@@ -4,6 +4,7 @@ import numpy as np
 import random
 from typing import Any, Union
 import math
+import functools
 
 from ipso_phen.ipapi.tools.csv_writer import AbstractCsvWriter
 
@@ -196,6 +197,19 @@ CHANNELS_VISIBLE = {
     **_RGB_CHANNELS,
 }
 
+# Colour space and plane index of visible channels in converted BGR images
+CHANNEL_PLANES = dict(
+    h=(HSV, 0),
+    s=(HSV, 1),
+    v=(HSV, 2),
+    l=(LAB, 0),
+    a=(LAB, 1),
+    b=(LAB, 2),
+    bl=(RGB, 0),
+    gr=(RGB, 1),
+    rd=(RGB, 2),
+)
+
 C_BLACK = (0, 0, 0)
 C_BLUE = (255, 0, 0)
 C_BLUE_VIOLET = (226, 43, 138)
@@ -389,6 +403,60 @@ def channel_color(channel: str):
         return C_BLACK
 
 
+def convert_pixels(pixels, color_space: str):
+    """Converts BGR pixels, an array of shape (n, 3), to a colour space
+
+    Conversions are done pixel by pixel so results match whole image ones.
+    """
+    if color_space == RGB or len(pixels) == 0:
+        return pixels
+    elif color_space == HSV:
+        code = cv2.COLOR_BGR2HSV
+    elif color_space == LAB:
+        code = cv2.COLOR_BGR2Lab
+    else:
+        raise NameError(f"Unknown colour space {color_space}")
+    return cv2.cvtColor(pixels.reshape(-1, 1, 3), code).reshape(-1, 3)
+
+
+@functools.lru_cache(maxsize=None)
+def get_histogram_bins(bin_count: int):
+    """Returns the bin of each 8 bit value in a cv2.calcHist histogram over [0, 255]
+
+    Values left out by calcHist, the range upper bound is excluded, get bin_count.
+    """
+    counts = cv2.calcHist(
+        [np.arange(256, dtype=np.uint8).reshape(1, -1)],
+        [0],
+        None,
+        [bin_count],
+        [0, (256 - 1)],
+    )[:, 0].astype(int)
+    bins = np.full(256, bin_count)
+    bins[: counts.sum()] = np.repeat(np.arange(bin_count), counts)
+    bins.setflags(write=False)
+    return bins
+
+
+def histogram_from_counts(counts, bin_count: int):
+    """Groups the 256 value counts of an 8 bit channel as cv2.calcHist would"""
+    return np.bincount(
+        get_histogram_bins(bin_count),
+        weights=counts,
+        minlength=bin_count + 1,
+    )[:bin_count]
+
+
+def mean_std_from_counts(counts) -> tuple:
+    """Returns mean and standard deviation of 8 bit values from their counts"""
+    total = counts.sum()
+    if total == 0:
+        return 0.0, 0.0
+    values = np.arange(len(counts))
+    mean = np.dot(counts, values) / total
+    return mean, math.sqrt(max(np.dot(counts, values**2) / total - mean**2, 0))
+
+
 def random_color(restrained: bool = True) -> tuple:
     """
     Retrurns a random color
@@ -515,7 +583,7 @@ def enclose_image(a_cnv, img, rect, frame_width: int = 0):
     # if (rect.width == old_w) and (rect.height == old_h):
     #     a_cnv = img.copy()
     # else:
-    resized_image = resize_image(img.copy(), target_rect=rect, keep_aspect_ratio=True)
+    resized_image = resize_image(img, target_rect=rect, keep_aspect_ratio=True)
     n_h, n_w = resized_image.shape[:2]
 
     dx = int((rect.width - n_w) / 2)
@@ -808,14 +876,26 @@ class MaskLineData(object):
     ]
 
     def __init__(self, line_number: int, line_data: list, last_span):
-        ln_dt = np.nonzero(line_data)[0]
         self.height_pos = line_number
+        self.last_span = last_span
+        self.tag = "none"
+        self._set_positions(np.nonzero(line_data)[0])
+
+    @classmethod
+    def from_positions(cls, line_number: int, nz_pos, last_span):
+        """Builds line data from sorted non zero positions"""
+        ld = cls.__new__(cls)
+        ld.height_pos = line_number
+        ld.last_span = last_span
+        ld.tag = "none"
+        ld._set_positions(nz_pos)
+        return ld
+
+    def _set_positions(self, ln_dt):
         self.nz_span = ln_dt[-1] - ln_dt[0] + 1 if len(ln_dt) > 0 else 0
         self.nz_count = len(ln_dt)
         self.solidity = self.nz_count / self.nz_span if self.nz_span != 0 else 0
-        self.last_span = last_span
         self.nz_pos = ln_dt
-        self.tag = "none"
 
     def __str__(self):
         return f"[height: {self.height_pos}][width: {self.nz_span}][solidity: {self.solidity}]"
@@ -828,32 +908,21 @@ class MaskLineData(object):
             return False
         if len(self.nz_pos) == 0:
             return True
-        for i in self.nz_pos:
-            if i not in other.nz_pos:
-                return False
-        return True
+        return bool(np.isin(self.nz_pos, other.nz_pos, assume_unique=True).all())
 
     def merge_and(self, line1, line2):
         if (line1 is None) or (line2 is None):
             ln_dt = np.array([])
         else:
-            ln_dt = np.array([idx for idx in line1.nz_pos if idx in line2.nz_pos])
-        self.nz_span = ln_dt[-1] - ln_dt[0] + 1 if len(ln_dt) > 0 else 0
-        self.nz_count = len(ln_dt)
-        self.solidity = self.nz_count / self.nz_span if self.nz_span != 0 else 0
-        self.nz_pos = ln_dt
+            ln_dt = np.intersect1d(line1.nz_pos, line2.nz_pos, assume_unique=True)
+        self._set_positions(ln_dt)
 
     def merge_or(self, line1, line2):
-        ln_dt = []
-        if line1 is not None:
-            ln_dt = ln_dt + [idx for idx in line1.nz_pos]
-        if line2 is not None:
-            ln_dt = ln_dt + [idx for idx in line2.nz_pos]
-        ln_dt = np.array(sorted(list(set(ln_dt))))
-        self.nz_span = ln_dt[-1] - ln_dt[0] + 1 if len(ln_dt) > 0 else 0
-        self.nz_count = len(ln_dt)
-        self.solidity = self.nz_count / self.nz_span if self.nz_span != 0 else 0
-        self.nz_pos = ln_dt
+        ln_dt = np.union1d(
+            [] if line1 is None else line1.nz_pos,
+            [] if line2 is None else line2.nz_pos,
+        )
+        self._set_positions(ln_dt.astype(np.int64) if len(ln_dt) > 0 else ln_dt)
 
     def clear(self):
         self.nz_span = 0
@@ -864,23 +933,63 @@ class MaskLineData(object):
 
 
 class MaskData(object):
+    """Per line statistics of a mask, from its first to its last non empty line
+
+    Statistics are stored as arrays indexed by line, MaskLineData objects are
+    only built when requested. Statistics reflect the mask when the object was
+    built, line objects are shared and may be modified by callers.
+    """
+
     def __init__(self, mask):
         self._height = None
         self._width = None
         self._is_continuous = True
-        self._lines_data = []
         self._mask = mask
-        last_span_ = 0
-        for line_number, line in enumerate(mask):
-            # Build line data
-            cur_ln_dt = MaskLineData(line_number, line, last_span_)
-            if (cur_ln_dt.nz_count == 0) and (len(self._lines_data) == 0):
-                continue
-            last_span_ = cur_ln_dt.nz_span
-            self._lines_data.append(cur_ln_dt)
-        if self.lines_data:
-            while self.lines_data[-1].nz_count == 0:
-                del self.lines_data[-1]
+        nz_mask = mask != 0
+        counts = np.count_nonzero(nz_mask, axis=1)
+        non_empty = np.flatnonzero(counts)
+        if len(non_empty) > 0:
+            self._top = int(non_empty[0])
+            self._rows = nz_mask[self._top : non_empty[-1] + 1]
+            self._counts = counts[self._top : non_empty[-1] + 1]
+            first = self._rows.argmax(axis=1)
+            last = self._rows.shape[1] - 1 - self._rows[:, ::-1].argmax(axis=1)
+            self._spans = np.where(self._counts > 0, last - first + 1, 0)
+        else:
+            self._top = 0
+            self._rows = np.zeros((0, mask.shape[1]), dtype=bool)
+            self._counts = np.zeros(0, dtype=np.int64)
+            self._spans = np.zeros(0, dtype=np.int64)
+        self._lines = [None] * len(self._counts)
+        self._tags = ["none"] * len(self._counts)
+
+    def _row_index(self, height):
+        """Returns the index of the line at height, None if there is none"""
+        if height is None:
+            return None
+        index = height - self._top
+        if index < 0 or index >= len(self._lines) or index != int(index):
+            return None
+        return int(index)
+
+    def _line(self, index: int, nz_pos=None) -> MaskLineData:
+        if self._lines[index] is None:
+            ld = MaskLineData.from_positions(
+                line_number=self._top + index,
+                nz_pos=np.flatnonzero(self._rows[index]) if nz_pos is None else nz_pos,
+                last_span=self._spans[index - 1] if index > 0 else 0,
+            )
+            ld.tag = self._tags[index]
+            self._lines[index] = ld
+        return self._lines[index]
+
+    def _values_between(self, values, start: int, stop: int):
+        """Returns values for lines from start to stop excluded, 0 if missing"""
+        res = np.zeros(stop - start, dtype=values.dtype)
+        lo, hi = max(start, self._top), min(stop, self._top + len(values))
+        if lo < hi:
+            res[lo - start : hi - start] = values[lo - self._top : hi - self._top]
+        return res
 
     def to_mask(self, first_line=-1, last_line=-1, colour=255):
         msk_out = np.zeros_like(self.mask)
@@ -888,16 +997,16 @@ class MaskData(object):
             first_line = 0
         if last_line == -1:
             last_line = self.mask_height
-        for line in self.lines_data[first_line:last_line]:
-            for i in line.nz_pos:
-                msk_out[line.height_pos][i] = colour
+        start, stop, _ = slice(first_line, last_line).indices(len(self._lines))
+        if start < stop:
+            msk_out[self._top + start : self._top + stop][
+                self._rows[start:stop]
+            ] = colour
         return msk_out
 
     def find_by_height(self, height):
-        for ld in self._lines_data:
-            if ld.height_pos == height:
-                return ld
-        return None
+        index = self._row_index(height)
+        return None if index is None else self._line(index)
 
     def find_top_bottom_non_full_lines(self, height):
         ld = self.find_by_height(height=height)
@@ -933,18 +1042,28 @@ class MaskData(object):
                 ld_up = self.find_by_height(height=height - 1)
                 ld_down = self.find_by_height(height=height + 1)
 
+            # Neighbours of each pixel of the line
+            up_hits = (
+                np.isin(ld.nz_pos, ld_up.nz_pos, assume_unique=True).tolist()
+                if ld_up is not None
+                else [False] * len(ld.nz_pos)
+            )
+            down_hits = (
+                np.isin(ld.nz_pos, ld_down.nz_pos, assume_unique=True).tolist()
+                if ld_down is not None
+                else [False] * len(ld.nz_pos)
+            )
+
             # Build line candidates spans
             run = []
             runs = [run]
             expect = None
             top_nok = False
             bottom_nok = False
-            for v in ld.nz_pos:
+            for v, up_hit, down_hit in zip(ld.nz_pos, up_hits, down_hits):
                 is_continuous = (v == expect) or (expect is None)
-                if (ld_up is not None) and (v in ld_up.nz_pos):
-                    top_nok = True
-                if (ld_down is not None) and (v in ld_down.nz_pos):
-                    bottom_nok = True
+                top_nok = top_nok or up_hit
+                bottom_nok = bottom_nok or down_hit
                 neighbors_nok = (fully_isolated and (top_nok or bottom_nok)) or (
                     top_nok and bottom_nok
                 )
@@ -958,7 +1077,9 @@ class MaskData(object):
                 expect = v + 1
 
             res = [
-                (ld.height_pos, run[0], run[-1]) for run in runs if len(run) >= min_length
+                (ld.height_pos, run[0], run[-1])
+                for run in runs
+                if len(run) >= min_length
             ]
         except Exception as e:
             logger.exception(f"Raised {repr(e)}")
@@ -984,22 +1105,16 @@ class MaskData(object):
         return self.find_by_height(i)
 
     def width_at(self, i):
-        ld = self.line_at(i)
-        if ld:
-            return ld.nz_span
-        else:
-            return 0
+        index = self._row_index(self.get_pos_height(i))
+        return 0 if index is None else self._spans[index]
 
     def nz_count_at(self, i):
-        ld = self.line_at(i)
-        if ld:
-            return ld.nz_count
-        else:
-            return 0
+        index = self._row_index(self.get_pos_height(i))
+        return 0 if index is None else self._counts[index]
 
     def is_full_line(self, height):
-        ld = self.find_by_height(height=height)
-        return (ld is not None) and (ld.nz_count == self.width)
+        index = self._row_index(height)
+        return (index is not None) and (self._counts[index] == self.width)
 
     def height_quantile_mask(self, total, index, colour=255):
         """
@@ -1031,19 +1146,21 @@ class MaskData(object):
         splits = np.array_split(
             np.array(range(self.top_index, self.bottom_index + 1)), total
         )
-        start, stop = splits[index][0], splits[index][-1] + 1
+        start, stop = int(splits[index][0]), int(splits[index][-1] + 1)
 
-        dt = np.array([self.width_at(idx) for idx in range(start, stop)])
+        dt = self._values_between(self._spans, start, stop)
         means, std_devs = cv2.meanStdDev(dt)
 
-        area_ = np.sum(np.array([self.nz_count_at(idx) for idx in range(start, stop)]))
-        hullish_ = np.sum(np.array([self.width_at(idx) for idx in range(start, stop)]))
+        area_ = np.sum(self._values_between(self._counts, start, stop))
+        hullish_ = np.sum(dt)
 
         if tag is not None:
-            for idx in range(start, stop):
-                ld = self.line_at(idx)
-                if ld is not None:
-                    ld.tag = tag
+            for idx in range(
+                max(start - self._top, 0), min(stop - self._top, len(self._lines))
+            ):
+                self._tags[idx] = tag
+                if self._lines[idx] is not None:
+                    self._lines[idx].tag = tag
 
         return (
             area_,
@@ -1057,12 +1174,18 @@ class MaskData(object):
 
     @property
     def lines_data(self):
-        return self._lines_data
+        if any(ld is None for ld in self._lines):
+            _, cols = np.nonzero(self._rows)
+            for index, nz_pos in enumerate(
+                np.split(cols, np.cumsum(self._counts)[:-1])
+            ):
+                self._line(index, nz_pos=nz_pos)
+        return self._lines
 
     @property
     def height(self):
         if self._height is None:
-            if self._lines_data:
+            if self._lines:
                 self._height = self.bottom_index - self.top_index
             else:
                 self._height = 0
@@ -1071,14 +1194,7 @@ class MaskData(object):
     @property
     def width(self):
         if self._width is None:
-            if self._lines_data:
-                max_width_ = 0
-                for ld in self._lines_data:
-                    if ld.nz_span > max_width_:
-                        max_width_ = ld.nz_span
-                self._width = max_width_
-            else:
-                self._width = 0
+            self._width = self._spans.max() if self._lines else 0
         return self._width
 
     @property
@@ -1095,17 +1211,11 @@ class MaskData(object):
 
     @property
     def top_index(self):
-        if len(self._lines_data) > 0:
-            return self._lines_data[0].height_pos
-        else:
-            return 0
+        return self._top if self._lines else 0
 
     @property
     def bottom_index(self):
-        if len(self._lines_data) > 0:
-            return self._lines_data[-1].height_pos
-        else:
-            return 0
+        return self._top + len(self._lines) - 1 if self._lines else 0
 
     @property
     def mask(self):
@@ -1113,11 +1223,138 @@ class MaskData(object):
 
     @property
     def area(self):
-        return (
-            np.sum(np.array([l.nz_count for l in self.lines_data]))
-            if len(self._lines_data) > 0
-            else 0
+        return np.sum(self._counts) if self._lines else 0
+
+
+def _top_bottom_non_full_rows(rows, above, below, index: int):
+    """Returns indexes of the closest lines above and below that do not contain
+    the line at index, as MaskData.find_top_bottom_non_full_lines does
+
+    Lines above are read from above, lines below from below, None if outside.
+    """
+
+    def is_inside(other):
+        return not np.any(rows[index] & ~other)
+
+    up = index - 1
+    while up >= 0 and is_inside(above[up]) and up > 0:
+        up -= 1
+    down = index + 1
+    last = len(rows) - 1
+    while down <= last and is_inside(below[down]) and down < last:
+        down += 1
+    return (up if up >= 0 else None), (down if down <= last else None)
+
+
+def _get_run_breaks(starts, up_hits, down_hits):
+    """Returns pixels where runs break when pixels need neighbours both above
+    and below since the run start, as MaskData.horizontal_lines_at does
+    """
+    breaks = np.zeros_like(starts)
+    last_line = -1
+    top_nok = bottom_nok = False
+    for line, pos in zip(*np.nonzero(starts | up_hits | down_hits)):
+        if line != last_line:
+            # First pixel of the line, its neighbours count
+            last_line = line
+            top_nok = bottom_nok = False
+        elif starts[line, pos]:
+            # Other segments start with no neighbours
+            top_nok = bottom_nok = False
+            continue
+        top_nok = top_nok or up_hits[line, pos]
+        bottom_nok = bottom_nok or down_hits[line, pos]
+        if top_nok and bottom_nok:
+            breaks[line, pos] = True
+            top_nok = bottom_nok = False
+    return breaks
+
+
+def remove_horizontal_noise_pass(
+    mask, min_line_size: int = 20, fully_isolated: bool = True
+):
+    """Removes isolated horizontal runs of pixels from mask, in place
+
+    Full width lines are replaced by the union of the closest lines that do not
+    contain them. Other lines are split in runs broken where a pixel has
+    neighbours in the line above or below, runs of at least min_line_size pixels
+    are removed. Neighbours are read from the mask before the pass, except for
+    full width lines above that are read once replaced.
+
+    Arguments:
+        mask {numpy array} -- mask to clean
+
+    Keyword Arguments:
+        min_line_size {int} -- minimum run length to remove (default: {20})
+        fully_isolated {bool} -- if False, runs are broken only where pixels
+            have neighbours both above and below (default: {True})
+
+    Returns:
+        tuple -- list of removed lines by mask line as (line, start, end) lists,
+            True if no run was removed
+    """
+    mask_width = mask.shape[1]
+    nz_mask = mask != 0
+    counts = np.count_nonzero(nz_mask, axis=1)
+    non_empty = np.flatnonzero(counts)
+    if len(non_empty) == 0:
+        return [], True
+    top = int(non_empty[0])
+    rows = nz_mask[top : non_empty[-1] + 1]
+    counts = counts[top : non_empty[-1] + 1]
+    first = rows.argmax(axis=1)
+    last = mask_width - 1 - rows[:, ::-1].argmax(axis=1)
+    spans = np.where(counts > 0, last - first + 1, 0)
+    solidity = np.divide(counts, spans, out=np.zeros(len(counts)), where=spans > 0)
+    solid = solidity >= 0.99
+    full = solid & (spans >= mask_width - 4)
+
+    # Full lines are replaced in order, lines above them see the replacement
+    current = rows.copy()
+    removed = {}
+    for index in np.flatnonzero(full):
+        up, down = _top_bottom_non_full_rows(rows, current, rows, index)
+        current[index] = (current[up] if up is not None else False) | (
+            rows[down] if down is not None else False
         )
+        removed[index] = [(top + int(index), 0, mask_width)]
+        mask[top + index] = np.where(current[index], 255, 0)
+
+    # Neighbours of each pixel
+    up_rows = np.zeros_like(rows)
+    up_rows[1:] = current[:-1]
+    down_rows = np.zeros_like(rows)
+    down_rows[:-1] = rows[1:]
+    for index in np.flatnonzero(solid & ~full & (counts >= min_line_size)):
+        up, down = _top_bottom_non_full_rows(rows, current, rows, index)
+        up_rows[index] = current[up] if up is not None else False
+        down_rows[index] = rows[down] if down is not None else False
+    candidates = rows & (counts >= min_line_size)[:, np.newaxis]
+    candidates[full] = False
+    up_hits = candidates & up_rows
+    down_hits = candidates & down_rows
+
+    # Runs start at each segment start and where neighbours break them
+    previous = np.zeros_like(candidates)
+    previous[:, 1:] = candidates[:, :-1]
+    starts = candidates & ~previous
+    if fully_isolated:
+        starts |= up_hits | down_hits
+    else:
+        starts |= _get_run_breaks(starts, up_hits, down_hits)
+    following = np.zeros_like(candidates)
+    following[:, :-1] = candidates[:, 1:] & ~starts[:, 1:]
+    ends = candidates & ~following
+
+    run_lines, run_starts = np.nonzero(starts)
+    _, run_ends = np.nonzero(ends)
+    keep = run_ends - run_starts + 1 >= min_line_size
+    for index, start, end in zip(run_lines[keep], run_starts[keep], run_ends[keep]):
+        removed.setdefault(index, []).append((top + int(index), start, end))
+        mask[top + index, start : end + 1] = 0
+
+    stable = not np.any(keep)
+    return [removed[index] for index in sorted(removed)], stable
 
 
 class DefaultCsvWriter(AbstractCsvWriter):
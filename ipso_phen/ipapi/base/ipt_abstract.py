@@ -1,8 +1,7 @@
 import inspect
 import sys
-import itertools
-import random
 from abc import ABC, abstractproperty
+from contextlib import closing
 from distutils.version import LooseVersion
 import base64
 import hashlib
@@ -14,6 +13,11 @@ import cv2
 import numpy as np
 
 from ipso_phen.ipapi.base.ip_abstract import BaseImageProcessor
+from ipso_phen.ipapi.base.grid_search import (
+    GRID_SEARCH_WORKERS,
+    get_grid_search_combinations,
+    run_grid_search,
+)
 from ipso_phen.ipapi.tools.common_functions import make_safe_name
 import ipso_phen.ipapi.base.ip_common as ipc
 from ipso_phen.ipapi.tools.common_functions import force_directories
@@ -1514,14 +1518,15 @@ class IptBase(IptParamHolder, ABC):
             module_name = module_name.replace("ipt", "ipso_phen.ipapi.ipt", 1)
         if "ipapi" in module_name and "ipso_phen" not in module_name:
             module_name = module_name.replace("ipapi", "ipso_phen.ipapi", 1)
-        __import__(module_name)
-        for _, obj in inspect.getmembers(sys.modules[module_name]):
-            if inspect.isclass(obj) and (obj.__name__ == class_name):
-                try:
-                    ipt = obj(**json_data[PARAMS_NAME_KEY])
-                    break
-                except Exception as e:
-                    return e
+        obj = find_ipt_class(class_name=class_name, module_name=module_name)
+        if obj is None:
+            __import__(module_name)
+            obj = getattr(sys.modules[module_name], class_name, None)
+        if inspect.isclass(obj):
+            try:
+                ipt = obj(**json_data[PARAMS_NAME_KEY])
+            except Exception as e:
+                return e
         else:
             ipt = None
         if ipt is None:
@@ -1552,6 +1557,15 @@ class IptBase(IptParamHolder, ABC):
         return wrapper
 
     def process_grid_search(self, **kwargs):
+        """Evaluates grid search combinations concurrently on copies of the wrapper
+
+        Keyword Arguments:
+            random_grid_search {bool} -- sample combinations randomly
+            max_combinations {int} -- maximum combinations evaluated, 0 for all
+            max_workers {int} -- concurrent evaluations
+            progress_callback {callable} -- receives results in completion order,
+                returns False to stop the search
+        """
         progress_callback = kwargs.get("progress_callback", None)
         random_grid_search = kwargs.get("random_grid_search", False)
 
@@ -1574,57 +1588,73 @@ class IptBase(IptParamHolder, ABC):
         if self.wrapper is None:
             return False
 
-        procs = list(
-            itertools.product(*[p.decode_grid_search_options() for p in self.gizmos])
+        combinations = get_grid_search_combinations(
+            tool=self,
+            random_sampling=random_grid_search,
+            max_combinations=kwargs.get("max_combinations", 0),
         )
-        if random_grid_search:
-            random.shuffle(procs)
-        tot_ = len(procs)
-        keys = [p.name for p in self.gizmos]
+        tot_ = len(combinations)
+        base_wrapper = self.wrapper
         lcl_callback(0, tot_, f"_____________________________________")
         lcl_callback(0, tot_, f"Instantiated tools")
-        for i, p in enumerate(procs):
-            kwargs_ = {k: (int(v) if str.isdigit(v) else v) for k, v in zip(keys, p)}
-            kwargs_["progress_callback"] = progress_callback
+
+        def evaluate(params):
+            kwargs_ = dict(params, progress_callback=progress_callback)
             ip = self.__class__(**kwargs_)
-            self.wrapper.image_list = []
-            kwargs_["wrapper"] = self.wrapper
+            wrapper = base_wrapper.fork()
+            wrapper.image_list = []
+            kwargs_["wrapper"] = wrapper
             kwargs_["reset_wrapper"] = False
-            if ip.process_wrapper(**kwargs_):
-                img_lst_ = ip.wrapper.image_list
-                if len(img_lst_) > 0:
-                    if kwargs.get("send_all_images", False):
-                        for dic in ip.wrapper.image_list:
+            return ip, ip.process_wrapper(**kwargs_)
+
+        with closing(
+            run_grid_search(
+                evaluate,
+                combinations,
+                max_workers=kwargs.get("max_workers", GRID_SEARCH_WORKERS),
+            )
+        ) as results:
+            for i, (_, params, res) in enumerate(results):
+                if res is None:
+                    if not lcl_callback(i + 1, tot_, f"Failed {params}"):
+                        return
+                    continue
+                ip, success = res
+                if success:
+                    img_lst_ = ip.wrapper.image_list
+                    if len(img_lst_) > 0:
+                        if kwargs.get("send_all_images", False):
+                            for dic in ip.wrapper.image_list:
+                                go_on = lcl_callback(
+                                    i + 1,
+                                    tot_,
+                                    f"""{ip.name}:
+                                     {ip.input_params_as_str(exclude_defaults=True,
+                                     excluded_params=("progress_callback",))}""",
+                                    dic,
+                                )
+                                if go_on is False:
+                                    return
+                        else:
+                            dic = ip.wrapper.retrieve_image_dict("mosaic_out")
+                            if dic is None:
+                                dic = ip.wrapper.retrieve_image_dict("mosaic")
+                                if dic is None:
+                                    dic = img_lst_[len(img_lst_) - 1]
                             go_on = lcl_callback(
                                 i + 1,
                                 tot_,
                                 f"""{ip.name}:
-                                 {ip.input_params_as_str(exclude_defaults=True,
+                                 {ip.input_params_as_str(exclude_defaults=True, 
                                  excluded_params=("progress_callback",))}""",
                                 dic,
                             )
                             if go_on is False:
                                 return
                     else:
-                        dic = ip.wrapper.retrieve_image_dict("mosaic_out")
-                        if dic is None:
-                            dic = ip.wrapper.retrieve_image_dict("mosaic")
-                            if dic is None:
-                                dic = img_lst_[len(img_lst_) - 1]
-                        go_on = lcl_callback(
-                            i + 1,
-                            tot_,
-                            f"""{ip.name}:
-                             {ip.input_params_as_str(exclude_defaults=True, 
-                             excluded_params=("progress_callback",))}""",
-                            dic,
-                        )
-                        if go_on is False:
+                        go_on = lcl_callback(i + 1, tot_, f"Failed {str(ip)}")
+                        if not go_on:
                             return
-                else:
-                    go_on = lcl_callback(i + 1, tot_, f"Failed {str(ip)}")
-                    if not go_on:
-                        return
 
     def do_channel_failure(self, channel):
         self.wrapper.store_image(
@@ -2245,6 +2275,11 @@ class IptBase(IptParamHolder, ABC):
     def needs_previous_mask(self):
         return False
 
+    @property
+    def cacheable_result(self):
+        """False if the tool changes the wrapper in ways its result does not hold"""
+        return True
+
     @property
     def input_type(self):
         if set(self.use_case).intersection(
@@ -2307,15 +2342,52 @@ from ipso_phen.ipapi.tools.common_functions import get_module_classes
 import ipso_phen.ipapi.ipt as ipt_module
 
 
+# Process wide IPT classes registry, built on first use
+_ipt_classes_by_name = None
+_ipt_classes_by_module = None
+
+
+def _build_ipt_classes_index(refresh: bool = False) -> None:
+    global _ipt_classes_by_name, _ipt_classes_by_module
+
+    if _ipt_classes_by_name is not None and refresh is False:
+        return
+    by_name = {}
+    by_module = {}
+    for cls_ in sorted(
+        get_module_classes(
+            package=ipt_module,
+            class_inherits_from=IptBase,
+            remove_abstract=True,
+        ),
+        key=lambda x: (x.__module__, x.__name__),
+    ):
+        by_name.setdefault(cls_.__name__, cls_)
+        by_module[(cls_.__module__, cls_.__name__)] = cls_
+    _ipt_classes_by_name = by_name
+    _ipt_classes_by_module = by_module
+
+
+def get_ipt_classes(refresh: bool = False) -> dict:
+    """Returns all available IPT classes indexed by class name
+
+    The package is only scanned the first time or if refresh is True.
+    """
+    _build_ipt_classes_index(refresh=refresh)
+    return _ipt_classes_by_name
+
+
+def find_ipt_class(class_name: str, module_name: str = "") -> Union[type, None]:
+    """Returns IPT class from its name, and module name if given, None if unknown"""
+    _build_ipt_classes_index()
+    if module_name:
+        return _ipt_classes_by_module.get((module_name, class_name), None)
+    else:
+        return _ipt_classes_by_name.get(class_name, None)
+
+
 def build_tool_from_name(tool_name):
-    # Build unique class list
-    ipt_classes_list = get_module_classes(
-        package=ipt_module,
-        class_inherits_from=IptBase,
-        remove_abstract=True,
-    )
-
-    for cls in ipt_classes_list:
+    for cls in get_ipt_classes().values():
         if cls.name == tool_name:
             return cls()
     else:
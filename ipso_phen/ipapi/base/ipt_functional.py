@@ -1,20 +1,10 @@
-import inspect
 from typing import Union
 
-import ipso_phen.ipapi.ipt as ipt
-from ipso_phen.ipapi.base.ipt_abstract import IptBase
-from ipso_phen.ipapi.tools.common_functions import get_module_classes
+from ipso_phen.ipapi.base.ipt_abstract import find_ipt_class
 
 
 def get_ipt_class(class_name: str) -> Union[type, None]:
-    ipt_classes_list = get_module_classes(
-        package=ipt, class_inherits_from=IptBase, remove_abstract=True
-    )
-    for cls_ in ipt_classes_list:
-        if inspect.isclass(cls_) and (cls_.__name__ == class_name):
-            return cls_
-    else:
-        return None
+    return find_ipt_class(class_name=class_name)
 
 
 def call_ipt(ipt_id: str, source, return_type: str = "result", **kwargs):
@@ -37,8 +37,7 @@ if __name__ == "__main__":
 
 logger = logging.getLogger(os.path.splitext(__name__)[-1].replace(".", ""))
 
-from ipso_phen.ipapi.tools.common_functions import get_module_classes
-from ipso_phen.ipapi.base.ipt_abstract import IptBase
+from ipso_phen.ipapi.base.ipt_abstract import IptBase, get_ipt_classes
 import ipso_phen.ipapi.ipt as ipt
 import ipso_phen.ipapi.base.ip_common as ipc
 from ipso_phen.ipapi.tools.error_holder import log_data
@@ -73,11 +72,7 @@ class IptHolder(object):
 
         """Build list containing a single instance of all available tools"""
         # Build unique class list
-        ipt_classes_list = get_module_classes(
-            package=ipt,
-            class_inherits_from=IptBase,
-            remove_abstract=True,
-        )
+        ipt_classes_list = get_ipt_classes().values()
 
         # Create objects
         logger.info("Loading image processing modules")
@@ -4,28 +4,60 @@ from uuid import uuid4
 import json
 from datetime import datetime as dt
 from timeit import default_timer as timer
-import itertools
 from typing import Union
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 import logging
 import csv
 import os
+import pickle
+import hashlib
+import inspect
+import random
+import threading
 from timeit import default_timer as timer
 
 import numpy as np
 
+from ipso_phen import version
 from ipso_phen.ipapi.base.ipt_abstract import IptParam, IptBase, IptParamHolder
 from ipso_phen.ipapi.base.ipt_functional import get_ipt_class
+from ipso_phen.ipapi.base.grid_search import (
+    aggregate_grid_search_results,
+    get_grid_search_combinations,
+    run_grid_search,
+)
 from ipso_phen.ipapi.base import ip_common as ipc
 from ipso_phen.ipapi.base.ipt_strict_pipeline import IptStrictPipeline
 from ipso_phen.ipapi.base.ip_abstract import BaseImageProcessor
 import ipso_phen.ipapi.tools.error_holder as eh
 from ipso_phen.ipapi.tools.common_functions import force_directories, format_time
 from ipso_phen.ipapi.tools.regions import RectangleRegion
+from ipso_phen.ipapi.tools.image_cache import get_node_cache
 
 
 logger = logging.getLogger(os.path.splitext(__name__)[-1].replace(".", ""))
 last_script_version = "0.2.0.0"
 
+# Call backs also update pipeline and wrapper state, branches send them one at a time
+_call_back_lock = threading.RLock()
+
+_tool_checksums = {}
+
+
+def get_tool_checksum(tool) -> str:
+    """Returns a checksum of the tool source file, package version if not found"""
+    module_name = type(tool).__module__
+    if module_name not in _tool_checksums:
+        try:
+            with open(inspect.getsourcefile(type(tool)), "rb") as f:
+                _tool_checksums[module_name] = hashlib.blake2b(
+                    f.read(), digest_size=16
+                ).hexdigest()
+        except (TypeError, OSError):
+            _tool_checksums[module_name] = version
+    return _tool_checksums[module_name]
+
 
 class MosaicData(object):
     def __init__(self, pipeline, enabled, images):
@@ -84,6 +116,12 @@ class PipelineSettings(IptParamHolder):
             desc="Add a watermark with the name of the generating source to each output image",
             default_value=0,
         )
+        self.add_checkbox(
+            name="parallel_branches",
+            desc="Execute AND/OR merge groups modules concurrently",
+            default_value=0,
+            hint="Modules of merge groups read the same source, running them on threads reduces single image latency",
+        )
         self.add_combobox(
             name="stop_on",
             desc="Stop processing on error level",
@@ -222,39 +260,42 @@ class Node(object):
         force_call_back=False,
         **kwargs,
     ):
-        if call_back is not None:
-            call_back(
-                eh.error_level_to_str(res),
-                msg,
-                data
-                if call_back is not None
-                and (force_call_back or not self.root.parent.silent)
-                else None,
-                self.absolute_index + 1 if is_progress else -1,
-                self.absolute_count if is_progress else -1,
-            )
-        else:
-            if isinstance(res, int) and (res >= logging.WARNING):
-                eh.log_data(log_msg=msg, log_level=res, target_logger=logger)
-        md = np.array(self.root.parent.settings.mosaic.images)
-        wrapper = self.root.parent.wrapper
-        needed_images = wrapper.forced_storage_images_list
-        if isinstance(data, (GroupNode, ModuleNode)):
-            dn = data.name
-            if dn in md:
-                self.root.parent.stored_mosaic_images[dn] = self.get_relevant_image()
-            if dn in needed_images:
-                wrapper.store_image(
-                    image=self.get_relevant_image(exclude_demo=True),
-                    text=dn,
-                    force_store=True,
+        with _call_back_lock:
+            if call_back is not None:
+                call_back(
+                    eh.error_level_to_str(res),
+                    msg,
+                    data
+                    if call_back is not None
+                    and (force_call_back or not self.root.parent.silent)
+                    else None,
+                    self.absolute_index + 1 if is_progress else -1,
+                    self.absolute_count if is_progress else -1,
                 )
-        elif isinstance(data, BaseImageProcessor):
-            for d in data.image_list:
-                if d["name"] in md:
-                    self.root.parent.stored_mosaic_images[d["name"]] = d["image"]
+            else:
+                if isinstance(res, int) and (res >= logging.WARNING):
+                    eh.log_data(log_msg=msg, log_level=res, target_logger=logger)
+            md = np.array(self.root.parent.settings.mosaic.images)
+            wrapper = self.root.parent.wrapper
+            needed_images = wrapper.forced_storage_images_list
+            if isinstance(data, (GroupNode, ModuleNode)):
+                dn = data.name
+                if dn in md:
+                    self.root.parent.stored_mosaic_images[
+                        dn
+                    ] = self.get_relevant_image()
+                if dn in needed_images:
+                    wrapper.store_image(
+                        image=self.get_relevant_image(exclude_demo=True),
+                        text=dn,
+                        force_store=True,
+                    )
+            elif isinstance(data, BaseImageProcessor):
+                for d in data.image_list:
+                    if d["name"] in md:
+                        self.root.parent.stored_mosaic_images[d["name"]] = d["image"]
 
-        self.root.parent.update_error_level(res)
+            self.root.parent.update_error_level(res)
 
     @property
     def root(self):
@@ -320,9 +361,11 @@ class ModuleNode(Node):
         self.tool = kwargs.get("tool")
         self.tool.owner = self
 
-    def _execute_standard(self, tool, call_back=None, target_module: str = ""):
+    def _execute_standard(
+        self, tool, call_back=None, target_module: str = "", wrapper=None
+    ):
         res = {}
-        wrapper = self.root.parent.wrapper
+        wrapper = self.root.parent.wrapper if wrapper is None else wrapper
         if self.root.parent.show_source_image:
             if wrapper is not None and wrapper.current_image is not None:
                 self.do_call_back(
@@ -351,6 +394,13 @@ class ModuleNode(Node):
                     },
                 )
         tool_res = tool.process_wrapper(wrapper=wrapper)
+        if wrapper is not None and not wrapper.file_handler.check_shared_images():
+            self.do_call_back(
+                call_back=call_back,
+                res=logging.ERROR,
+                msg=f"{self.name} modified a shared image in place",
+                data=None,
+            )
         if tool_res is not None:
             # Get ROI
             if self.output_type == ipc.IO_ROI:
@@ -416,10 +466,74 @@ class ModuleNode(Node):
 
         return res
 
-    def _execute_grid_search(self, call_back):
+    @property
+    def use_node_cache(self) -> bool:
+        """Results are cached only if they hold all the changes made by the tool"""
+        pipeline = self.root.parent
+        return (
+            pipeline.node_cache is not None
+            and not pipeline.debug_mode
+            and not pipeline.wrapper.store_images
+            and self.output_type in [ipc.IO_IMAGE, ipc.IO_MASK, ipc.IO_DATA, ipc.IO_ROI]
+            and ipc.ToolFamily.ASSERT not in self.tool.use_case
+            and self.tool.cacheable_result
+        )
+
+    def _execute_cached(
+        self, tool, call_back=None, target_module: str = "", wrapper=None
+    ):
+        """Returns the stored result for the same image and upstream settings,
+        executes the tool and stores its result if there is none
+
+        Tools also write to the wrapper's data_output, read by downstream tools,
+        it is stored with the result and restored with it.
+        """
+        pipeline = self.root.parent
+        wrapper = pipeline.wrapper if wrapper is None else wrapper
+        key = pipeline.get_node_cache_key(self)
+        data = pipeline.node_cache.get(key)
+        if data is not None:
+            try:
+                res, data_output = pickle.loads(data)
+            except Exception as e:
+                logger.warning(f"Discarding node result for {self.name}: {repr(e)}")
+                pipeline.node_cache.discard(key)
+            else:
+                wrapper.data_output.update(data_output)
+                return res
+        res = self._execute_standard(
+            tool=tool,
+            call_back=call_back,
+            target_module=target_module,
+            wrapper=wrapper,
+        )
+        if res:
+            pipeline.node_cache.put(
+                key,
+                pickle.dumps(
+                    (res, dict(wrapper.data_output)), protocol=pickle.HIGHEST_PROTOCOL
+                ),
+            )
+        return res
+
+    def _execute_grid_search(self, **kwargs):
+        """Evaluates parameter combinations concurrently, each one on its own copy
+        of the wrapper, and sends results in completion order
+
+        Keyword Arguments:
+            call_back {callable} -- receives progress and results
+            random_grid_search {bool} -- sample combinations randomly
+            max_grid_search {int} -- maximum combinations evaluated, 0 for all
+            grid_search_combinations {list} -- parameters to evaluate, overrides
+                random_grid_search and max_grid_search
+            abort_callback {callable} -- returns True to stop the search, the
+                search also stops if call_back returns False
+        """
+        call_back = kwargs.get("call_back", None)
+
         def inner_call_back(res, msg, data, step, total):
             if call_back is not None:
-                call_back(
+                return call_back(
                     res,
                     msg,
                     data,
@@ -427,11 +541,14 @@ class ModuleNode(Node):
                     total,
                 )
 
-        param_settings_list = [p.decode_grid_search_options() for p in self.tool.gizmos]
-        size = 1
-        for ps in param_settings_list:
-            if len(ps) > 0:
-                size *= len(ps)
+        combinations = kwargs.get("grid_search_combinations", None)
+        if combinations is None:
+            combinations = get_grid_search_combinations(
+                tool=self.tool,
+                random_sampling=kwargs.get("random_grid_search", False),
+                max_combinations=kwargs.get("max_grid_search", 0),
+            )
+        size = len(combinations)
         inner_call_back(
             res="GRID_SEARCH_START",
             msg="",
@@ -440,27 +557,40 @@ class ModuleNode(Node):
             total=size,
         )
 
-        procs = list(itertools.product(*param_settings_list))
-        keys = [p.name for p in self.tool.gizmos]
         wrapper = self.root.parent.wrapper
+        abort_callback = kwargs.get("abort_callback", None)
 
-        for i, p in enumerate(procs):
-            params = {k: (int(v) if str.isdigit(v) else v) for k, v in zip(keys, p)}
-            res = self._execute_standard(tool=self.tool.__class__(**params))
-            inner_call_back(
-                res="GRID_SEARCH_OK" if res else "GRID_SEARCH_NOK",
-                msg="Failed to process element",
-                data={
-                    "plant_name": wrapper.plant,
-                    "name": wrapper.short_name,
-                    "image": self.get_feedback_image(res),
-                    "data": res.get("data", {}),
-                    "luid": wrapper.luid,
-                    "params": params,
-                },
-                step=i + 1,
-                total=size,
+        def evaluate(params):
+            before = timer()
+            res = self._execute_standard(
+                tool=self.tool.__class__(**params),
+                wrapper=wrapper.fork(),
             )
+            return res, timer() - before
+
+        with closing(run_grid_search(evaluate, combinations)) as results:
+            for i, (_, params, res) in enumerate(results):
+                res, elapsed = ({}, None) if res is None else res
+                go_on = inner_call_back(
+                    res="GRID_SEARCH_OK" if res else "GRID_SEARCH_NOK",
+                    msg="Failed to process element",
+                    data={
+                        "plant_name": wrapper.plant,
+                        "name": wrapper.short_name,
+                        "image": self.get_feedback_image(res),
+                        "data": res.get("data", {}),
+                        "luid": wrapper.luid,
+                        "params": params,
+                        "mask": res.get("mask", None),
+                        "elapsed": elapsed,
+                    },
+                    step=i + 1,
+                    total=size,
+                )
+                if go_on is False or (
+                    abort_callback is not None and abort_callback() is True
+                ):
+                    break
 
         inner_call_back(
             res="GRID_SEARCH_END",
@@ -474,20 +604,27 @@ class ModuleNode(Node):
         call_back = kwargs.get("call_back", None)
         target_module = kwargs.get("target_module", "")
         grid_search_mode = kwargs.get("grid_search_mode", "")
-        wrapper = self.root.parent.wrapper
+        wrapper = kwargs.get("wrapper", None)
+        if wrapper is None:
+            wrapper = self.root.parent.wrapper
 
         if not self.last_result:
             if self.root.parent.image_output_path:
                 self.tool.output_path = self.root.parent.image_output_path
             if target_module == self.uuid and grid_search_mode:
-                self._execute_grid_search(call_back=call_back)
+                self._execute_grid_search(**kwargs)
                 self.last_result = {}
             else:
                 before = timer()
-                self.last_result = self._execute_standard(
+                self.last_result = (
+                    self._execute_cached
+                    if not target_module and self.use_node_cache
+                    else self._execute_standard
+                )(
                     tool=self.tool,
                     call_back=call_back,
                     target_module=target_module,
+                    wrapper=wrapper,
                 )
                 if self.root.parent.debug_mode:
                     data = wrapper
@@ -685,6 +822,48 @@ class GroupNode(Node):
         if isinstance(node, GroupNode) or isinstance(node, ModuleNode):
             self.nodes.insert(min(0, max(index, len(self.nodes))), node)
 
+    def execute_branches(self, **kwargs) -> dict:
+        """Executes modules of an AND/OR group concurrently
+
+        Only used if all enabled children are modules, none of them is targeted
+        and none is an assertion, as groups and targeted modules change the
+        wrapper's state and a failed assertion stops the group. Each module works
+        on a fork of the wrapper, what it stores is merged back in node order.
+        If a module raises, those not started yet are cancelled.
+
+        Returns:
+            dict -- results by node uuid, empty if branches can not run concurrently
+        """
+        nodes = [node for node in self.nodes if node.enabled]
+        if (
+            len(nodes) < 2
+            or not self.root.parent.parallel_branches
+            or not all(node.is_module for node in nodes)
+            or kwargs.get("target_module", "") in [node.uuid for node in nodes]
+            or any(ipc.ToolFamily.ASSERT in node.tool.use_case for node in nodes)
+        ):
+            return {}
+        wrapper = self.root.parent.wrapper
+        forks = [wrapper.fork() for _ in nodes]
+        with ThreadPoolExecutor(
+            max_workers=min(len(nodes), os.cpu_count() or 1)
+        ) as executor:
+            futures = [
+                executor.submit(node.execute, **dict(kwargs, wrapper=fork))
+                for node, fork in zip(nodes, forks)
+            ]
+            try:
+                res = {
+                    node.uuid: future.result() for node, future in zip(nodes, futures)
+                }
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+        for fork in forks:
+            wrapper.merge_fork(fork)
+        return res
+
     def get_source_image(self, source: str, call_back):
         wrapper = self.root.parent.wrapper
         if source == "source":
@@ -827,6 +1006,7 @@ class GroupNode(Node):
                     return node.last_result
         elif self.merge_mode in [ipc.MERGE_MODE_AND, ipc.MERGE_MODE_OR]:
             images = []
+            branches_results = self.execute_branches(**kwargs)
             for node in self.nodes:
                 if not node.enabled:
                     continue
@@ -839,7 +1019,11 @@ class GroupNode(Node):
                         is_progress=False,
                     )
                     continue
-                res = node.execute(**kwargs)
+                res = (
+                    branches_results[node.uuid]
+                    if node.uuid in branches_results
+                    else node.execute(**kwargs)
+                )
                 if self.failed_assert is True:
                     break
                 if self.stop_processing:
@@ -902,6 +1086,7 @@ class GroupNode(Node):
                 self.root.parent.mosaic = wrapper.build_mosaic(
                     image_names=self.parent.settings.mosaic.images,
                     images_dict=self.parent.stored_mosaic_images,
+                    max_width=kwargs.get("mosaic_max_width", 0),
                 )
             else:
                 self.root.parent.mosaic = None
@@ -1227,6 +1412,8 @@ class LoosePipeline(object):
         self.mosaic = None
         self.wrapper: BaseImageProcessor = None
         self.error_level = logging.INFO
+        self.node_cache = None
+        self._node_signatures = {}
 
         self.set_callbacks()
 
@@ -1341,6 +1528,28 @@ class LoosePipeline(object):
         target_group.add_module(tool=operator)
         return True
 
+    def build_node_signatures(self) -> dict:
+        """Returns a hash by node uuid of the node settings and of the settings of
+        all nodes executed before it, tool source code included"""
+        signatures = {}
+        h = hashlib.blake2b(version.encode(), digest_size=16)
+        for node in self.root.iter_items():
+            if node.is_module:
+                node_json = dict(node.to_json(), checksum=get_tool_checksum(node.tool))
+            else:
+                node_json = {k: v for k, v in node.to_json().items() if k != "nodes"}
+            h.update(json.dumps(node_json, sort_keys=True, default=str).encode())
+            signatures[node.uuid] = h.copy().hexdigest()
+        return signatures
+
+    def get_node_cache_key(self, node) -> str:
+        """Returns the node cache key for the node and the current image"""
+        key = hashlib.blake2b(
+            f"{self.wrapper.luid}|{self._node_signatures[node.uuid]}".encode(),
+            digest_size=16,
+        ).hexdigest()
+        return f"{key[:2]}/{key}.pkl"
+
     def update_inputs(self, wrapper):
         node: ModuleNode
         for node in self.root.iter_items("modules"):
@@ -1359,8 +1568,15 @@ class LoosePipeline(object):
         overwrite_data: bool = False,
         store_images: bool = True,
         options=None,
+        data_sink=None,
         **kwargs,
     ):
+        """Executes the pipeline on an image
+
+        If write_data is True, results are written to the wrapper's CSV file,
+        or passed as (header, row) to data_sink if it is not None.
+        """
+
         def log_result(start_time):
             index = kwargs.get("index", -1)
             total = kwargs.get("total", -1)
@@ -1451,6 +1667,13 @@ class LoosePipeline(object):
         # Prepare data holder
         self.wrapper.init_data_holder()
 
+        # Node results are stored by image and upstream settings
+        self.node_cache = (
+            get_node_cache() if options is not None and options.node_cache else None
+        )
+        if self.node_cache is not None:
+            self._node_signatures = self.build_node_signatures()
+
         # Execute pipeline
         self.root.execute(**kwargs)
 
@@ -1472,7 +1695,12 @@ class LoosePipeline(object):
                 key=k, value=v, force_pair=True
             )
 
-        if write_data is True:
+        if write_data is True and data_sink is not None:
+            data_sink(
+                self.wrapper.csv_data_holder.header_to_list(),
+                self.wrapper.csv_data_holder.data_to_list(),
+            )
+        elif write_data is True:
             try:
                 with open(self.wrapper.csv_file_path, "w", newline="") as csv_file_:
                     wr = csv.writer(csv_file_, quoting=csv.QUOTE_NONE)
@@ -1487,6 +1715,102 @@ class LoosePipeline(object):
 
         return self.error_level < self.stop_on
 
+    def grid_search(
+        self,
+        file_list: list,
+        target_module: str,
+        database=None,
+        sample_size: int = 0,
+        random_grid_search: bool = False,
+        max_grid_search: int = 0,
+        abort_callback=None,
+        call_back=None,
+    ):
+        """Evaluates the grid search combinations of a module over several images
+
+        The pipeline runs once per image up to the module, combinations are then
+        evaluated concurrently on copies of the wrapper. All images use the same
+        combinations.
+
+        Arguments:
+            file_list {list} -- image paths, from a database query or an
+                ImageList filter
+            target_module {str} -- uuid of the module with grid search options
+
+        Keyword Arguments:
+            database {DbWrapper} -- images database (default: {None})
+            sample_size {int} -- random images sample size, 0 for all (default: {0})
+            random_grid_search {bool} -- sample combinations randomly (default: {False})
+            max_grid_search {int} -- maximum combinations, 0 for all (default: {0})
+            abort_callback {callable} -- returns True to stop (default: {None})
+            call_back {callable} -- receives pipeline progress (default: {None})
+
+        Returns:
+            pd.DataFrame -- one row by combination, see aggregate_grid_search_results
+        """
+        node = self.root.find_by_uuid(target_module)
+        if node is None or not node.is_module:
+            logger.error(f"Unknown grid search module {target_module}")
+            return None
+        combinations = get_grid_search_combinations(
+            tool=node.tool,
+            random_sampling=random_grid_search,
+            max_combinations=max_grid_search,
+        )
+        file_list = list(file_list)
+        if 0 < sample_size < len(file_list):
+            file_list = random.sample(file_list, sample_size)
+        indexes = {
+            json.dumps(params, sort_keys=True): i
+            for i, params in enumerate(combinations)
+        }
+        records = []
+
+        for file_path in file_list:
+            if abort_callback is not None and abort_callback() is True:
+                break
+            image_records = {}
+
+            def inner_call_back(res, msg, data, step, total):
+                if res in ["GRID_SEARCH_OK", "GRID_SEARCH_NOK"]:
+                    mask = data["mask"]
+                    image_records[json.dumps(data["params"], sort_keys=True)] = dict(
+                        failed=res == "GRID_SEARCH_NOK",
+                        mask_area=None if mask is None else np.count_nonzero(mask),
+                        elapsed=data["elapsed"],
+                    )
+                elif call_back is not None:
+                    return call_back(res, msg, data, step, total)
+
+            self.execute(
+                src_image=BaseImageProcessor(file_path, database=database),
+                silent_mode=True,
+                target_data_base=database,
+                overwrite_data=True,
+                store_images=False,
+                target_module=target_module,
+                grid_search_mode=True,
+                grid_search_combinations=combinations,
+                abort_callback=abort_callback,
+                call_back=inner_call_back,
+            )
+            if abort_callback is not None and abort_callback() is True:
+                break
+            # Combinations not evaluated because the pipeline failed before the
+            # module count as failures
+            for key, index in indexes.items():
+                records.append(
+                    dict(
+                        image_records.get(
+                            key, dict(failed=True, mask_area=None, elapsed=None)
+                        ),
+                        combination=index,
+                        luid=file_path,
+                    )
+                )
+
+        return aggregate_grid_search_results(combinations, records)
+
     def targeted_callback(self, param: IptParam):
         if param.name == "debug_mode":
             if self.root.nodes:
@@ -1696,6 +2020,18 @@ class LoosePipeline(object):
             key="debug_mode", value=1 if value is True else 0, update_widgets=False
         )
 
+    @property
+    def parallel_branches(self):
+        return self.settings.get_value_of("parallel_branches") == 1
+
+    @parallel_branches.setter
+    def parallel_branches(self, value):
+        self.settings.set_value_of(
+            key="parallel_branches",
+            value=1 if value is True else 0,
+            update_widgets=False,
+        )
+
     @property
     def show_tool_result(self):
         return self.settings.get_value_of("show_tool_result") == 1
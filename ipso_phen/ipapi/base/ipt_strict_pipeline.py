@@ -362,7 +362,7 @@ class IptStrictPipeline(object):
 
     def update_settings_feedback(self, src_wrapper, param: IptParam, call_back):
         if (param is None) or ((param.name == "bound_level") and (param.value >= 0)):
-            img = src_wrapper.current_image
+            img = src_wrapper.current_image.copy()
             cv2.line(
                 img,
                 (0, param.value),
@@ -7,17 +7,17 @@ import random
 
 import pandas as pd
 from ipso_phen.ipapi.database.base import DbInfo
-import tqdm
 
 import ipso_phen.ipapi.database.base as dbb
 import ipso_phen.ipapi.database.db_factory as dbf
 from ipso_phen.ipapi.tools.common_functions import force_directories, format_time
 from ipso_phen.ipapi.base.pipeline_processor import PipelineProcessor
 from ipso_phen.ipapi.base.ipt_loose_pipeline import LoosePipeline
-from ipso_phen.ipapi.file_handlers.fh_base import file_handler_factory
+from ipso_phen.ipapi.file_handlers.fh_base import file_handlers_factory
 from ipso_phen.ipapi.tools.image_list import ImageList
 import ipso_phen.ipapi.database.db_passwords as dbp
 from ipso_phen.ipapi.tools.folders import ipso_folders
+from ipso_phen.ipapi.tools.image_cache import get_image_cache, format_cache_stats
 
 
 logger = logging.getLogger("Pipeline launcher")
@@ -77,6 +77,9 @@ def restore_state(blob: Union[str, dict, None], overrides: dict = {}) -> dict:
         experiment=_get_key("experiment", res, overrides, ""),
         randomize=_get_key("randomize", res, overrides, False),
         save_mosaics=_get_key("save_mosaics", res, overrides, False),
+        mosaic_max_width=_get_key("mosaic_max_width", res, overrides, 0),
+        result_sink=_get_key("result_sink", res, overrides, "csv"),
+        node_cache=_get_key("node_cache", res, overrides, False),
     )
 
 
@@ -213,6 +216,9 @@ def launch(**kwargs):
         store_images=res["series_id_time_delta"],
         save_mosaics=res["save_mosaics"] is True,
         write_mosaic=res["save_mosaics"] is True,
+        mosaic_max_width=res["mosaic_max_width"],
+        result_sink=res["result_sink"],
+        node_cache=res["node_cache"] is True,
     )
     pp.options.write_mosaic = True
     if not image_list_:
@@ -242,6 +248,9 @@ def launch(**kwargs):
         f"Images: {len(pp.accepted_files)}",
         f"Concurrent processes count: {mpc}",
         f'Save mosaics: {res["save_mosaics"] is True}',
+        f'Mosaic max width: {res["mosaic_max_width"] or "full size"}',
+        f'Result sink: {res["result_sink"]}',
+        f'Node cache: {res["node_cache"] is True}',
         f"Script summary: {str(script)}",
         "_______________",
     ]:
@@ -265,18 +274,14 @@ def launch(**kwargs):
     if res["build_annotation_csv"]:
         try:
             if pp.options.group_by_series:
-                files, luids = map(list, zip(*groups_to_process))
-                wrappers = [
-                    file_handler_factory(files[i], db)
-                    for i in [luids.index(x) for x in set(luids)]
-                ]
+                series_heads = {}
+                for file, luid in groups_to_process:
+                    series_heads.setdefault(luid, file)
+                wrappers = file_handlers_factory(
+                    list(series_heads.values()), db, use_memo=True
+                )
             else:
-                wrappers = [
-                    file_handler_factory(f, db)
-                    for f in tqdm.tqdm(
-                        groups_to_process, desc="Building annotation CSV"
-                    )
-                ]
+                wrappers = file_handlers_factory(groups_to_process, db, use_memo=True)
             pd.DataFrame.from_dict(
                 {
                     "plant": [i.plant for i in wrappers],
@@ -298,10 +303,21 @@ def launch(**kwargs):
             log_and_print("Built disease index file")
         print(f"{preffix} - Disease index file")
 
+    # Resume previous run, items left are processed again even if a partial file exists
+    resume = pp.can_resume
+    groups_to_process = pp.filter_processed_groups(groups_to_process)
+
     groups_to_process_count = len(groups_to_process)
     if groups_to_process_count > 0:
         pp.multi_thread = mpc
-        pp.process_groups(groups_list=groups_to_process)
+        cache_stats = None if db is None else get_image_cache().get_stats()
+        pp.process_groups(
+            groups_list=groups_to_process, overwrite=True if resume else None
+        )
+        if cache_stats is not None:
+            log_and_print(
+                format_cache_stats(cache_stats, get_image_cache().get_stats())
+            )
 
     # Merge dataframe
     pp.merge_result_files(csv_file_name=csv_file_name + ".csv")
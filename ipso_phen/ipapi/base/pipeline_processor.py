@@ -1,5 +1,10 @@
 import multiprocessing as mp
 import os
+import io
+import csv
+import json
+import atexit
+import queue
 import sys
 from collections import Counter, defaultdict
 from collections import namedtuple
@@ -9,11 +14,17 @@ from timeit import default_timer as timer
 from typing import Union
 import threading
 import gc
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
+import psutil
 from tqdm import tqdm
 
-from ipso_phen.ipapi.file_handlers.fh_base import file_handler_factory
+from ipso_phen.ipapi.file_handlers.fh_base import (
+    file_handler_factory,
+    file_handlers_factory,
+)
+from ipso_phen.ipapi.database.sftp_pool import PREFETCH_COUNT, get_sftp_prefetcher
 from ipso_phen.ipapi.tools.comand_line_wrapper import ArgWrapper
 from ipso_phen.ipapi.tools.common_functions import (
     time_method,
@@ -21,10 +32,40 @@ from ipso_phen.ipapi.tools.common_functions import (
     format_time,
 )
 from ipso_phen.ipapi.tools.image_list import ImageList
+from ipso_phen.ipapi.tools.image_cache import flush_image_caches
+from ipso_phen.ipapi.tools.job_journal import (
+    JOB_FAILED,
+    JOB_OK,
+    JOURNAL_FILE_NAME,
+    JobJournal,
+    get_pipeline_hash,
+)
+from ipso_phen.ipapi.tools.result_sink import (
+    ResultSink,
+    get_columnar_file_path,
+    write_columnar_file,
+)
 from ipso_phen.ipapi.base.ip_abstract import BaseImageProcessor
+from ipso_phen.ipapi.base.ipt_loose_pipeline import LoosePipeline
 
 USE_TQDM = True
 
+MERGE_READ_WORKERS = 8
+# Columns of the merged CSV file that are moved to the front, in this order
+MERGE_FRONT_COLUMNS = [
+    "experiment",
+    "plant",
+    "genotype",
+    "condition",
+    "date_time",
+    "camera",
+    "angle",
+    "wavelength",
+    "luid",
+    "source_path",
+    "area",
+]
+
 logger = logging.getLogger(os.path.splitext(__name__)[-1].replace(".", ""))
 if USE_TQDM is False:
     logger.addHandler(logging.StreamHandler(sys.stdout))
@@ -34,22 +75,46 @@ def _dummy_worker(args):
     return args
 
 
-def _pipeline_worker(arg):
-    """Creates an ip object and executs
-
-    Arguments:
-        arg {list} -- file_path, log_timings, options
+def _read_partial_result(csv_file: str):
+    """Reads a partial result file as text, type inference is left to the merge
 
     Returns:
-        boolean -- is return successful
-        string -- wrapper name
-        string -- error message
+        tuple -- header and rows, None if file is empty, the exception if
+            reading failed
     """
+    try:
+        with open(csv_file, "r", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if not header:
+                return None
+            rows = list(reader)
+        if any(len(row) != len(header) for row in rows):
+            raise ValueError(f"Wrong column count in {csv_file}")
+        return header, rows
+    except Exception as e:
+        return e
 
-    # Extract parameters
-    file_path, options, script, db = arg
 
+def _execute_pipeline(file_path, options, script, db, overwrite=None):
+    """Executes script on a single file or group
+
+    Arguments:
+        file_path {str, tuple} -- file path or (file path, luid) tuple
+        options {ArgWrapper} -- process options
+        script {LoosePipeline} -- pipeline to execute
+        db {DbWrapper} -- target database
+
+    Keyword Arguments:
+        overwrite {bool} -- process the file even if its partial result file
+          exists, options.overwrite if None (default: {None})
+
+    Returns:
+        dict -- process result, with result rows as (header, row) tuples if
+            options.result_sink is not "csv"
+    """
     start_time = timer()
+    data = []
     try:
         bool_res = script.execute(
             src_image=file_path if isinstance(file_path, str) else file_path[0],
@@ -59,12 +124,16 @@ def _pipeline_worker(arg):
             if isinstance(file_path, tuple)
             else {},
             write_data=True,
+            data_sink=None
+            if options.result_sink == "csv"
+            else lambda header, row: data.append((header, row)),
             target_data_base=db,
-            overwrite_data=options.overwrite,
+            overwrite_data=options.overwrite if overwrite is None else overwrite,
             store_images=False,
             options=options,
             call_back=None,
             save_mosaic=options.write_mosaic is True,
+            mosaic_max_width=options.mosaic_max_width,
         )
     except Exception as e:
         return {
@@ -73,6 +142,8 @@ def _pipeline_worker(arg):
             "image_name": file_path,
             "error_message": repr(e),
             "time_spent": format_time(timer() - start_time),
+            "item": file_path,
+            "elapsed": timer() - start_time,
         }
     else:
         return {
@@ -82,9 +153,305 @@ def _pipeline_worker(arg):
             "image_name": "Unknown" if script.wrapper is None else str(script.wrapper),
             "error_message": "",
             "time_spent": format_time(timer() - start_time),
+            "data": data,
+            "item": file_path,
+            "elapsed": timer() - start_time,
         }
 
 
+def _pipeline_worker(arg):
+    """Creates an ip object and executs
+
+    Arguments:
+        arg {list} -- file_path, options, script, database
+
+    Returns:
+        dict -- process result
+    """
+
+    # Extract parameters
+    file_path, options, script, db = arg
+
+    res = _execute_pipeline(file_path=file_path, options=options, script=script, db=db)
+    # Cache statistics are read by the parent process once the batch is done
+    flush_image_caches()
+    return res
+
+
+# Data held by each process of the worker pool, set once by the pool initializer
+_worker_data = {}
+
+
+def _init_pipeline_worker(options, script_json, db, overwrite=None):
+    """Pool initializer, builds the pipeline once for the worker's lifetime
+
+    Arguments:
+        options {ArgWrapper} -- process options
+        script_json {dict} -- pipeline as returned by LoosePipeline.to_json
+        db {DbWrapper} -- target database
+        overwrite {bool} -- overwrite existing partial files, options.overwrite
+          if None
+    """
+    _worker_data["options"] = options
+    _worker_data["script"] = LoosePipeline.from_json(json_data=script_json)
+    _worker_data["database"] = db
+    _worker_data["overwrite"] = overwrite
+
+
+def _preloaded_pipeline_worker(file_path):
+    """Executes the pipeline preloaded by the pool initializer
+
+    Arguments:
+        file_path {str, tuple} -- file path or (file path, luid) tuple
+
+    Returns:
+        dict -- process result
+    """
+    res = _execute_pipeline(
+        file_path=file_path,
+        options=_worker_data["options"],
+        script=_worker_data["script"],
+        db=_worker_data["database"],
+        overwrite=_worker_data["overwrite"],
+    )
+    # Cache statistics are read by the parent process once the batch is done
+    flush_image_caches()
+    return res
+
+
+class PipelineWorkerPool:
+    """Process pool where each worker holds a warm copy of the pipeline
+
+    Options, pipeline and database are sent once to each worker when the pool
+    is created, tasks only carry the file path or (file path, luid) tuple.
+    """
+
+    def __init__(self, processes: int, options, script, database, overwrite=None):
+        script_json = script.to_json()
+        self.processes = processes
+        self.signature = PipelineWorkerPool.build_signature(
+            processes=processes,
+            options=options,
+            script_json=script_json,
+            database=database,
+            overwrite=overwrite,
+        )
+        self._pool = mp.Pool(
+            processes=processes,
+            initializer=_init_pipeline_worker,
+            initargs=(
+                options,
+                script_json,
+                None if database is None else database.copy(),
+                overwrite,
+            ),
+        )
+
+    @staticmethod
+    def build_signature(
+        processes: int, options, script_json: dict, database, overwrite=None
+    ) -> str:
+        return json.dumps(
+            {
+                "processes": processes,
+                "options": {k: str(v) for k, v in vars(options).items()},
+                "overwrite": overwrite,
+                "script": {k: v for k, v in script_json.items() if k != "date"},
+                "database": None
+                if database is None or database.db_info is None
+                else database.db_info.to_json(),
+            },
+            sort_keys=True,
+            default=str,
+        )
+
+    def imap_unordered(self, groups_list, chunksize: int = 1):
+        return self._pool.imap_unordered(
+            _preloaded_pipeline_worker,
+            groups_list,
+            chunksize,
+        )
+
+    def imap_throttled(
+        self,
+        groups_list,
+        max_pending: int,
+        min_available_memory: int = 0,
+    ):
+        """Yields results in completion order, submitting tasks as resources allow
+
+        A new task is submitted only if less than max_pending tasks are running
+        and available memory is above min_available_memory. At least one task is
+        always kept running so the process can not stall.
+        """
+        results = queue.Queue()
+        pending = 0
+        items = iter(groups_list)
+        exhausted = False
+        while True:
+            while not exhausted and pending < max_pending:
+                if pending > 0 and get_available_memory() < min_available_memory:
+                    break
+                try:
+                    fl = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                self._pool.apply_async(
+                    _preloaded_pipeline_worker,
+                    (fl,),
+                    callback=results.put,
+                    error_callback=lambda e, fl=fl: results.put(
+                        {
+                            "result": False,
+                            "result_as_text": "",
+                            "image_name": str(fl),
+                            "error_message": repr(e),
+                            "time_spent": format_time(0),
+                            "item": fl,
+                        }
+                    ),
+                )
+                pending += 1
+            if pending == 0:
+                break
+            yield results.get()
+            pending -= 1
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def terminate(self):
+        self._pool.terminate()
+        self._pool.join()
+
+
+_worker_pool: PipelineWorkerPool = None
+
+# Part of available memory that workers are allowed to use
+MAX_MEMORY_USAGE = 0.8
+# Smallest memory estimate for one worker, probes may see no increase when memory
+# already held by the process is reused
+MIN_WORKER_MEMORY = 256 * 2 ** 20
+
+
+def get_available_memory() -> int:
+    """Returns available physical memory in bytes"""
+    return psutil.virtual_memory().available
+
+
+def get_worker_count(requested: int, items_count: int, peak_memory: int = 0) -> int:
+    """Returns how many workers can run concurrently
+
+    Arguments:
+        requested {int} -- Requested number of processes
+        items_count {int} -- Number of items to process
+        peak_memory {int} -- Estimated memory needed to process one item in bytes
+
+    Returns:
+        int -- Worker count, at least 1
+    """
+    count = min(requested, items_count)
+    if peak_memory > 0:
+        count = min(
+            count,
+            int(get_available_memory() * MAX_MEMORY_USAGE // peak_memory),
+        )
+    return max(1, count)
+
+
+class PeakMemoryProbe:
+    """Context manager sampling the memory used by the current process
+
+    Once exited, peak_memory holds the highest resident memory increase
+    observed since entering the context.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_memory = 0
+        self._process = psutil.Process(os.getpid())
+        self._base_memory = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._base_memory = self._process.memory_info().rss
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        self._thread.join()
+        self._update_peak()
+
+    def _update_peak(self):
+        self.peak_memory = max(
+            self.peak_memory,
+            self._process.memory_info().rss - self._base_memory,
+        )
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self._update_peak()
+            self._stop.wait(self.interval)
+
+
+def get_worker_pool(
+    processes: int, options, script, database, overwrite=None
+) -> PipelineWorkerPool:
+    """Returns a worker pool matching the parameters
+
+    The last pool created is kept alive and reused as long as the number of
+    processes, the options, the pipeline, the database and overwrite do not
+    change.
+    """
+    global _worker_pool
+
+    if _worker_pool is not None:
+        signature = PipelineWorkerPool.build_signature(
+            processes=processes,
+            options=options,
+            script_json=script.to_json(),
+            database=database,
+            overwrite=overwrite,
+        )
+        if signature == _worker_pool.signature:
+            return _worker_pool
+        close_worker_pool()
+    _worker_pool = PipelineWorkerPool(
+        processes=processes,
+        options=options,
+        script=script,
+        database=database,
+        overwrite=overwrite,
+    )
+    return _worker_pool
+
+
+def close_worker_pool(terminate: bool = False):
+    """Releases the shared worker pool if any
+
+    Keyword Arguments:
+        terminate {bool} -- Kill workers instead of waiting for pending tasks (default: {False})
+    """
+    global _worker_pool
+
+    if _worker_pool is None:
+        return
+    if terminate:
+        _worker_pool.terminate()
+    else:
+        _worker_pool.close()
+    _worker_pool = None
+
+
+atexit.register(close_worker_pool)
+
+
 class PipelineProcessor:
     """Process image processing pipelines according to options
 
@@ -98,6 +465,7 @@ class PipelineProcessor:
     - write_result: Write output images, required= False, default=True)
     - write_result_text: Write result text file, required= False, default=False
     - write_mosaic: Write mosaic image in a separate folder
+    - mosaic_max_width: Shrink mosaic tiles to fit this width, required=False, default=0 (full size)
     - overwrite: Overwrite already analysed files, required= False, default=False
     - seed_output: Suffix output folder with date, required= False, default=False
     - threshold_only: if true no analysis will be performed after threshold, required=False, default=False
@@ -120,6 +488,9 @@ class PipelineProcessor:
         self._progress_total = 0
         self._progress_step = 0
         self._last_garbage_collected = timer()
+        self.result_sink = ResultSink()
+        self._job_journal = None
+        self._pipeline_hash = None
 
     def build_files_list(self, src_path: str, flatten_list=True, **kwargs):
         """Build a list containing all the files that will be parsed
@@ -189,6 +560,8 @@ class PipelineProcessor:
             self.report_error(logging.ERROR, "Process error - UNKNOWN ERROR")
             self._process_errors += 1
         else:
+            self.result_sink.add_rows(wrapper_res.get("data", []))
+            self.record_job(wrapper_res)
             self.log_result(
                 wrapper_res=wrapper_res,
                 wrapper_index=wrapper_index,
@@ -204,6 +577,8 @@ class PipelineProcessor:
             self.report_error(logging.ERROR, "Process error - UNKNOWN ERROR")
             self._process_errors += 1
         else:
+            self.result_sink.add_rows(wrapper_res.get("data", []))
+            self.record_job(wrapper_res)
             msg = self.log_result(
                 wrapper_res=wrapper_res,
                 wrapper_index=wrapper_index,
@@ -217,6 +592,79 @@ class PipelineProcessor:
         }
         self._progress_step += 1
 
+    @property
+    def job_journal_path(self) -> str:
+        return os.path.join(self.options.dst_path, JOURNAL_FILE_NAME)
+
+    @property
+    def job_journal(self) -> JobJournal:
+        if (
+            self._job_journal is None
+            or self._job_journal.file_path != self.job_journal_path
+        ):
+            force_directories(self.options.dst_path)
+            self._job_journal = JobJournal(self.job_journal_path)
+        return self._job_journal
+
+    def record_job(self, wrapper_res: dict):
+        """Stores the status of a processed item in the job journal
+
+        Only partial CSV files are written while processing, rows collected by
+        other result sinks are lost if the run stops, so their items are not
+        recorded.
+        """
+        if (
+            self._pipeline_hash is None
+            or "item" not in wrapper_res
+            or self.options.result_sink != "csv"
+        ):
+            return
+        try:
+            self.job_journal.record(
+                item=wrapper_res["item"],
+                status=JOB_OK if wrapper_res["result"] is True else JOB_FAILED,
+                pipeline_hash=self._pipeline_hash,
+                time_spent=wrapper_res.get("elapsed", 0),
+                error_message=wrapper_res["error_message"],
+            )
+        except Exception as e:
+            logger.warning(f"Unable to update job journal: {repr(e)}")
+
+    @property
+    def can_resume(self) -> bool:
+        """True if a previous run can be resumed using its job journal
+
+        Only runs writing partial CSV files can be resumed, other result sinks
+        keep rows in memory until the end of the run.
+        """
+        return (
+            not self.options.overwrite
+            and self.script is not None
+            and self.options.result_sink == "csv"
+            and os.path.isfile(self.job_journal_path)
+        )
+
+    def filter_processed_groups(self, groups_list: list) -> list:
+        """Removes items already processed by the current pipeline
+
+        If the run can be resumed, only items that failed, were processed by
+        another pipeline or never processed are kept. Those must then be
+        processed with overwrite set, as their partial file may be truncated or
+        stale. Otherwise all items are kept and existing partial files are
+        skipped when processing without overwrite.
+
+        Returns:
+            list -- items to process
+        """
+        if not self.can_resume:
+            return groups_list
+        res = self.job_journal.filter_pending(
+            items=groups_list,
+            pipeline_hash=get_pipeline_hash(self.script),
+        )
+        logger.info(f"Job journal: {len(groups_list) - len(res)} items already done")
+        return res
+
     def init_progress(
         self,
         total: int,
@@ -289,9 +737,10 @@ class PipelineProcessor:
             total=len(self.accepted_files), desc="Building plants dictionaries"
         )
         plants_ = defaultdict(list)
-        for item in self.accepted_files:
+        for fh in file_handlers_factory(
+            self.accepted_files, self._target_database, use_memo=True
+        ):
             self.update_progress()
-            fh = file_handler_factory(item, self._target_database)
             plants_[fh.plant].append(fh)
 
         # Sort all lists by timestamp
@@ -334,9 +783,12 @@ class PipelineProcessor:
         )
         plants_ = defaultdict(list)
         total = len(self.accepted_files)
-        for i, item in enumerate(self.accepted_files):
+        for i, fh in enumerate(
+            file_handlers_factory(
+                self.accepted_files, self._target_database, use_memo=True
+            )
+        ):
             yield {"step": i, "total": total}
-            fh = file_handler_factory(item, self._target_database)
             plants_[fh.plant].append(fh)
 
         self.close_progress()
@@ -385,40 +837,42 @@ class PipelineProcessor:
 
         self.groups_to_process = files_to_process
 
-    def merge_result_files(self, csv_file_name: str) -> Union[None, pd.DataFrame]:
-        logger.info("   --- Starting file merging ---")
-        csv_lst = ImageList.match_end(self.options.partials_path, "_result.csv")
-        self.init_progress(total=len(csv_lst), desc="Merging CSV files")
+    def _iter_partial_results(self, csv_lst: list):
+        """Reads partial result files in parallel, yields them in list order"""
+        with ThreadPoolExecutor(max_workers=MERGE_READ_WORKERS) as executor:
+            yield from executor.map(_read_partial_result, csv_lst)
 
-        dataframe = pd.DataFrame()
-        merge_errors_count = 0
-        for csv_file in csv_lst:
-            try:
-                dataframe = pd.concat([dataframe, pd.read_csv(csv_file)])
-            except Exception as e:
-                merge_errors_count += 1
-            self.update_progress()
-        if merge_errors_count > 0:
-            logger.warning(f"{merge_errors_count} merge errors")
+    def _write_merged_results(self, partials: list, csv_file_name: str) -> pd.DataFrame:
+        """Streams partial results to a single CSV with a unified header, then
+        loads it once to sort it and write the merged file
 
-        def put_column_in_front(col_name: str, dataframe):
-            df_cols = list(dataframe.columns)
-            if col_name not in df_cols:
-                return dataframe
-            df_cols.pop(df_cols.index(col_name))
-            return dataframe.reindex(columns=[col_name] + df_cols)
-
-        dataframe = put_column_in_front(col_name="area", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="source_path", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="luid", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="wavelength", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="angle", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="camera", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="date_time", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="condition", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="genotype", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="plant", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="experiment", dataframe=dataframe)
+        Arguments:
+            partials {list} -- (header, rows) tuples
+            csv_file_name {str} -- merged file name
+        """
+        columns = {}
+        for header, _ in partials:
+            columns.update(dict.fromkeys(header))
+        columns = list(columns)
+        if not columns:
+            dataframe = pd.DataFrame()
+        else:
+            front_cols = [c for c in MERGE_FRONT_COLUMNS if c in columns]
+            columns = front_cols + [c for c in columns if c not in front_cols]
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            for header, rows in partials:
+                if header == columns:
+                    writer.writerows(rows)
+                else:
+                    indexes = {c: i for i, c in enumerate(header)}
+                    order = [indexes.get(c, None) for c in columns]
+                    writer.writerows(
+                        ["" if i is None else row[i] for i in order] for row in rows
+                    )
+            buffer.seek(0)
+            dataframe = pd.read_csv(buffer, low_memory=False)
 
         sort_list = ["plant"] if "plant" in list(dataframe.columns) else []
         sort_list = (
@@ -431,9 +885,36 @@ class PipelineProcessor:
 
         dataframe = dataframe.reset_index(drop=True)
 
-        dataframe.to_csv(
-            path_or_buf=os.path.join(self.options.dst_path, csv_file_name), index=False
-        )
+        csv_file_path = os.path.join(self.options.dst_path, csv_file_name)
+        dataframe.to_csv(path_or_buf=csv_file_path, index=False)
+        if self.options.result_sink != "csv":
+            write_columnar_file(
+                dataframe=dataframe,
+                file_path=get_columnar_file_path(
+                    csv_file_path, self.options.result_sink
+                ),
+                file_format=self.options.result_sink,
+            )
+        return dataframe
+
+    def merge_result_files(self, csv_file_name: str) -> Union[None, pd.DataFrame]:
+        logger.info("   --- Starting file merging ---")
+        csv_lst = ImageList.match_end(self.options.partials_path, "_result.csv")
+        self.init_progress(total=len(csv_lst), desc="Merging CSV files")
+
+        partials = []
+        merge_errors_count = 0
+        for res in self._iter_partial_results(csv_lst):
+            if isinstance(res, tuple):
+                partials.append(res)
+            elif isinstance(res, Exception):
+                merge_errors_count += 1
+            self.update_progress()
+        if merge_errors_count > 0:
+            logger.warning(f"{merge_errors_count} merge errors")
+
+        partials.extend(self.result_sink.partials)
+        dataframe = self._write_merged_results(partials, csv_file_name)
         self.close_progress()
         logger.info("   --- Merged partial outputs ---<br>")
 
@@ -448,50 +929,17 @@ class PipelineProcessor:
             yield_mode=True,
         )
 
-        dataframe = pd.DataFrame()
+        partials = []
         total = len(csv_lst)
-        for i, csv_file in enumerate(csv_lst):
-            try:
-                dataframe = pd.concat([dataframe, pd.read_csv(csv_file)])
-            except pd.errors.EmptyDataError:
-                pass
-            except Exception as e:
-                logger.exception("Merge error")
+        for i, res in enumerate(self._iter_partial_results(csv_lst)):
+            if isinstance(res, tuple):
+                partials.append(res)
+            elif isinstance(res, Exception):
+                logger.error(f"Merge error: {repr(res)}")
             yield {"step": i, "total": total}
 
-        def put_column_in_front(col_name: str, dataframe):
-            df_cols = list(dataframe.columns)
-            if col_name not in df_cols:
-                return dataframe
-            df_cols.pop(df_cols.index(col_name))
-            return dataframe.reindex(columns=[col_name] + df_cols)
-
-        dataframe = put_column_in_front(col_name="area", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="source_path", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="luid", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="wavelength", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="angle", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="camera", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="date_time", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="condition", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="genotype", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="plant", dataframe=dataframe)
-        dataframe = put_column_in_front(col_name="experiment", dataframe=dataframe)
-
-        sort_list = ["plant"] if "plant" in list(dataframe.columns) else []
-        sort_list = (
-            sort_list + ["date_time"]
-            if "date_time" in list(dataframe.columns)
-            else sort_list
-        )
-        if sort_list:
-            dataframe = dataframe.sort_values(by=sort_list, axis=0, na_position="first")
-
-        dataframe = dataframe.reset_index(drop=True)
-
-        dataframe.to_csv(
-            path_or_buf=os.path.join(self.options.dst_path, csv_file_name), index=False
-        )
+        partials.extend(self.result_sink.partials)
+        dataframe = self._write_merged_results(partials, csv_file_name)
         self.close_progress()
         logger.info("   --- Merged partial outputs ---<br>")
 
@@ -510,63 +958,132 @@ class PipelineProcessor:
             yield {"step": 1, "total": 1}
         self.groups_to_process = self.accepted_files[:]
 
-    def process_groups(self, groups_list):
+    def get_requested_workers(self) -> int:
+        """Returns the number of concurrent processes requested by the options
+
+        True means as many processes as available cores, False or any integer lower
+        than 2 means sequential processing.
+        """
+        if isinstance(self.multi_thread, bool):
+            return mp.cpu_count() if self.multi_thread else 1
+        elif isinstance(self.multi_thread, int):
+            return max(1, self.multi_thread)
+        else:
+            return 1
+
+    def probe_memory(self, item, db, overwrite=None):
+        """Processes item in the current process while monitoring its memory
+
+        Returns:
+            tuple -- process result, peak memory used by the process in bytes, at
+              least MIN_WORKER_MEMORY
+        """
+        with PeakMemoryProbe() as probe:
+            res = _execute_pipeline(
+                file_path=item,
+                options=self.options,
+                script=self.script,
+                db=db,
+                overwrite=overwrite,
+            )
+        logger.info(f"Probe run used {probe.peak_memory / 2 ** 20:.0f}MiB")
+        return res, max(probe.peak_memory, MIN_WORKER_MEMORY)
+
+    def prefetch_sources(self, groups_list, db):
+        """Queues download of remote source images so it overlaps processing"""
+        files = []
+        for item in groups_list:
+            try:
+                remote_source = file_handler_factory(
+                    item if isinstance(item, str) else item[0], db, use_memo=True
+                ).remote_source
+            except Exception as e:
+                logger.warning(f"Unable to prefetch {item}: {repr(e)}")
+            else:
+                if remote_source is not None:
+                    files.append(remote_source)
+        get_sftp_prefetcher().prefetch(files)
+
+    def _iter_sequential_results(self, groups_list, db, overwrite=None):
+        for i, fl in enumerate(groups_list):
+            if db is not None:
+                self.prefetch_sources(groups_list[i + 1 : i + 1 + PREFETCH_COUNT], db)
+            yield _execute_pipeline(
+                file_path=fl,
+                options=self.options,
+                script=self.script,
+                db=db,
+                overwrite=overwrite,
+            )
+        if db is not None:
+            get_sftp_prefetcher().prefetch([])
+
+    def _iter_process_results(self, groups_list, overwrite=None):
+        """Processes all groups, yields results in completion order
+
+        If more than one process is requested, the first group is processed in
+        the current process to estimate the memory needed by each worker, the pool
+        is then sized from available cores and memory. While processing, new
+        groups are only submitted if there is enough free memory to handle them.
+        """
+        num_cores = min(self.get_requested_workers(), len(groups_list))
+        db = None if self._target_database is None else self._target_database.copy()
+        if num_cores < 2:
+            yield from self._iter_sequential_results(groups_list, db, overwrite)
+            return
+
+        res, peak_memory = self.probe_memory(
+            item=groups_list[0], db=db, overwrite=overwrite
+        )
+        yield res
+        groups_list = groups_list[1:]
+        num_cores = get_worker_count(
+            requested=num_cores,
+            items_count=len(groups_list),
+            peak_memory=peak_memory,
+        )
+        logger.info(f"Using {num_cores} concurrent processes")
+        if num_cores < 2:
+            yield from self._iter_sequential_results(groups_list, db, overwrite)
+        else:
+            pool = get_worker_pool(
+                processes=num_cores,
+                options=self.options,
+                script=self.script,
+                database=self._target_database,
+                overwrite=overwrite,
+            )
+            yield from pool.imap_throttled(
+                groups_list=groups_list,
+                max_pending=num_cores * 2,
+                min_available_memory=peak_memory,
+            )
+
+    def process_groups(self, groups_list, overwrite=None):
+        """Processes groups and collects their results
+
+        Keyword Arguments:
+            overwrite {bool} -- process files even if their partial result file
+              exists, options.overwrite if None (default: {None})
+        """
         # Build images and data
         if groups_list:
             force_directories(self.options.partials_path)
+            self.result_sink.clear()
+            self._pipeline_hash = (
+                None if self.script is None else get_pipeline_hash(self.script)
+            )
             logger.info(f"   --- Processing {len(groups_list)} files ---")
             self.init_progress(total=len(groups_list), desc="Processing images")
 
-            max_cores = min([10, mp.cpu_count()])
-            if isinstance(self.multi_thread, int):
-                num_cores = min(self.multi_thread, max_cores)
-            elif isinstance(self.multi_thread, bool):
-                if self.multi_thread:
-                    num_cores = max_cores
-                else:
-                    num_cores = 1
-            else:
-                num_cores = 1
-            if (num_cores > 1) and len(groups_list) > 1:
-                pool = mp.Pool(num_cores)
-                chunky_size_ = num_cores
-                for i, res in enumerate(
-                    pool.imap_unordered(
-                        _pipeline_worker,
-                        (
-                            (
-                                fl,
-                                self.options,
-                                self.script,
-                                None
-                                if self._target_database is None
-                                else self._target_database.copy(),
-                            )
-                            for fl in groups_list
-                        ),
-                        chunky_size_,
-                    )
-                ):
-                    if self.check_abort():
-                        logger.info("User stopped process")
-                        break
-                    self.handle_result(res, i, len(groups_list))
-            else:
-                for i, fl in enumerate(groups_list):
-                    res = _pipeline_worker(
-                        [
-                            fl,
-                            self.options,
-                            self.script,
-                            None
-                            if self._target_database is None
-                            else self._target_database.copy(),
-                        ]
-                    )
-                    if self.check_abort():
-                        logger.info("User stopped process")
-                        break
-                    self.handle_result(res, i, len(groups_list))
+            for i, res in enumerate(
+                self._iter_process_results(groups_list, overwrite=overwrite)
+            ):
+                if self.check_abort():
+                    logger.info("User stopped process")
+                    close_worker_pool(terminate=True)
+                    break
+                self.handle_result(res, i, len(groups_list))
             self.close_progress()
             logger.info("   --- Files processed ---")
 
@@ -574,6 +1091,10 @@ class PipelineProcessor:
         # Build images and data
         if groups_list:
             force_directories(self.options.partials_path)
+            self.result_sink.clear()
+            self._pipeline_hash = (
+                None if self.script is None else get_pipeline_hash(self.script)
+            )
             logger.info(f"   --- Processing {len(groups_list)} files ---")
             self.init_progress(
                 total=len(groups_list),
@@ -581,17 +1102,8 @@ class PipelineProcessor:
                 yield_mode=True,
             )
 
-            max_cores = min([10, mp.cpu_count()])
-            if isinstance(self.multi_thread, int):
-                num_cores = min(self.multi_thread, max_cores)
-            elif isinstance(self.multi_thread, bool):
-                if self.multi_thread:
-                    num_cores = max_cores
-                else:
-                    num_cores = 1
-            else:
-                num_cores = 1
-            if (num_cores > 1) and len(groups_list) > 1:
+            num_cores = min(self.get_requested_workers(), len(groups_list))
+            if num_cores > 1:
                 pool = mp.Pool(num_cores)
                 chunky_size_ = num_cores
                 total = len(groups_list)
@@ -621,10 +1133,20 @@ class PipelineProcessor:
             self.close_progress()
             logger.info("   --- Files processed ---")
 
-    def yield_process_groups(self, groups_list):
+    def yield_process_groups(self, groups_list, overwrite=None):
+        """Processes groups and collects their results, yields progress
+
+        Keyword Arguments:
+            overwrite {bool} -- process files even if their partial result file
+              exists, options.overwrite if None (default: {None})
+        """
         # Build images and data
         if groups_list:
             force_directories(self.options.partials_path)
+            self.result_sink.clear()
+            self._pipeline_hash = (
+                None if self.script is None else get_pipeline_hash(self.script)
+            )
             logger.info(f"   --- Processing {len(groups_list)} files ---")
             self.init_progress(
                 total=len(groups_list),
@@ -632,64 +1154,18 @@ class PipelineProcessor:
                 yield_mode=True,
             )
 
-            max_cores = min([10, mp.cpu_count()])
-            if isinstance(self.multi_thread, int):
-                num_cores = min(self.multi_thread, max_cores)
-            elif isinstance(self.multi_thread, bool):
-                if self.multi_thread:
-                    num_cores = max_cores
-                else:
-                    num_cores = 1
-            else:
-                num_cores = 1
-            if (num_cores > 1) and len(groups_list) > 1:
-                pool = mp.Pool(num_cores)
-                chunky_size_ = num_cores
-                for i, res in enumerate(
-                    pool.imap_unordered(
-                        _pipeline_worker,
-                        (
-                            (
-                                fl,
-                                self.options,
-                                self.script,
-                                None
-                                if self._target_database is None
-                                else self._target_database.copy(),
-                            )
-                            for fl in groups_list
-                        ),
-                        chunky_size_,
-                    )
-                ):
-                    if self.check_abort():
-                        logger.info("User stopped process")
-                        break
-                    yield from self.yield_handle_result(
-                        res,
-                        i,
-                        len(groups_list),
-                    )
-            else:
-                for i, fl in enumerate(groups_list):
-                    res = _pipeline_worker(
-                        [
-                            fl,
-                            self.options,
-                            self.script,
-                            None
-                            if self._target_database is None
-                            else self._target_database.copy(),
-                        ]
-                    )
-                    if self.check_abort():
-                        logger.info("User stopped process")
-                        break
-                    yield from self.yield_handle_result(
-                        res,
-                        i,
-                        len(groups_list),
-                    )
+            for i, res in enumerate(
+                self._iter_process_results(groups_list, overwrite=overwrite)
+            ):
+                if self.check_abort():
+                    logger.info("User stopped process")
+                    close_worker_pool(terminate=True)
+                    break
+                yield from self.yield_handle_result(
+                    res,
+                    i,
+                    len(groups_list),
+                )
             self.close_progress()
             logger.info("   --- Files processed ---")
 
@@ -16,6 +16,8 @@ from ipso_phen.ipapi.tools.common_functions import (
 
 logger = logging.getLogger(os.path.splitext(__name__)[-1].replace(".", ""))
 
+KEEP_ALIVE_INTERVAL = 30
+
 
 class LipmCalculConnect:
     def __init__(self, target_ftp: bool) -> None:
@@ -43,6 +45,7 @@ class LipmCalculConnect:
                 username=self._user,
                 password=self._password,
             )
+            self._transport.set_keepalive(KEEP_ALIVE_INTERVAL)
             self._sftp: paramiko.SFTPClient = paramiko.SFTPClient.from_transport(
                 self._transport
             )
@@ -60,6 +63,13 @@ class LipmCalculConnect:
         if self._sftp is not None:
             self._sftp.close()
 
+    def is_alive(self) -> bool:
+        return self._transport is not None and self._transport.is_active()
+
+    @property
+    def target_ftp(self):
+        return self._target_ftp
+
 
 class DbInfo:
     def __init__(self, **kwargs):
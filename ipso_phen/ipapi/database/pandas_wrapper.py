@@ -1,5 +1,6 @@
 import os
 import logging
+from typing import Union
 from sqlalchemy.inspection import _self_inspects
 from tqdm import tqdm
 
@@ -130,6 +131,7 @@ class PandasDbWrapper(DbWrapper, PandasQueryHandler):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.df_builder = None
+        self._luid_index = None
 
     def __del__(self):
         pass
@@ -165,6 +167,30 @@ class PandasDbWrapper(DbWrapper, PandasQueryHandler):
                 self.dataframe = self.df_builder(self.db_info.display_name)
                 self.dataframe.to_csv(self.cache_file_path)
             self.dataframe = self.check_dataframe(dataframe=self.dataframe)
+            self.build_luid_index()
+
+    def build_luid_index(self) -> dict:
+        """Builds a dictionary of rows as dictionaries indexed by luid
+
+        If luids are duplicated, the first row is kept
+        """
+        self._luid_index = {}
+        if self.dataframe is not None and "luid" in self.dataframe.columns:
+            for record in self.dataframe.to_dict("records"):
+                self._luid_index.setdefault(record["luid"], record)
+        return self._luid_index
+
+    def get_record_by_luid(self, luid) -> Union[dict, None]:
+        """Returns the row matching luid as a dictionary, None if not found"""
+        if self._luid_index is None:
+            self.connect()
+            if self._luid_index is None:
+                self.build_luid_index()
+        return self._luid_index.get(luid, None)
+
+    def get_records_by_luid(self, luids: list) -> list:
+        """Returns the rows matching luids as dictionaries, None for unknown luids"""
+        return [self.get_record_by_luid(luid) for luid in luids]
 
     def open_connexion(self) -> bool:
         return self.dataframe is not None
@@ -186,6 +212,7 @@ class PandasDbWrapper(DbWrapper, PandasQueryHandler):
         cache_file_path = self.cache_file_path
         if os.path.isfile(cache_file_path):
             os.remove(cache_file_path)
+        self._luid_index = None
         self.connect()
 
     @property
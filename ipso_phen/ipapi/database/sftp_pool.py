@@ -0,0 +1,246 @@
+import os
+import atexit
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from ipso_phen.ipapi.database.base import LipmCalculConnect
+
+import logging
+
+logger = logging.getLogger(os.path.splitext(__name__)[-1].replace(".", ""))
+
+PREFETCH_COUNT = 4
+
+
+class SftpConnectionPool:
+    """Keeps SFTP connections open between downloads
+
+    Each connection is used by one caller at a time, idle connections are
+    checked before being handed again and replaced if the server dropped them.
+    Connections are never shared between processes.
+
+    Keyword Arguments:
+        connexion_factory {callable} -- builds a connection from target_ftp,
+            returned object must implement get_connexion, release_connexion and
+            is_alive (default: {LipmCalculConnect})
+        max_idle {int} -- maximum idle connections kept by target (default: {4})
+    """
+
+    def __init__(self, connexion_factory=None, max_idle: int = 4) -> None:
+        self._connexion_factory = (
+            LipmCalculConnect if connexion_factory is None else connexion_factory
+        )
+        self._max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_process(self):
+        # Inherited connections belong to the parent process
+        if self._pid != os.getpid():
+            self._idle = {}
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+
+    def acquire(self, target_ftp: bool):
+        """Returns an idle connection or opens a new one
+
+        Returns:
+            tuple -- connection and its SFTP client, (None, None) on failure
+        """
+        self._check_process()
+        with self._lock:
+            idle = self._idle.setdefault(target_ftp, [])
+            while idle:
+                connexion, sftp = idle.pop()
+                if connexion.is_alive():
+                    return connexion, sftp
+                connexion.release_connexion()
+        connexion = self._connexion_factory(target_ftp=target_ftp)
+        sftp = connexion.get_connexion()
+        if sftp is None:
+            connexion.release_connexion()
+            return None, None
+        return connexion, sftp
+
+    def release(self, target_ftp: bool, connexion, sftp, discard: bool = False):
+        """Gives back a connection, discarded ones are closed"""
+        if connexion is None:
+            return
+        with self._lock:
+            idle = self._idle.setdefault(target_ftp, [])
+            keep = (
+                discard is False and len(idle) < self._max_idle and connexion.is_alive()
+            )
+            if keep:
+                idle.append((connexion, sftp))
+        if not keep:
+            connexion.release_connexion()
+
+    @contextmanager
+    def connexion(self, target_ftp: bool):
+        connexion, sftp = self.acquire(target_ftp=target_ftp)
+        discard = False
+        try:
+            yield sftp
+        except FileNotFoundError:
+            raise
+        except Exception:
+            discard = True
+            raise
+        finally:
+            self.release(target_ftp, connexion, sftp, discard=discard)
+
+    def read_file(self, remote_path: str, target_ftp: bool, retries: int = 1):
+        """Downloads a file, retries with a new connection if the transfer fails
+
+        Returns:
+            bytes -- file content, None if no connection is available
+        """
+        for attempt in range(retries + 1):
+            try:
+                with self.connexion(target_ftp=target_ftp) as sftp:
+                    if sftp is None:
+                        return None
+                    with sftp.open(remote_path) as file:
+                        file.prefetch(file.stat().st_size)
+                        file.set_pipelined()
+                        return file.read()
+            except FileNotFoundError:
+                raise
+            except Exception as e:
+                if attempt >= retries:
+                    raise
+                logger.warning(f"Reconnecting after SFTP error: {repr(e)}")
+
+    def close(self):
+        with self._lock:
+            connexions = [c for idle in self._idle.values() for c, _ in idle]
+            self._idle = {}
+        for connexion in connexions:
+            connexion.release_connexion()
+
+
+class SftpPrefetcher:
+    """Downloads upcoming files in background threads
+
+    Each call to prefetch replaces the window of expected files, downloads that
+    are no longer expected are dropped to bound memory usage.
+
+    Keyword Arguments:
+        pool {SftpConnectionPool} -- connections source (default: {process pool})
+        max_workers {int} -- concurrent downloads (default: {2})
+    """
+
+    def __init__(self, pool: SftpConnectionPool = None, max_workers: int = 2):
+        self._pool = pool
+        self._max_workers = max_workers
+        self._executor = None
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_process(self):
+        # Download threads do not survive a fork
+        if self._pid != os.getpid():
+            self._executor = None
+            self._pending = OrderedDict()
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+
+    @property
+    def pool(self) -> SftpConnectionPool:
+        return get_sftp_pool() if self._pool is None else self._pool
+
+    def prefetch(self, files: list):
+        """Schedules the download of files
+
+        Arguments:
+            files {list} -- (remote_path, target_ftp) tuples, in expected order
+        """
+        self._check_process()
+        files = list(OrderedDict.fromkeys(files))
+        with self._lock:
+            for key in [k for k in self._pending if k not in files]:
+                self._pending.pop(key).cancel()
+            if not files:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers,
+                    thread_name_prefix="sftp_prefetch",
+                )
+            for key in files:
+                if key not in self._pending:
+                    self._pending[key] = self._executor.submit(
+                        self.pool.read_file, *key
+                    )
+
+    def is_pending(self, remote_path: str, target_ftp: bool) -> bool:
+        self._check_process()
+        with self._lock:
+            return (remote_path, target_ftp) in self._pending
+
+    def read_file(self, remote_path: str, target_ftp: bool):
+        """Returns prefetched content if available, downloads it otherwise"""
+        self._check_process()
+        with self._lock:
+            future = self._pending.pop((remote_path, target_ftp), None)
+        if future is not None:
+            try:
+                return future.result()
+            except FileNotFoundError:
+                raise
+            except Exception as e:
+                logger.warning(f"Prefetch failed for {remote_path}: {repr(e)}")
+        return self.pool.read_file(remote_path, target_ftp)
+
+    def close(self):
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+_sftp_pool = None
+_sftp_prefetcher = None
+
+
+def get_sftp_pool() -> SftpConnectionPool:
+    """Returns the SFTP connection pool of the current process"""
+    global _sftp_pool
+    if _sftp_pool is None:
+        _sftp_pool = SftpConnectionPool()
+    return _sftp_pool
+
+
+def get_sftp_prefetcher() -> SftpPrefetcher:
+    """Returns the SFTP prefetcher of the current process"""
+    global _sftp_prefetcher
+    if _sftp_prefetcher is None:
+        _sftp_prefetcher = SftpPrefetcher()
+    return _sftp_prefetcher
+
+
+def read_remote_file(remote_path: str, target_ftp: bool):
+    """Downloads a file through the prefetcher and the connection pool
+
+    Returns:
+        bytes -- file content, None if no connection is available
+    """
+    return get_sftp_prefetcher().read_file(remote_path, target_ftp)
+
+
+def close_sftp_connexions():
+    if _sftp_prefetcher is not None:
+        _sftp_prefetcher.close()
+    if _sftp_pool is not None:
+        _sftp_pool.close()
+
+
+atexit.register(close_sftp_connexions)
@@ -150,6 +150,7 @@ class TpmpDbWrapper(PandasDbWrapper):
         if self.dataframe is None:
             self.dataframe = self.df_builder(self.db_info.display_name)
             self.dataframe = self.check_dataframe(dataframe=self.dataframe)
+            self.build_luid_index()
 
     def check_dataframe(self, dataframe: pd.DataFrame) -> pd.DataFrame:
         dataframe = super().check_dataframe(dataframe=dataframe)
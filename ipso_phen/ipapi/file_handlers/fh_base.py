@@ -3,6 +3,7 @@ from pathlib import Path
 import datetime
 from datetime import datetime as dt
 import inspect
+import hashlib
 from abc import ABC, abstractclassmethod, abstractproperty
 
 import cv2
@@ -14,6 +15,8 @@ import ipso_phen.ipapi.file_handlers
 import ipso_phen.ipapi.base.ip_common as ipc
 from ipso_phen.ipapi.tools.common_functions import get_module_classes, force_directories
 from ipso_phen.ipapi.tools.folders import ipso_folders
+from ipso_phen.ipapi.database.sftp_pool import read_remote_file
+from ipso_phen.ipapi.tools.image_cache import get_image_cache, get_cache_root
 import ipso_phen.ipapi.base.ip_common as ipc
 
 import logging
@@ -22,8 +25,35 @@ logger = logging.getLogger(os.path.splitext(__name__)[-1].replace(".", ""))
 
 call_back = None
 
+# Verify that no tool writes into shared source and current images, slow
+CHECK_SHARED_IMAGES = False
+
+
+def freeze_image(image):
+    """Returns a read only version of image, copied unless it already is read only"""
+    if image is None or not isinstance(image, np.ndarray):
+        return image
+    if image.flags.writeable:
+        image = image.copy()
+        image.setflags(write=False)
+    return image
+
+
+def read_only_view(image):
+    if image is None or not isinstance(image, np.ndarray):
+        return image
+    view = image.view()
+    view.setflags(write=False)
+    return view
+
+
+def get_image_checksum(image) -> str:
+    return hashlib.blake2b(np.ascontiguousarray(image).data, digest_size=16).hexdigest()
+
 
 class FileHandlerBase(ABC):
+    sftp_target_ftp = False
+
     def __init__(self, **kwargs):
         self._file_path = ""
         self._exp = ""
@@ -42,6 +72,7 @@ class FileHandlerBase(ABC):
         self.db_linked = False
         self._source_image = None
         self._current_image = None
+        self._shared_checksums = {}
         self._luid = None
         self.good_image = False
 
@@ -61,28 +92,36 @@ class FileHandlerBase(ABC):
         else:
             return self.file_name
 
-    def load_from_database(self, sftp):
-        if os.path.isfile(self.cache_file_path):
+    def load_from_database(self, sftp=None):
+        """Loads source image from cache or from the SFTP server
+
+        Keyword Arguments:
+            sftp {paramiko.SFTPClient} -- client to use, if None a pooled
+                connection is used and prefetched data is consumed (default: {None})
+        """
+        image_cache = get_image_cache(self.cache_file_root)
+        data = image_cache.get(self.get_cache_key())
+        if data is not None:
             logger.debug(f"Retrieved from cache: {str(self)}")
-            return self.load_from_harddrive(self.cache_file_path)
-        if sftp is None:
-            logger.error("Unable to connect to SFTP")
-            return None
+            return self.load_from_bytes(data)
         src_img = None
         try:
             logger.info(f"Downloading {self.name}, please wait...")
             try:
-                with sftp.open(self.blob_path) as file:
-                    file_size = file.stat().st_size
-                    file.prefetch(file_size)
-                    file.set_pipelined()
-                    src_img = cv2.imdecode(
-                        np.fromstring(file.read(), np.uint8),
-                        1,
-                    )
-                    if os.path.isdir(ipso_folders.get_path("mass_storage", False)):
-                        force_directories(os.path.dirname(self.cache_file_path))
-                        cv2.imwrite(self.cache_file_path, src_img)
+                if sftp is None:
+                    data = read_remote_file(self.remote_path, self.sftp_target_ftp)
+                else:
+                    with sftp.open(self.remote_path) as file:
+                        file_size = file.stat().st_size
+                        file.prefetch(file_size)
+                        file.set_pipelined()
+                        data = file.read()
+                if data is None:
+                    logger.error("Unable to connect to SFTP")
+                    return None
+                src_img = cv2.imdecode(np.frombuffer(data, np.uint8), 1)
+                if src_img is not None:
+                    image_cache.put(self.get_cache_key(), data)
             except Exception as e:
                 logger.exception(f"FTP error: {repr(e)}")
             src_img = self.fix_image(src_image=src_img)
@@ -93,6 +132,16 @@ class FileHandlerBase(ABC):
             logger.info(f"Download succeeded for  {self.name}")
             return src_img
 
+    def load_from_bytes(self, data: bytes):
+        try:
+            src_img = cv2.imdecode(np.frombuffer(data, np.uint8), 1)
+            src_img = self.fix_image(src_image=src_img)
+        except Exception as e:
+            logger.exception(f"Failed to decode {repr(self)} because {repr(e)}")
+            return None
+        else:
+            return src_img
+
     def load_from_harddrive(self, override_path: str = None):
         src_img = None
         try:
@@ -420,6 +469,19 @@ class FileHandlerBase(ABC):
     def probe(cls, file_path, database):
         return 0
 
+    @classmethod
+    def build_file_handlers(cls, file_list: list, database) -> list:
+        """Builds file handlers for all files in file_list, override for bulk loading
+
+        Arguments:
+            file_list {list} -- files handled by this class
+            database {DbWrapper} -- database linked to the files
+
+        Returns:
+            list -- file handlers in the same order as file_list
+        """
+        return [cls(file_path=file_path, database=database) for file_path in file_list]
+
     @classmethod
     def extract_file_name(cls, file_path):
         return os.path.basename(file_path)
@@ -596,17 +658,36 @@ class FileHandlerBase(ABC):
                 self._blob_path = ""
         return self._blob_path
 
+    @property
+    def remote_path(self):
+        """Path of the source image on the SFTP server"""
+        return self.blob_path
+
+    def get_cache_key(self, filename=None):
+        """Path of the source image relative to the cache root"""
+        return os.path.join(
+            self.robot,
+            self.experiment,
+            self.file_name if filename is None else filename,
+        )
+
+    @property
+    def remote_source(self):
+        """Arguments to prefetch the source image, None if it is not needed"""
+        if self.db_linked is not True:
+            return None
+        if get_image_cache(self.cache_file_root).contains(self.get_cache_key()):
+            return None
+        remote_path = self.remote_path
+        return (remote_path, self.sftp_target_ftp) if remote_path else None
+
     @property
     def robot(self):
         return ""
 
     @property
     def cache_file_root(self):
-        return (
-            ipso_folders.get_path("mass_storage", False)
-            if os.path.isdir(ipso_folders.get_path("mass_storage", False))
-            else ipso_folders.get_path(key="img_cache", force_creation=True)
-        )
+        return get_cache_root()
 
     @property
     def cache_file_dir(self):
@@ -629,36 +710,64 @@ class FileHandlerBase(ABC):
     def channels(self):
         return {}
 
+    def check_shared_images(self) -> bool:
+        """Checks that shared image buffers have not been modified
+
+        Only active if CHECK_SHARED_IMAGES is True
+
+        Returns:
+            bool -- False if a buffer was written to since it was stored
+        """
+        if CHECK_SHARED_IMAGES is not True:
+            return True
+        res = True
+        for image, checksum_key in [
+            (self._source_image, "source_image"),
+            (self._current_image, "current_image"),
+        ]:
+            if image is None:
+                continue
+            checksum = get_image_checksum(image)
+            if self._shared_checksums.get(checksum_key, checksum) != checksum:
+                logger.error(f"{checksum_key} of {self.name} was modified in place")
+                res = False
+            self._shared_checksums[checksum_key] = checksum
+        return res
+
     @property
     def source_image(self):
+        """Read only source image, copy it before modifying"""
         if self._source_image is None:
             if self._current_image is not None:
-                self._source_image = self._current_image.copy()
+                self._source_image = self._current_image
             else:
-                self._source_image = self.load_source_image()
+                self._source_image = freeze_image(self.load_source_image())
                 self._current_image = None
-        if self._source_image is None:
-            return None
-        else:
-            return self._source_image.copy()
+            self._shared_checksums.pop("source_image", None)
+        self.check_shared_images()
+        return read_only_view(self._source_image)
 
     @source_image.setter
     def source_image(self, value):
-        if value is not None:
-            self._source_image = value.copy()
-        else:
-            self._source_image = None
+        self._source_image = freeze_image(value)
         self._current_image = None
+        self._shared_checksums.clear()
+        self.check_shared_images()
 
     @property
     def current_image(self):
+        """Read only current image, copy it before modifying"""
         if self._current_image is None:
             self._current_image = self.source_image
-        return None if self._current_image is None else self._current_image.copy()
+            self._shared_checksums.pop("current_image", None)
+        self.check_shared_images()
+        return read_only_view(self._current_image)
 
     @current_image.setter
     def current_image(self, value):
-        self._current_image = value.copy() if value is not None else None
+        self._current_image = freeze_image(value)
+        self._shared_checksums.pop("current_image", None)
+        self.check_shared_images()
 
     @property
     def available_channels(self):
@@ -697,28 +806,133 @@ class FileHandlerDefault(FileHandlerBase):
         return 0
 
 
-def file_handler_factory(file_path: str, database) -> FileHandlerBase:
-    # Build unique class list
-    file_handlers_list = get_module_classes(
-        package=ipso_phen.ipapi.file_handlers,
-        class_inherits_from=FileHandlerBase,
-        remove_abstract=True,
+# Process wide file handler classes registry, built on first use
+_file_handlers_classes = None
+
+# Best file handler class for a (file path, database identity) pair
+_file_handler_class_memo = {}
+
+
+def get_file_handlers_classes(refresh: bool = False) -> list:
+    """Returns all available file handler classes
+
+    The package is only scanned the first time or if refresh is True.
+    """
+    global _file_handlers_classes
+
+    if _file_handlers_classes is None or refresh is True:
+        _file_handlers_classes = sorted(
+            [
+                fh
+                for fh in get_module_classes(
+                    package=ipso_phen.ipapi.file_handlers,
+                    class_inherits_from=FileHandlerBase,
+                    remove_abstract=True,
+                )
+                if inspect.isclass(fh) and callable(getattr(fh, "probe", None))
+            ],
+            key=lambda x: (x.__module__, x.__name__),
+        )
+        _file_handler_class_memo.clear()
+    return _file_handlers_classes
+
+
+def refresh_file_handlers() -> None:
+    """Rescans file handlers package and clears probe results memo"""
+    get_file_handlers_classes(refresh=True)
+
+
+def _database_identity(database):
+    if database is None:
+        return None
+    db_info = getattr(database, "db_info", None)
+    if db_info is None:
+        return id(database)
+    return (
+        database.__class__.__name__,
+        db_info.target,
+        db_info.dbms,
+        db_info.db_qualified_name,
     )
-    file_handlers_list = [
-        fh
-        for fh in file_handlers_list
-        if inspect.isclass(fh) and callable(getattr(fh, "probe", None))
-    ]
 
-    # Create objects
+
+def get_file_handler_class(file_path: str, database, use_memo: bool = False):
+    """Returns the file handler class with the best probe score for file_path
+
+    Arguments:
+        file_path {str} -- path to the file
+        database {DbWrapper} -- database linked to the file
+
+    Keyword Arguments:
+        use_memo {bool} -- Reuse result of previous calls with same file path and database (default: {False})
+
+    Returns:
+        type -- class inheriting from FileHandlerBase
+    """
+    key = None
+    if use_memo is True and isinstance(file_path, str):
+        key = (file_path, _database_identity(database))
+        best_class = _file_handler_class_memo.get(key, None)
+        if best_class is not None:
+            return best_class
+
     best_score = 0
-    best_class = None
-    for cls in file_handlers_list:
-        if cls.probe(file_path, database) > best_score:
-            best_score = cls.probe(file_path, database)
+    best_class = FileHandlerDefault
+    for cls in get_file_handlers_classes():
+        score = cls.probe(file_path, database)
+        if score > best_score:
+            best_score = score
             best_class = cls
 
-    if best_class:
-        return best_class(file_path=file_path, database=database)
-    else:
-        return FileHandlerDefault(file_path=file_path, database=database)
+    if key is not None:
+        _file_handler_class_memo[key] = best_class
+    return best_class
+
+
+def file_handler_factory(
+    file_path: str,
+    database,
+    use_memo: bool = False,
+) -> FileHandlerBase:
+    return get_file_handler_class(
+        file_path=file_path,
+        database=database,
+        use_memo=use_memo,
+    )(file_path=file_path, database=database)
+
+
+def file_handlers_factory(
+    file_list: list,
+    database,
+    use_memo: bool = False,
+) -> list:
+    """Builds file handlers for a list of files, grouping them by handler class
+
+    Arguments:
+        file_list {list} -- files to handle
+        database {DbWrapper} -- database linked to the files
+
+    Keyword Arguments:
+        use_memo {bool} -- Reuse probe results (default: {False})
+
+    Returns:
+        list -- file handlers in the same order as file_list
+    """
+    files_by_class = {}
+    for index, file_path in enumerate(file_list):
+        cls = get_file_handler_class(
+            file_path=file_path,
+            database=database,
+            use_memo=use_memo,
+        )
+        files_by_class.setdefault(cls, []).append((index, file_path))
+
+    res = [None] * len(file_list)
+    for cls, files in files_by_class.items():
+        handlers = cls.build_file_handlers(
+            file_list=[file_path for _, file_path in files],
+            database=database,
+        )
+        for (index, _), fh in zip(files, handlers):
+            res[index] = fh
+    return res
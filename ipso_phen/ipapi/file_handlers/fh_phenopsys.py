@@ -6,7 +6,6 @@ from ipso_phen.ipapi.file_handlers.fh_base import FileHandlerBase
 import ipso_phen.ipapi.base.ip_common as ipc
 from ipso_phen.ipapi.database.db_passwords import check_password
 import ipso_phen.ipapi.base.ip_common as ipc
-from ipso_phen.ipapi.database.base import LipmCalculConnect
 
 
 import logging
@@ -55,8 +54,7 @@ class FileHandlerPhenopsis(FileHandlerBase):
 
     def load_source_file(self):
         if self.db_linked:
-            with LipmCalculConnect(target_ftp=False) as sftp:
-                return self.load_from_database(sftp)
+            return self.load_from_database()
         else:
             return self.load_from_harddrive()
 
@@ -5,7 +5,6 @@ import json
 
 from ipso_phen.ipapi.file_handlers.fh_base import FileHandlerBase
 from ipso_phen.ipapi.database.db_passwords import check_password
-from ipso_phen.ipapi.database.base import LipmCalculConnect
 
 
 import logging
@@ -36,8 +35,7 @@ class FileHandlerPhenoserre(FileHandlerBase):
 
     def load_source_file(self):
         if self.db_linked:
-            with LipmCalculConnect(target_ftp=False) as sftp:
-                return self.load_from_database(sftp)
+            return self.load_from_database()
         else:
             return self.load_from_harddrive()
 
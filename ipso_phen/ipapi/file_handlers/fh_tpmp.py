@@ -1,20 +1,14 @@
 # from datetime import datetime as dt
 import datetime
 import os
-import shutil
 
-import platform
-import pathlib
-
-import numpy as np
 import cv2
 
 from ipso_phen.ipapi.file_handlers.fh_base import FileHandlerBase
-from ipso_phen.ipapi.tools.common_functions import force_directories
 import ipso_phen.ipapi.base.ip_common as ipc
 
-from ipso_phen.ipapi.tools.folders import ALLOW_CACHE
-from ipso_phen.ipapi.database.base import LipmCalculConnect
+from ipso_phen.ipapi.database.sftp_pool import read_remote_file
+from ipso_phen.ipapi.tools.image_cache import get_image_cache
 
 
 import logging
@@ -22,24 +16,18 @@ import logging
 logger = logging.getLogger(os.path.splitext(__name__)[-1].replace(".", ""))
 
 
-def get_remaining_space():
-    total, _, free = shutil.disk_usage("/")
-    return total // (2**30), free // (2**30)
-
-
 class FileHandlerTpmp(FileHandlerBase):
+    sftp_target_ftp = True
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._file_path = kwargs.get("file_path", "")
         self._database = kwargs.get("database", "")
-        data = {
-            k: list(v.values())[0]
-            for k, v in self._database.dataframe[
-                self._database.dataframe.luid == self._file_path
-            ]
-            .to_dict()
-            .items()
-        }
+        data = kwargs.get("data", None)
+        if data is None:
+            data = self._database.get_record_by_luid(self._file_path)
+        if data is None:
+            raise KeyError(f"Unable to find {self._file_path} in database")
         self._exp = data["experiment"]
         self._plant = data["plant"]
         self._camera = data["camera"]
@@ -50,57 +38,50 @@ class FileHandlerTpmp(FileHandlerBase):
         self._luid = data["luid"]
         self.db_linked = True
 
+    @classmethod
+    def build_file_handlers(cls, file_list: list, database) -> list:
+        return [
+            cls(file_path=file_path, database=database, data=data)
+            for file_path, data in zip(
+                file_list,
+                database.get_records_by_luid(file_list),
+            )
+        ]
+
     def load_source_file(self, filename=None):
-        if filename is None:
-            fcp = self.cache_file_path
-        else:
-            fcp = os.path.join(self.cache_file_dir, filename)
-        if os.path.isfile(fcp):
+        image_cache = get_image_cache(self.cache_file_root)
+        cache_key = self.get_cache_key(filename)
+        data = image_cache.get(cache_key)
+        if data is not None:
             logger.debug(f"Retrieved from cache: {str(self)}")
-            return self.load_from_harddrive(fcp)
+            return self.load_from_bytes(data)
         elif self.db_linked:
             logger.info(f"Downloading {self.name}, please wait...")
             try:
-                with LipmCalculConnect(target_ftp=True) as sftp:
-                    if sftp is not None:
-                        with sftp.open(
-                            f"images/{self.robot}/{self.experiment}/{self.file_name if filename is None else filename}"
-                        ) as file:
-                            file_size = file.stat().st_size
-                            file.prefetch(file_size)
-                            file.set_pipelined()
-                            src_img = cv2.imdecode(
-                                np.fromstring(file.read(), np.uint8),
-                                1,
-                            )
-
-                        _, free = get_remaining_space()
-                        if (
-                            ALLOW_CACHE is True
-                            and free > 5
-                            and os.path.isdir(self.cache_file_root)
-                        ):
-                            force_directories(os.path.dirname(self.cache_file_dir))
-                            cv2.imwrite(filename=fcp, img=src_img)
-                            total, free = get_remaining_space()
-                            p = (
-                                pathlib.PureWindowsPath(self.cache_file_dir)
-                                if platform.system().lower() == "windows"
-                                else pathlib.PurePath(self.cache_file_dir)
-                            )
-                            logger.info(
-                                f"Cache succeeded for {self.name if filename is None else filename}, {free}GiB remaining of {total}GiB in {p.parts[0]}"
-                            )
-                        else:
-                            logger.info(f"Only {free}Gib remaining, no image cached")
-
-                        return src_img
+                data = read_remote_file(
+                    self.get_remote_path(filename),
+                    self.sftp_target_ftp,
+                )
+                if data is not None:
+                    src_img = self.load_from_bytes(data)
+                    if src_img is not None and image_cache.put(cache_key, data):
+                        logger.info(
+                            f"Cache succeeded for {self.name if filename is None else filename}"
+                        )
+                    return src_img
             except Exception as e:
                 logger.exception(f"Failed to download {repr(self)} because {repr(e)}")
                 return None
         else:
             return None
 
+    def get_remote_path(self, filename=None):
+        return f"images/{self.robot}/{self.experiment}/{self.file_name if filename is None else filename}"
+
+    @property
+    def remote_path(self):
+        return self.get_remote_path()
+
     def get_channel(self, src_img=None, channel="l"):
         c = super().get_channel(src_img=src_img, channel=channel)
         if c is None:
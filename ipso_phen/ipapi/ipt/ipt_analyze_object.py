@@ -185,7 +185,7 @@ class IptAnalyzeObject(IptBaseAnalyzer):
                 return
 
             obj, mask = wrapper.prepare_analysis(
-                wrapper.draw_image(
+                lambda: wrapper.draw_image(
                     src_mask=mask,
                     background="silver",
                     foreground="source",
@@ -284,7 +284,7 @@ class IptAnalyzeObject(IptBaseAnalyzer):
                     text="shapes",
                 )
                 wrapper.store_image(
-                    image=wrapper.draw_image(
+                    image=lambda: wrapper.draw_image(
                         src_image=mask,
                         src_mask=mask,
                         objects=obj,
@@ -313,7 +313,7 @@ class IptAnalyzeObject(IptBaseAnalyzer):
                 draw_st_rect = self.has_key_matching("straight_bounding_rectangle")
                 if draw_circle or draw_bd_rect or draw_st_rect:
                     wrapper.store_image(
-                        image=wrapper.draw_image(
+                        image=lambda: wrapper.draw_image(
                             src_image=ori_img,
                             src_mask=mask,
                             objects=obj,
@@ -328,7 +328,7 @@ class IptAnalyzeObject(IptBaseAnalyzer):
                         text="more_shapes",
                     )
                     wrapper.store_image(
-                        image=wrapper.draw_image(
+                        image=lambda: wrapper.draw_image(
                             src_image=mask,
                             src_mask=mask,
                             objects=obj,
@@ -348,8 +348,10 @@ class IptAnalyzeObject(IptBaseAnalyzer):
                 if n > 0:
                     kind = "width"
                     msk_dt = MaskData(mask)
-                    qtl_img = np.zeros_like(mask)
-                    qtl_img = np.dstack((qtl_img, qtl_img, qtl_img))
+                    draw_quantiles = wrapper.is_kept_image(f"quantiles_width_{n}")
+                    if draw_quantiles:
+                        qtl_img = np.zeros_like(mask)
+                        qtl_img = np.dstack((qtl_img, qtl_img, qtl_img))
                     for i in range(n):
                         (
                             total_,
@@ -377,6 +379,8 @@ class IptAnalyzeObject(IptBaseAnalyzer):
                         self.add_value(
                             f"quantile_width_{i + 1}_{n}_std_{kind}", std_, True
                         )
+                        if not draw_quantiles:
+                            continue
                         p_qt_msk = msk_dt.height_quantile_mask(
                             total=n, index=i, colour=int((i + 1) / (n + 1) * 255)
                         )
@@ -386,7 +390,8 @@ class IptAnalyzeObject(IptBaseAnalyzer):
                                 (np.zeros_like(mask), p_qt_msk, np.zeros_like(mask))
                             ),
                         )
-                    wrapper.store_image(qtl_img, f"quantiles_width_{n}")
+                    if draw_quantiles:
+                        wrapper.store_image(qtl_img, f"quantiles_width_{n}")
             else:
                 res = False
         except Exception as e:
@@ -131,7 +131,7 @@ class IptExposureChecker(IptBaseAnalyzer):
         res = False
         try:
             self.data_dict = {}
-            img = self.wrapper.current_image
+            img = self.wrapper.current_image.copy()
             text_overlay = self.get_value_of("text_overlay") == 1
             br_dict = None
             if self.get_value_of("enabled") != 1:
@@ -178,7 +178,7 @@ class IptExposureChecker(IptBaseAnalyzer):
                     )
                     return
                 wrapper.store_image(
-                    self.to_uint8(s),
+                    lambda: self.to_uint8(s),
                     f'brightness_{self.get_value_of("source_brightness")}',
                 )
                 s_tuple = cv2.meanStdDev(s.reshape(s.shape[1] * s.shape[0]))
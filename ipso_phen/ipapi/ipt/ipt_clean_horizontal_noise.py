@@ -1,5 +1,4 @@
 import numpy as np
-import cv2
 
 import logging
 import os
@@ -67,34 +66,15 @@ class IptCleanHorizontalNoise(IptBase):
                 all_lines = []
 
                 while not stable_ and (iter_ < max_iter):
-                    stable_ = True
                     iter_ += 1
-                    msk_data = ipc.MaskData(mask=mask)
-                    for l in msk_data.lines_data:
-                        if (l.solidity >= 0.99) and (
-                            l.nz_span >= msk_data.mask_width - 4
-                        ):
-                            ld_up, ld_down = msk_data.find_top_bottom_non_full_lines(
-                                l.height_pos
-                            )
-                            l.merge_or(ld_up, ld_down)
-                            all_lines.append([(l.height_pos, 0, msk_data.mask_width)])
-                            mask[l.height_pos] = 0
-                            for i in l.nz_pos:
-                                mask[l.height_pos][i] = 255
-                        else:
-                            lines = msk_data.horizontal_lines_at(
-                                l.height_pos, min_line_size, fully_isolated
-                            )
-                            if not lines:
-                                continue
-                            all_lines.append(lines)
-                            for i, line in enumerate(lines):
-                                stable_ = False
-                                cv2.line(
-                                    mask, (line[1], line[0]), (line[2], line[0]), 0, 1
-                                )
-                    wrapper.store_image(mask, f"cleaned_image_iter_{iter_}")
+                    lines, stable_ = ipc.remove_horizontal_noise_pass(
+                        mask=mask,
+                        min_line_size=min_line_size,
+                        fully_isolated=fully_isolated,
+                    )
+                    all_lines.extend(lines)
+                    if wrapper.store_images:
+                        wrapper.store_image(mask, f"cleaned_image_iter_{iter_}")
 
                 lines_removed_ = list(set([line[0][0] for line in all_lines]))
                 if lines_removed_:
@@ -28,7 +28,7 @@ class IptConvertImageToMask(IptBase):
         res = False
         try:
             if self.get_value_of("enabled") == 1:
-                img = wrapper.current_image
+                img = wrapper.current_image.copy()
 
                 if len(img.shape) > 2 and img.shape[2] >= 1:
                     img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
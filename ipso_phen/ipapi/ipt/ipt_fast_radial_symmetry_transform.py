@@ -27,6 +27,115 @@ def grady(img):
     )
 
 
+def get_affected_offsets(gx, gy, gnorms, radius: int):
+    """Returns row and column offsets to the pixels affected by each gradient
+
+    Offsets are int32 on all platforms, as to_uint8 expects.
+    """
+    gpx = (
+        np.multiply(
+            np.divide(gx, gnorms, out=np.zeros(gx.shape), where=gnorms != 0),
+            radius,
+        )
+        .round()
+        .astype(np.int32)
+    )
+    gpy = (
+        np.multiply(
+            np.divide(gy, gnorms, out=np.zeros(gy.shape), where=gnorms != 0),
+            radius,
+        )
+        .round()
+        .astype(np.int32)
+    )
+    return gpx, gpy
+
+
+def accumulate_projections(
+    gnorms, gpx, gpy, gthresh: float, radius: int, bright: bool, dark: bool
+):
+    """Builds orientation and magnitude projection images
+
+    Each pixel with a gradient above gthresh votes for the pixels at its
+    offsets. Orientation votes are summed with np.add.at. Magnitude votes are
+    truncated to int16 after each addition, votes are applied in rounds in
+    which each pixel receives at most one of them, in the order of a row by row
+    scan, so that truncations match those of a pixel by pixel accumulation.
+
+    Returns:
+        tuple -- orientation and magnitude projections, int16 images padded by
+            2 * radius
+    """
+    working_dims = tuple((e + 2 * radius) for e in gnorms.shape)
+    O_n = np.zeros(working_dims, np.int16)
+    M_n = np.zeros(working_dims, np.int16)
+
+    i, j = np.nonzero(gnorms > gthresh)
+    gnorm = gnorms[i, j]
+    di, dj = gpx[i, j], gpy[i, j]
+    targets, values, signs = [], [], []
+    if bright:
+        targets.append(np.ravel_multi_index((i + di, j + dj), working_dims, "wrap"))
+        values.append(gnorm)
+        signs.append(np.ones(len(i), np.int16))
+    if dark:
+        targets.append(np.ravel_multi_index((i - di, j - dj), working_dims, "wrap"))
+        values.append(-gnorm)
+        signs.append(np.full(len(i), -1, np.int16))
+    if len(i) == 0 or not targets:
+        return O_n, M_n
+    # Votes in scan order, bright before dark for each pixel
+    targets = np.stack(targets, axis=1).ravel()
+    values = np.stack(values, axis=1).ravel()
+    signs = np.stack(signs, axis=1).ravel()
+
+    np.add.at(O_n.reshape(-1), targets, signs)
+
+    # Rank of each vote among those for the same pixel
+    order = np.argsort(targets, kind="stable")
+    sorted_targets = targets[order]
+    group_starts = np.flatnonzero(
+        np.r_[True, sorted_targets[1:] != sorted_targets[:-1]]
+    )
+    ranks = np.arange(len(order)) - np.repeat(
+        group_starts, np.diff(np.r_[group_starts, len(order)])
+    )
+    by_rank = order[np.argsort(ranks, kind="stable")]
+    bounds = np.searchsorted(np.sort(ranks), np.arange(ranks.max() + 2))
+    flat_M = M_n.reshape(-1)
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        votes = by_rank[start:stop]
+        flat_M[targets[votes]] = flat_M[targets[votes]] + values[votes]
+
+    return O_n, M_n
+
+
+def get_radial_projections(img, radii, beta: float, bright=True, dark=True) -> dict:
+    """Returns orientation and magnitude projections for each radius
+
+    Gradients and threshold are computed once for all radii.
+
+    Arguments:
+        img {numpy array} -- single channel image
+        radii {int or list} -- radii in pixels
+        beta {float} -- gradient threshold, in [0, 1]
+
+    Returns:
+        dict -- (O_n, M_n) by radius, see accumulate_projections
+    """
+    gx = gradx(img)
+    gy = grady(img)
+    gnorms = np.sqrt(np.add(np.multiply(gx, gx), np.multiply(gy, gy)))
+    gthresh = np.amax(gnorms) * beta
+    res = {}
+    for radius in [radii] if isinstance(radii, int) else radii:
+        gpx, gpy = get_affected_offsets(gx, gy, gnorms, radius)
+        res[radius] = accumulate_projections(
+            gnorms, gpx, gpy, gthresh, radius, bright, dark
+        )
+    return res
+
+
 class IptFastRadialSymmetryTransform(IptBaseAnalyzer):
     def build_params(self):
         self.add_enabled_checkbox()
@@ -132,24 +241,17 @@ class IptFastRadialSymmetryTransform(IptBaseAnalyzer):
                 dark = mode == "dark" or mode == "both"
                 bright = mode == "bright" or mode == "both"
 
-                workingDims = tuple((e + 2 * radii) for e in img.shape)
-
-                # Set up output and M and O working matrices
-                output = np.zeros(img.shape, np.uint8)
-                O_n = np.zeros(workingDims, np.int16)
-                M_n = np.zeros(workingDims, np.int16)
-
                 # Calculate gradients
                 gx = gradx(img)
                 wrapper.store_image(
-                    image=self.to_uint8(
+                    image=lambda: self.to_uint8(
                         gx, normalize=self.get_value_of("normalize") == 1
                     ),
                     text="gx",
                 )
                 gy = grady(img)
                 wrapper.store_image(
-                    image=self.to_uint8(
+                    image=lambda: self.to_uint8(
                         gy, normalize=self.get_value_of("normalize") == 1
                     ),
                     text="gy",
@@ -162,49 +264,24 @@ class IptFastRadialSymmetryTransform(IptBaseAnalyzer):
                 gthresh = np.amax(gnorms) * beta
 
                 # Find x/y distance to affected pixels
-                gpx = (
-                    np.multiply(
-                        np.divide(gx, gnorms, out=np.zeros(gx.shape), where=gnorms != 0),
-                        radii,
-                    )
-                    .round()
-                    .astype(int)
-                )
+                gpx, gpy = get_affected_offsets(gx, gy, gnorms, radii)
                 wrapper.store_image(
-                    image=self.to_uint8(
+                    image=lambda: self.to_uint8(
                         gpx, normalize=self.get_value_of("normalize") == 1
                     ),
                     text="gpx",
                 )
-                gpy = (
-                    np.multiply(
-                        np.divide(gy, gnorms, out=np.zeros(gy.shape), where=gnorms != 0),
-                        radii,
-                    )
-                    .round()
-                    .astype(int)
-                )
                 wrapper.store_image(
-                    image=self.to_uint8(
+                    image=lambda: self.to_uint8(
                         gpy, normalize=self.get_value_of("normalize") == 1
                     ),
                     text="gpy",
                 )
 
-                # Iterate over all pixels (w/ gradient above threshold)
-                for coords, gnorm in np.ndenumerate(gnorms):
-                    if gnorm > gthresh:
-                        i, j = coords
-                        # Positively affected pixel
-                        if bright:
-                            ppve = (i + gpx[i, j], j + gpy[i, j])
-                            O_n[ppve] += 1
-                            M_n[ppve] += gnorm
-                        # Negatively affected pixel
-                        if dark:
-                            pnve = (i - gpx[i, j], j - gpy[i, j])
-                            O_n[pnve] -= 1
-                            M_n[pnve] -= gnorm
+                # Accumulate votes of pixels with gradient above threshold
+                O_n, M_n = accumulate_projections(
+                    gnorms, gpx, gpy, gthresh, radii, bright, dark
+                )
 
                 # Abs and normalize O matrix
                 O_n = np.abs(O_n)
@@ -218,13 +295,13 @@ class IptFastRadialSymmetryTransform(IptBaseAnalyzer):
                 F_n = np.multiply(np.power(O_n, alpha), M_n)
 
                 wrapper.store_image(
-                    image=self.to_uint8(
+                    image=lambda: self.to_uint8(
                         O_n, normalize=self.get_value_of("normalize") == 1
                     ),
                     text="O_n",
                 )
                 wrapper.store_image(
-                    image=self.to_uint8(
+                    image=lambda: self.to_uint8(
                         M_n, normalize=self.get_value_of("normalize") == 1
                     ),
                     text="M_n",
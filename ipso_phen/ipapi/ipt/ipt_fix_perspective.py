@@ -209,7 +209,7 @@ class IptFixPerspective(IptBase):
         res = False
         try:
             if self.get_value_of("enabled") == 1:
-                img = wrapper.current_image
+                img = wrapper.current_image.copy()
                 pm = self.get_value_of("mode")
 
                 channels = []
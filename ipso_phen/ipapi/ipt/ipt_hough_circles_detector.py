@@ -245,7 +245,7 @@ class IptHoughCircles(IptBase):
             if input_kind == "mask":
                 img = self.get_mask()
             elif input_kind == "current_image":
-                img = wrapper.current_image
+                img = wrapper.current_image.copy()
             else:
                 img = None
                 logger.error(f"Unknown source: {input_kind}")
@@ -401,7 +401,7 @@ class IptHoughCircles(IptBase):
             if self.result is not None:
                 colors = ipc.build_color_steps(step_count=len(self.result))
                 if input_kind == "mask":
-                    img = wrapper.current_image
+                    img = wrapper.current_image.copy()
                 if len(img.shape) == 2 or (len(img.shape) == 3 and img.shape[2] == 1):
                     img = np.dstack((img, img, img))
                 i = 0
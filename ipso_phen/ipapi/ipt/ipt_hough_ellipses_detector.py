@@ -110,7 +110,7 @@ class IptHoughEllipses(IptBaseAnalyzer):
             if input_kind == "mask":
                 img = self.get_mask()
             elif input_kind == "current_image":
-                img = wrapper.current_image
+                img = wrapper.current_image.copy()
             else:
                 img = None
                 logger.error(f"Unknown source: {input_kind}")
@@ -210,7 +210,7 @@ class IptHoughLines(IptBaseAnalyzer):
                 wrapper.init_rois()
                 edges = wrapper.apply_rois(edges, f"ROIs_{self.input_params_as_str()}")
 
-            src_img = self.wrapper.current_image
+            src_img = self.wrapper.current_image.copy()
             if (
                 self.get_value_of("source_file", "source") == "mask"
                 and src_img is not None
@@ -98,7 +98,7 @@ class IptKMeansClustering(IptBase):
 
         res = False
         try:
-            img = wrapper.current_image
+            img = wrapper.current_image.copy()
 
             # Apply ROIs
             rois = self.get_ipt_roi(
@@ -8,6 +8,7 @@ import cv2
 
 from ipso_phen.ipapi.base.ipt_abstract import IptBase
 from ipso_phen.ipapi.base import ip_common as ipc
+from ipso_phen.ipapi.tools.distance_map import DistanceMap
 
 
 class IptKeepCountoursNearRois(IptBase):
@@ -102,6 +103,98 @@ class IptKeepCountoursNearRois(IptBase):
         self.wrapper.store_image(canvas, image_name)
         return canvas
 
+    def merge_contours(self, cnt_approx, key, distance_tolerance, shape, contours_data):
+        """Moves contours closer than distance_tolerance to a root contour to the root
+        ones until none is close enough, they take the label of the closest root.
+        Contours holding points of a root contour are at distance 0.
+
+        Arguments:
+            cnt_approx {dict} -- contours by kind
+            key {str} -- kind of the contours to merge
+            distance_tolerance {int} -- maximum distance to a root contour
+            shape {tuple} -- shape of the mask
+            contours_data {list} -- drawing data of each contour kind
+        """
+        roots = cnt_approx["root"]
+        # Contours inside a root one are as far as its outline
+        roots_map = DistanceMap(shape, [root["cnt"] for root in roots], thickness=1)
+        roots_boxes = np.empty((0, 4), dtype=int)
+        points_img = np.zeros(shape[:2], dtype=np.uint8)
+        new_roots = roots
+        step = 1
+        while len(cnt_approx[key]) > 0:
+            roots_boxes = np.concatenate(
+                [roots_boxes] + [[cv2.boundingRect(item["cnt"])] for item in new_roots]
+            )
+            for item in new_roots:
+                points = item["cnt"].reshape(-1, 2)
+                points_img[points[:, 1], points[:, 0]] = 255
+
+            candidates = cnt_approx[key]
+            dists, closest_points = roots_map.min_distances(
+                [item["cnt"] for item in candidates],
+                max_distance=distance_tolerance,
+                return_closest=True,
+            )
+            is_close = dists < distance_tolerance
+            for i, item in enumerate(candidates):
+                if is_close[i]:
+                    continue
+                # Root points inside the contour are closer than its size
+                _, _, w, h = cv2.boundingRect(item["cnt"])
+                if dists[i] <= w + h and self.contains_any_point(
+                    item["cnt"], points_img
+                ):
+                    is_close[i] = True
+            if not np.any(is_close):
+                break
+
+            new_roots = [item for item, close in zip(candidates, is_close) if close]
+            cnt_approx[key] = [
+                item for item, close in zip(candidates, is_close) if not close
+            ]
+            for item, dist, (x, y) in zip(
+                new_roots, dists[is_close], closest_points[is_close]
+            ):
+                # The closest root outline is within dist of the closest point
+                near = np.flatnonzero(
+                    (roots_boxes[:, 0] - dist - 1 <= x)
+                    & (x <= roots_boxes[:, 0] + roots_boxes[:, 2] + dist)
+                    & (roots_boxes[:, 1] - dist - 1 <= y)
+                    & (y <= roots_boxes[:, 1] + roots_boxes[:, 3] + dist)
+                )
+                closest = min(
+                    near if len(near) > 0 else range(len(roots_boxes)),
+                    key=lambda j: abs(
+                        cv2.pointPolygonTest(roots[j]["cnt"], (int(x), int(y)), True)
+                    ),
+                )
+                item["label"] = roots[closest]["label"]
+            roots.extend(new_roots)
+            roots_map.add_contours([item["cnt"] for item in new_roots])
+            image_name = f"merging_{key}_{step}"
+            if self.wrapper.is_kept_image(image_name):
+                self.draw_contours(
+                    canvas=self.wrapper.current_image.copy(),
+                    contours=cnt_approx,
+                    image_name=image_name,
+                    contours_data=contours_data,
+                )
+            step += 1
+
+    @staticmethod
+    def contains_any_point(cnt, points_img) -> bool:
+        """Returns True if any non zero pixel of points_img is inside or on the contour"""
+        x, y, w, h = cv2.boundingRect(cnt)
+        fill = np.zeros((h, w), dtype=np.uint8)
+        cv2.drawContours(fill, [cnt], 0, 255, -1, offset=(-x, -y))
+        # Drawn contours hold all points inside of their polygon and a few more
+        ys, xs = np.nonzero(fill & points_img[y : y + h, x : x + w])
+        return any(
+            cv2.pointPolygonTest(cnt, (int(px) + x, int(py) + y), False) >= 0
+            for px, py in zip(xs, ys)
+        )
+
     def process_wrapper(self, **kwargs):
         """
         Keep countours near ROIs:
@@ -267,7 +360,7 @@ class IptKeepCountoursNearRois(IptBase):
                         "print_label": False,
                     },
                 ]
-                bck_img = wrapper.current_image
+                bck_img = wrapper.current_image.copy()
                 for roi in rois:
                     bck_img = roi.draw_to(
                         dst_img=bck_img, line_width=2, color=ipc.C_WHITE
@@ -281,6 +374,24 @@ class IptKeepCountoursNearRois(IptBase):
 
                 # Merge root contours by label
                 root_merge_distance = self.get_value_of("root_merge_distance")
+                root_cnts = [root["cnt"] for root in cnt_approx["root"]]
+                boxes = np.array(
+                    [cv2.boundingRect(cnt) for cnt in root_cnts], dtype=int
+                ).reshape(-1, 4)
+                # Distances from the points of each root contour to the nearby ones
+                root_dists = np.full((len(root_cnts), len(root_cnts)), np.inf)
+                for i, (x, y, w, h) in enumerate(boxes):
+                    near = np.flatnonzero(
+                        (boxes[:, 0] <= x + w + root_merge_distance)
+                        & (x <= boxes[:, 0] + boxes[:, 2] + root_merge_distance)
+                        & (boxes[:, 1] <= y + h + root_merge_distance)
+                        & (y <= boxes[:, 1] + boxes[:, 3] + root_merge_distance)
+                    )
+                    root_dists[near, i] = DistanceMap(
+                        mask.shape, [root_cnts[i]]
+                    ).min_distances(
+                        [root_cnts[j] for j in near], max_distance=root_merge_distance
+                    )
                 stable = False
                 step = 1
                 while not stable and step < 100:
@@ -291,22 +402,21 @@ class IptKeepCountoursNearRois(IptBase):
                                 continue
                             if (
                                 left["label"] != right["label"]
-                                and wrapper.contours_min_distance(
-                                    left["cnt"], right["cnt"]
-                                )
+                                and root_dists[left_index, right_index]
                                 < root_merge_distance
                             ):
                                 right["label"] = left["label"]
                                 stable = False
-                    self.draw_contours(
-                        canvas=wrapper.current_image,
-                        contours=cnt_approx,
-                        image_name=f"merging_root_{step}",
-                        contours_data=cnt_data,
-                    )
+                    if wrapper.is_kept_image(f"merging_root_{step}"):
+                        self.draw_contours(
+                            canvas=wrapper.current_image.copy(),
+                            contours=cnt_approx,
+                            image_name=f"merging_root_{step}",
+                            contours_data=cnt_data,
+                        )
                     step += 1
                 self.draw_contours(
-                    canvas=wrapper.current_image,
+                    canvas=wrapper.current_image.copy(),
                     contours=cnt_approx,
                     image_name="root_labels_merged",
                     contours_data=cnt_data,
@@ -316,34 +426,15 @@ class IptKeepCountoursNearRois(IptBase):
                 small_contours_distance_tolerance = self.get_value_of(
                     "small_contours_distance_tolerance"
                 )
-                stable = False
-                step = 1
-                while not stable and step < 100:
-                    stable = True
-                    for root in cnt_approx["root"]:
-                        i = 0
-                        while i < len(cnt_approx["small"]):
-                            small = cnt_approx["small"][i]
-                            if (
-                                wrapper.contours_min_distance(root["cnt"], small["cnt"])
-                                < small_contours_distance_tolerance
-                            ):
-                                new_root = cnt_approx["small"].pop(i)
-                                new_root["label"] = root["label"]
-                                cnt_approx["root"].append(new_root)
-                                stable = False
-                            else:
-                                i += 1
-                    if not stable:
-                        self.draw_contours(
-                            canvas=wrapper.current_image,
-                            contours=cnt_approx,
-                            image_name=f"merging_small_{step}",
-                            contours_data=cnt_data,
-                        )
-                    step += 1
+                self.merge_contours(
+                    cnt_approx=cnt_approx,
+                    key="small",
+                    distance_tolerance=small_contours_distance_tolerance,
+                    shape=mask.shape,
+                    contours_data=cnt_data,
+                )
                 self.draw_contours(
-                    canvas=wrapper.current_image,
+                    canvas=wrapper.current_image.copy(),
                     contours=cnt_approx,
                     image_name="small_labels_merged",
                     contours_data=cnt_data,
@@ -353,34 +444,15 @@ class IptKeepCountoursNearRois(IptBase):
                 unk_contours_distance_tolerance = self.get_value_of(
                     "unk_contours_distance_tolerance"
                 )
-                stable = False
-                step = 1
-                while not stable and step < 100:
-                    stable = True
-                    for root in cnt_approx["root"]:
-                        i = 0
-                        while i < len(cnt_approx["unk"]):
-                            unk = cnt_approx["unk"][i]
-                            if (
-                                wrapper.contours_min_distance(root["cnt"], unk["cnt"])
-                                < unk_contours_distance_tolerance
-                            ):
-                                new_root = cnt_approx["unk"].pop(i)
-                                new_root["label"] = root["label"]
-                                cnt_approx["root"].append(new_root)
-                                stable = False
-                            else:
-                                i += 1
-                    if not stable:
-                        self.draw_contours(
-                            canvas=wrapper.current_image,
-                            contours=cnt_approx,
-                            image_name=f"merging_unk_{step}",
-                            contours_data=cnt_data,
-                        )
-                    step += 1
+                self.merge_contours(
+                    cnt_approx=cnt_approx,
+                    key="unk",
+                    distance_tolerance=unk_contours_distance_tolerance,
+                    shape=mask.shape,
+                    contours_data=cnt_data,
+                )
                 self.demo_image = self.draw_contours(
-                    canvas=wrapper.current_image,
+                    canvas=wrapper.current_image.copy(),
                     contours=cnt_approx,
                     image_name="unk_labels_merged",
                     contours_data=cnt_data,
@@ -392,14 +464,13 @@ class IptKeepCountoursNearRois(IptBase):
                     retrieve_mode=cv2.RETR_LIST,
                     method=cv2.CHAIN_APPROX_SIMPLE,
                 )
-                src_image = wrapper.current_image
+                src_image = wrapper.current_image.copy()
+                root_points = np.zeros_like(mask)
+                for root in cnt_approx["root"]:
+                    points = root["cnt"].reshape(-1, 2)
+                    root_points[points[:, 1], points[:, 0]] = 255
                 for cnt in contours:
-                    is_good_one = False
-                    for root in cnt_approx["root"]:
-                        if wrapper.contours_min_distance(root["cnt"], cnt) <= 0:
-                            is_good_one = True
-                            break
-                    if is_good_one:
+                    if self.contains_any_point(cnt, root_points):
                         cv2.drawContours(src_image, [cnt], 0, (0, 255, 0), 2)
                     else:
                         cv2.drawContours(src_image, [cnt], 0, (0, 0, 255), 2)
@@ -183,9 +183,9 @@ class IptLinearTransformation(IptBaseAnalyzer):
                                 src=img, alpha=alpha, beta=beta
                             )
                         else:
-                            self.result = img
+                            self.result = img.copy()
                     else:
-                        self.result = img
+                        self.result = img.copy()
 
                 if brg_calc != "none":
                     bs, gs, rs = cv2.split(img)
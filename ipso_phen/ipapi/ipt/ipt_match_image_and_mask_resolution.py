@@ -102,6 +102,10 @@ class IptMatchImageAndMaskResolution(IptBase):
     def is_wip(self):
         return False
 
+    @property
+    def cacheable_result(self):
+        return False
+
     @property
     def real_time(self):
         return True
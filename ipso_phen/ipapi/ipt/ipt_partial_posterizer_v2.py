@@ -89,7 +89,7 @@ class IptPartialPosterizerV2(IptBase):
         res = False
         try:
             if self.get_value_of("enabled") == 1:
-                img = wrapper.current_image
+                img = wrapper.current_image.copy()
 
                 blue_color = self.get_value_of(key="blue_color")
                 blue_percent = self.get_value_of("post_blue_value") / 100
@@ -12,10 +12,13 @@ class ArgWrapper:
         * write_result_text: Write result text file, required= False, default=False
         * store_mosaic: Store mosaic, required= False, default=none)
         * write_mosaic: Write mosaic image in a separate folder
+        * mosaic_max_width: shrink mosaic tiles to fit this width, 0 keeps full size, default=0
         * overwrite: Overwrite already analysed files, required= False, default=False
         * seed_output: Suffix output folder with date, required= False, default=False
         * threshold_only: if true no analysis will be performed after threshold, required=False, default=False
         * group_by_series: if true all images from the plant from the sames series will be assigned the same id
+        * result_sink: csv, parquet or feather, how image results are collected, default=csv
+        * node_cache: store pipeline node results on disk to reuse them on reruns, default=False
     """
 
     def __init__(self, **kwargs):
@@ -24,6 +27,7 @@ class ArgWrapper:
         self.write_result_text = kwargs.get("write_result_text", True)
         self.store_mosaic = kwargs.get("store_mosaic", "none")
         self.write_mosaic = kwargs.get("write_mosaic", "none")
+        self.mosaic_max_width = kwargs.get("mosaic_max_width", 0)
 
         self.overwrite = kwargs.get("overwrite", False)
         self.seed_output = kwargs.get("seed_output", False)
@@ -38,6 +42,10 @@ class ArgWrapper:
 
         self.multi_thread = kwargs.get("multi_thread", False)
 
+        self.result_sink = kwargs.get("result_sink", "csv")
+
+        self.node_cache = kwargs.get("node_cache", False)
+
         self.save_mosaics = kwargs.get("save_mosaics", False)
 
         _dst_path = kwargs.get("dst_path", "")
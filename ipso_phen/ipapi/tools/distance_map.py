@@ -0,0 +1,123 @@
+import cv2
+import numpy as np
+
+
+class DistanceMap:
+    """Distances to a group of reference contours, answered in bulk
+
+    References are drawn once, distances are read from the distance transform of
+    the drawing instead of testing every pair of points. Distances are measured
+    from the points of the queried contours to the drawn references, 0 if a point
+    lies on them.
+
+    Arguments:
+        shape {tuple} -- shape of the mask the contours come from
+
+    Keyword Arguments:
+        contours {list} -- reference contours (default: {()})
+        offset {tuple} -- position of the map in the mask, contours and points
+          are given in mask coordinates (default: {(0, 0)})
+        thickness {int} -- thickness of the drawn contours, filled if negative
+          (default: {-1})
+    """
+
+    def __init__(self, shape, contours=(), offset=(0, 0), thickness=-1) -> None:
+        self.reference = np.zeros(shape[:2], dtype=np.uint8)
+        self.offset = np.array(offset)
+        self.thickness = thickness
+        self._dist_map = None
+        self.add_contours(contours)
+
+    @classmethod
+    def from_mask(cls, mask, offset=(0, 0)):
+        """Builds a map whose references are the non zero pixels of mask"""
+        dist_map = cls(mask.shape, offset=offset)
+        dist_map.reference[mask > 0] = 255
+        return dist_map
+
+    def add_contours(self, contours) -> None:
+        """Adds contours to the references, drawn one by one to keep nested ones"""
+        for cnt in contours:
+            cv2.drawContours(
+                self.reference,
+                [cnt],
+                0,
+                255,
+                self.thickness,
+                offset=tuple(-self.offset),
+            )
+        if len(contours) > 0:
+            self._dist_map = None
+
+    @property
+    def dist_map(self):
+        """Distance transform of the whole map, built on first use and kept"""
+        if self._dist_map is None:
+            self._dist_map = cv2.distanceTransform(
+                cv2.bitwise_not(self.reference), cv2.DIST_L2, cv2.DIST_MASK_PRECISE
+            )
+        return self._dist_map
+
+    def min_distances(self, contours, max_distance=None, return_closest=False):
+        """Returns the minimal distance of the points of each contour to the references
+
+        Keyword Arguments:
+            max_distance {float} -- only distances up to max_distance are needed,
+              above they may be overestimated (default: {None})
+            return_closest {bool} -- also return the closest point of each contour
+              (default: {False})
+
+        Returns:
+            numpy array -- distances, inf if there are no references, followed by
+              the closest points if return_closest is set
+        """
+        if len(contours) == 0:
+            empty = np.empty(0)
+            return (empty, np.empty((0, 2), dtype=int)) if return_closest else empty
+        points = np.concatenate([cnt.reshape(-1, 2) for cnt in contours])
+        points = points - self.offset
+        points_count = np.array([len(cnt.reshape(-1, 2)) for cnt in contours])
+        starts = np.concatenate(([0], np.cumsum(points_count)[:-1]))
+        point_dists = self._point_distances(points, starts, points_count, max_distance)
+        min_dists = np.minimum.reduceat(point_dists, starts)
+        if not return_closest:
+            return min_dists
+        # Sorted by contour then distance, the closest point is the first of each
+        order = np.lexsort(
+            (point_dists, np.repeat(np.arange(len(contours)), points_count))
+        )
+        return min_dists, points[order[starts]] + self.offset
+
+    def _point_distances(self, points, starts, points_count, max_distance):
+        height, width = self.reference.shape
+        point_dists = np.full(len(points), np.inf)
+
+        if (self._dist_map is None) and (max_distance is not None):
+            # Closer references are inside the bounding box of the contour
+            # widened by max_distance, small ones are transformed on their own
+            margin = int(max_distance) + 2
+            lefts = np.maximum(np.minimum.reduceat(points[:, 0], starts) - margin, 0)
+            tops = np.maximum(np.minimum.reduceat(points[:, 1], starts) - margin, 0)
+            rights = np.minimum(
+                np.maximum.reduceat(points[:, 0], starts) + margin + 1, width
+            )
+            bottoms = np.minimum(
+                np.maximum.reduceat(points[:, 1], starts) + margin + 1, height
+            )
+            if np.sum((rights - lefts) * (bottoms - tops)) < self.reference.size:
+                for i, start in enumerate(starts):
+                    window = self.reference[tops[i] : bottoms[i], lefts[i] : rights[i]]
+                    if not np.any(window):
+                        continue
+                    dist_map = cv2.distanceTransform(
+                        cv2.bitwise_not(window), cv2.DIST_L2, cv2.DIST_MASK_PRECISE
+                    )
+                    cnt_points = points[start : start + points_count[i]]
+                    point_dists[start : start + points_count[i]] = dist_map[
+                        cnt_points[:, 1] - tops[i], cnt_points[:, 0] - lefts[i]
+                    ]
+                return point_dists
+
+        if np.any(self.reference):
+            point_dists = self.dist_map[points[:, 1], points[:, 0]].astype(np.float64)
+        return point_dists
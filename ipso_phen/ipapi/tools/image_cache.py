@@ -0,0 +1,323 @@
+import os
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import multiprocessing.util
+from time import time
+
+from ipso_phen.ipapi.tools.common_functions import force_directories
+from ipso_phen.ipapi.tools.folders import ipso_folders, ALLOW_CACHE
+
+import logging
+
+logger = logging.getLogger(os.path.splitext(__name__)[-1].replace(".", ""))
+
+# Maximum size of cached images, in bytes
+CACHE_BUDGET = 50 * 2**30
+# Nothing is cached if less free space remains on the cache drive
+MIN_FREE_SPACE = 5 * 2**30
+
+# Maximum size of cached pipeline node results, in bytes
+NODE_CACHE_BUDGET = 20 * 2**30
+NODE_CACHE_FOLDER = "node_results"
+
+# Access times and counters are kept in memory and written to the index in one
+# transaction once this many are pending or this many seconds have passed
+FLUSH_COUNT = 256
+FLUSH_INTERVAL = 10
+
+INDEX_FILE_NAME = "ipso_cache_index.sqlite"
+STATS_KEYS = ["hits", "misses", "corrupted", "writes", "evictions"]
+
+
+def get_cache_root() -> str:
+    return (
+        ipso_folders.get_path("mass_storage", False)
+        if os.path.isdir(ipso_folders.get_path("mass_storage", False))
+        else ipso_folders.get_path(key="img_cache", force_creation=True)
+    )
+
+
+def get_checksum(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class ImageCache:
+    """Stores downloaded files as is, evicting least recently used ones
+
+    Files are indexed by their path relative to the cache root in a SQLite file
+    shared by all processes. Each entry stores size, checksum and last access
+    time, files failing checksum validation are discarded. Hit and miss counters
+    are stored in the index too so that worker processes statistics add up.
+    Access times and counters are written in batches, see flush.
+
+    Arguments:
+        root {str} -- cache folder
+
+    Keyword Arguments:
+        budget {int} -- maximum total size in bytes (default: {CACHE_BUDGET})
+        min_free_space {int} -- free space to keep on drive (default: {MIN_FREE_SPACE})
+    """
+
+    def __init__(
+        self,
+        root: str,
+        budget: int = CACHE_BUDGET,
+        min_free_space: int = MIN_FREE_SPACE,
+    ) -> None:
+        self.root = root
+        self.budget = budget
+        self.min_free_space = min_free_space
+        self._connexion = None
+        self._pid = None
+        self._lock = threading.RLock()
+        self._pending_access = {}
+        self._pending_stats = {}
+        self._pending_pid = None
+        self._last_flush = time()
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.root, INDEX_FILE_NAME)
+
+    def _get_connexion(self) -> sqlite3.Connection:
+        if self._connexion is None or self._pid != os.getpid():
+            force_directories(self.root)
+            self._connexion = sqlite3.connect(
+                self.index_path,
+                timeout=60,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            self._connexion.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    checksum TEXT NOT NULL,
+                    last_access REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_last_access
+                    ON entries (last_access);
+                CREATE TABLE IF NOT EXISTS stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                """
+            )
+            self._pid = os.getpid()
+        return self._connexion
+
+    def _execute(self, *args):
+        with self._lock:
+            return self._get_connexion().execute(*args).fetchall()
+
+    def _check_pending(self):
+        # Forked processes must not write the pending data of their parent
+        if self._pending_pid != os.getpid():
+            self._pending_access = {}
+            self._pending_stats = {}
+            self._pending_pid = os.getpid()
+            self._last_flush = time()
+            # Pool workers exit without running atexit handlers
+            multiprocessing.util.Finalize(None, self.flush, exitpriority=10)
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self._check_pending()
+            self._pending_stats[name] = self._pending_stats.get(name, 0) + value
+        self._flush_if_due()
+
+    def _flush_if_due(self):
+        if (
+            len(self._pending_access) + len(self._pending_stats) >= FLUSH_COUNT
+            or time() - self._last_flush >= FLUSH_INTERVAL
+        ):
+            self.flush()
+
+    def flush(self):
+        """Writes pending access times and counters to the index"""
+        with self._lock:
+            self._check_pending()
+            self._last_flush = time()
+            if not self._pending_access and not self._pending_stats:
+                return
+            connexion = self._get_connexion()
+            connexion.execute("BEGIN")
+            try:
+                connexion.executemany(
+                    "UPDATE entries SET last_access = MAX(last_access, ?) "
+                    "WHERE key = ?",
+                    [(t, key) for key, t in self._pending_access.items()],
+                )
+                connexion.executemany(
+                    "INSERT INTO stats (name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    list(self._pending_stats.items()),
+                )
+                connexion.execute("COMMIT")
+            except Exception:
+                connexion.execute("ROLLBACK")
+                raise
+            self._pending_access = {}
+            self._pending_stats = {}
+
+    def file_path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def contains(self, key: str) -> bool:
+        return (
+            len(self._execute("SELECT 1 FROM entries WHERE key = ?", (key,))) > 0
+            and os.path.isfile(self.file_path(key))
+        )
+
+    def get(self, key: str):
+        """Returns cached file content, None if missing or corrupted"""
+        rows = self._execute("SELECT checksum FROM entries WHERE key = ?", (key,))
+        data = None
+        if rows:
+            try:
+                with open(self.file_path(key), "rb") as f:
+                    data = f.read()
+            except OSError:
+                data = None
+            if data is not None and get_checksum(data) != rows[0][0]:
+                logger.warning(f"Discarding corrupted cache file {key}")
+                self._count("corrupted")
+                self.discard(key)
+                data = None
+        if data is None:
+            self._count("misses")
+            return None
+        with self._lock:
+            self._check_pending()
+            self._pending_access[key] = time()
+        self._count("hits")
+        return data
+
+    def put(self, key: str, data: bytes) -> bool:
+        """Atomically stores data and evicts old files if over budget
+
+        Returns:
+            bool -- True if data was stored
+        """
+        if ALLOW_CACHE is not True or not data or len(data) > self.budget:
+            return False
+        file_path = self.file_path(key)
+        dir_name = os.path.dirname(file_path)
+        try:
+            force_directories(dir_name)
+            if shutil.disk_usage(dir_name).free - len(data) < self.min_free_space:
+                logger.info("Not enough free space, no image cached")
+                return False
+            fd, tmp_path = tempfile.mkstemp(dir=dir_name, suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, file_path)
+            except Exception:
+                if os.path.isfile(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        except Exception as e:
+            logger.warning(f"Unable to cache {key}: {repr(e)}")
+            return False
+        self._execute(
+            "INSERT OR REPLACE INTO entries (key, size, checksum, last_access) "
+            "VALUES (?, ?, ?, ?)",
+            (key, len(data), get_checksum(data), time()),
+        )
+        self._count("writes")
+        self.evict()
+        return True
+
+    def discard(self, key: str):
+        with self._lock:
+            self._pending_access.pop(key, None)
+        self._execute("DELETE FROM entries WHERE key = ?", (key,))
+        try:
+            os.remove(self.file_path(key))
+        except OSError:
+            pass
+
+    @property
+    def size(self) -> int:
+        return self._execute("SELECT COALESCE(SUM(size), 0) FROM entries")[0][0]
+
+    def evict(self, budget: int = None):
+        """Removes least recently used files until total size fits budget"""
+        budget = self.budget if budget is None else budget
+        with self._lock:
+            excess = self.size - budget
+            if excess <= 0:
+                return
+            self.flush()
+            evicted = 0
+            for key, size in self._execute(
+                "SELECT key, size FROM entries ORDER BY last_access"
+            ):
+                if excess <= 0:
+                    break
+                self.discard(key)
+                excess -= size
+                evicted += 1
+            self._count("evictions", evicted)
+
+    def get_stats(self) -> dict:
+        """Returns counters of all processes, those of other processes may not be
+        flushed yet"""
+        self.flush()
+        stats = dict.fromkeys(STATS_KEYS, 0)
+        stats.update(dict(self._execute("SELECT name, value FROM stats")))
+        return stats
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            if self._connexion is not None and self._pid == os.getpid():
+                self._connexion.close()
+            self._connexion = None
+
+
+_image_caches = {}
+
+
+def get_image_cache(root: str = None, budget: int = CACHE_BUDGET) -> ImageCache:
+    """Returns the cache for root, the default image cache if root is None
+
+    Budget is only used when the cache is created.
+    """
+    root = get_cache_root() if root is None else root
+    if root not in _image_caches:
+        _image_caches[root] = ImageCache(root=root, budget=budget)
+    return _image_caches[root]
+
+
+def flush_image_caches():
+    """Writes pending access times and counters of all caches of this process"""
+    for image_cache in list(_image_caches.values()):
+        try:
+            image_cache.flush()
+        except Exception as e:
+            logger.warning(f"Unable to flush {image_cache.root}: {repr(e)}")
+
+
+def get_node_cache() -> ImageCache:
+    """Returns the cache holding pipeline node results"""
+    return get_image_cache(
+        root=os.path.join(get_cache_root(), NODE_CACHE_FOLDER),
+        budget=NODE_CACHE_BUDGET,
+    )
+
+
+def format_cache_stats(start: dict, end: dict) -> str:
+    diff = {k: end.get(k, 0) - start.get(k, 0) for k in STATS_KEYS}
+    requests = diff["hits"] + diff["misses"]
+    hit_rate = diff["hits"] / requests * 100 if requests > 0 else 0
+    return (
+        f"Image cache: {diff['hits']} hits, {diff['misses']} misses ({hit_rate:.1f}% hit rate), "
+        f"{diff['writes']} writes, {diff['evictions']} evictions, "
+        f"{diff['corrupted']} corrupted"
+    )
@@ -119,7 +119,7 @@ class ImageList:
         if not mask:
             return True, "none"
 
-        img_w = ImageWrapper(filename)
+        img_w = ImageWrapper(filename, database=None, use_memo=True)
 
         for key, value in mask.items():
             if not img_w.matches(key, value):
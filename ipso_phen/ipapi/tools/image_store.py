@@ -0,0 +1,301 @@
+import os
+import atexit
+import shutil
+import tempfile
+import threading
+import weakref
+
+import cv2
+import numpy as np
+
+import logging
+
+logger = logging.getLogger(os.path.splitext(__name__)[-1].replace(".", ""))
+
+# Stored images beyond this total size, in bytes, are spilled to disk oldest first
+IMAGE_LIST_BUDGET = 2**30
+# Fast PNG compression, spilled images are written once and seldom read back
+PNG_COMPRESSION = 1
+
+_spill_folder = {}
+_spill_lock = threading.Lock()
+
+
+def get_spill_folder() -> str:
+    """Returns the temporary folder holding spilled images of this process"""
+    with _spill_lock:
+        pid = os.getpid()
+        if pid not in _spill_folder:
+            _spill_folder[pid] = tempfile.mkdtemp(prefix="ipso_image_list_")
+            atexit.register(_remove_spill_folder, pid)
+        return _spill_folder[pid]
+
+
+def _remove_spill_folder(pid: int):
+    # Forked processes inherit exit handlers of their parent
+    if pid == os.getpid():
+        shutil.rmtree(_spill_folder.pop(pid, ""), ignore_errors=True)
+
+
+def _remove_file(file_path: str):
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
+
+
+class SpilledImage:
+    """Image written to a temporary file, the file is removed with the object
+
+    Arguments:
+        image {numpy array} -- image to write
+    """
+
+    def __init__(self, image) -> None:
+        self.shape = image.shape
+        self.dtype = image.dtype
+        self.nbytes = image.nbytes
+        fd, self.file_path = tempfile.mkstemp(dir=get_spill_folder())
+        with os.fdopen(fd, "wb") as f:
+            if self.dtype in (np.uint8, np.uint16) and (
+                len(self.shape) == 2 or self.shape[2] in (1, 3, 4)
+            ):
+                _, buffer = cv2.imencode(
+                    ".png", image, [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION]
+                )
+                f.write(buffer.tobytes())
+                self.is_png = True
+            else:
+                np.save(f, image, allow_pickle=False)
+                self.is_png = False
+        weakref.finalize(self, _remove_file, self.file_path)
+
+    def load(self):
+        if self.is_png:
+            image = cv2.imdecode(
+                np.fromfile(self.file_path, dtype=np.uint8), cv2.IMREAD_UNCHANGED
+            )
+            return image.reshape(self.shape)
+        return np.load(self.file_path, allow_pickle=False)
+
+
+class StoredImage(dict):
+    """Image list entry, spilled images are reloaded when the image is accessed
+
+    Every accessor goes through __getitem__, overriding __iter__ also makes
+    dict(entry) and dict.update use it instead of copying raw values.
+    """
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if isinstance(value, SpilledImage):
+            return value.load()
+        return value
+
+    def __iter__(self):
+        return super().__iter__()
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def pop(self, key, *args):
+        value = super().pop(key, *args)
+        if isinstance(value, SpilledImage):
+            return value.load()
+        return value
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def copy(self):
+        return self.__class__(self.items())
+
+    @property
+    def in_memory_size(self) -> int:
+        image = super().get("image", None)
+        return image.nbytes if isinstance(image, np.ndarray) else 0
+
+    def spill(self) -> int:
+        """Writes image to disk and returns the freed memory size"""
+        size = self.in_memory_size
+        if size > 0:
+            dict.__setitem__(self, "image", SpilledImage(super().get("image")))
+        return size
+
+
+class ImageStore(list):
+    """List of stored image dictionaries with a memory budget
+
+    Entries are indexed by lower case name. When images held in memory exceed
+    the budget, the oldest ones are spilled to compressed temporary files.
+    Every change goes through a lock, threaded pipeline branches may store
+    images in the same list.
+
+    Keyword Arguments:
+        items {list} -- initial entries (default: {()})
+        budget {int} -- maximum size of in memory images in bytes, 0 to never
+          spill (default: {IMAGE_LIST_BUDGET})
+    """
+
+    def __init__(self, items=(), budget: int = IMAGE_LIST_BUDGET) -> None:
+        super().__init__()
+        self.budget = budget
+        self._index = {}
+        # Running total of memory_size and position of the oldest entry that may
+        # still be in memory, both avoid walking the whole list on append
+        self._memory_size = 0
+        self._spill_from = 0
+        self._lock = threading.RLock()
+        self.extend(items)
+
+    def __reduce__(self):
+        # Locks can not be pickled nor copied
+        return self.__class__, (list(self), self.budget)
+
+    @staticmethod
+    def _as_entry(item):
+        if isinstance(item, dict) and not isinstance(item, StoredImage):
+            return StoredImage(item)
+        return item
+
+    def _reindex(self):
+        index = {}
+        memory_size = 0
+        for dic in self:
+            if isinstance(dic, dict):
+                index.setdefault(dic["name"].lower(), dic)
+            if isinstance(dic, StoredImage):
+                memory_size += dic.in_memory_size
+        self._index = index
+        self._memory_size = memory_size
+        self._spill_from = 0
+
+    def append(self, item) -> None:
+        with self._lock:
+            item = self._as_entry(item)
+            if isinstance(item, dict):
+                self._index.setdefault(item["name"].lower(), item)
+            if isinstance(item, StoredImage):
+                self._memory_size += item.in_memory_size
+            super().append(item)
+            self._apply_budget()
+
+    def extend(self, items) -> None:
+        with self._lock:
+            for item in items:
+                self.append(item)
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    def __imul__(self, value):
+        with self._lock:
+            super().__imul__(value)
+            self._reindex()
+            self._apply_budget()
+        return self
+
+    def insert(self, index, item) -> None:
+        with self._lock:
+            super().insert(index, self._as_entry(item))
+            self._reindex()
+            self._apply_budget()
+
+    def __setitem__(self, index, value) -> None:
+        with self._lock:
+            if isinstance(index, slice):
+                value = [self._as_entry(item) for item in value]
+            else:
+                value = self._as_entry(value)
+            super().__setitem__(index, value)
+            self._reindex()
+            self._apply_budget()
+
+    def __delitem__(self, index) -> None:
+        with self._lock:
+            super().__delitem__(index)
+            self._reindex()
+
+    def pop(self, index=-1):
+        with self._lock:
+            item = super().pop(index)
+            self._reindex()
+            return item
+
+    def remove(self, item) -> None:
+        with self._lock:
+            # Identity avoids comparing images of entries sharing a name
+            for i, dic in enumerate(self):
+                if dic is item:
+                    super().__delitem__(i)
+                    break
+            else:
+                raise ValueError("Entry not in image store")
+            self._spill_from = min(self._spill_from, i)
+            if isinstance(item, StoredImage):
+                self._memory_size -= item.in_memory_size
+                key = item["name"].lower()
+                if self._index.get(key, None) is item:
+                    self._index.pop(key)
+                    for dic in self:
+                        if isinstance(dic, dict) and dic["name"].lower() == key:
+                            self._index[key] = dic
+                            break
+
+    def clear(self) -> None:
+        with self._lock:
+            super().clear()
+            self._index = {}
+            self._memory_size = 0
+            self._spill_from = 0
+
+    def sort(self, *args, **kwargs) -> None:
+        with self._lock:
+            super().sort(*args, **kwargs)
+            self._reindex()
+
+    def reverse(self) -> None:
+        with self._lock:
+            super().reverse()
+            self._reindex()
+
+    def get_named(self, name: str):
+        """Returns the first entry with name, case insensitive, None if missing"""
+        return self._index.get(name.lower(), None)
+
+    def remove_named(self, key: str):
+        """Removes entries named key, case insensitive"""
+        key = key.lower()
+        with self._lock:
+            while key in self._index:
+                self.remove(self._index[key])
+
+    @property
+    def memory_size(self) -> int:
+        """Size of images held in memory, entries may be shared with other stores"""
+        with self._lock:
+            return sum(
+                dic.in_memory_size for dic in self if isinstance(dic, StoredImage)
+            )
+
+    def _apply_budget(self):
+        if self.budget <= 0 or self._memory_size <= self.budget:
+            return
+        # Newest image is kept in memory as it is likely to be used next
+        while self._spill_from < len(self) - 1:
+            dic = super().__getitem__(self._spill_from)
+            if isinstance(dic, StoredImage):
+                try:
+                    self._memory_size -= dic.spill()
+                except Exception as e:
+                    logger.warning(f'Unable to spill {dic["name"]}: {repr(e)}')
+                    return
+            self._spill_from += 1
+            if self._memory_size <= self.budget:
+                return
+        # Shared entries may have been spilled by another store
+        self._memory_size = self.memory_size
@@ -0,0 +1,122 @@
+import os
+import json
+import sqlite3
+import hashlib
+from time import time
+
+import logging
+
+logger = logging.getLogger(os.path.splitext(__name__)[-1].replace(".", ""))
+
+JOURNAL_FILE_NAME = "ipso_job_journal.sqlite"
+
+JOB_OK = "ok"
+JOB_FAILED = "failed"
+
+
+def get_pipeline_hash(script) -> str:
+    """Returns a hash of the pipeline settings, edit date is ignored"""
+    script_json = {k: v for k, v in script.to_json().items() if k != "date"}
+    return hashlib.blake2b(
+        json.dumps(script_json, sort_keys=True, default=str).encode(),
+        digest_size=16,
+    ).hexdigest()
+
+
+def get_item_key(item) -> str:
+    """Returns the source file of a file path or (file path, luid) tuple"""
+    return item if isinstance(item, str) else item[0]
+
+
+class JobJournal:
+    """Records the status of each item of a batch run in a SQLite file
+
+    Each result is committed as soon as it is recorded so that an interrupted
+    run can be resumed. Items are identified by their source file path, the
+    pipeline hash tells if a result is stale.
+
+    Arguments:
+        file_path {str} -- journal file
+    """
+
+    def __init__(self, file_path: str) -> None:
+        self.file_path = file_path
+        self._connexion = None
+
+    def _get_connexion(self) -> sqlite3.Connection:
+        if self._connexion is None:
+            self._connexion = sqlite3.connect(
+                self.file_path, timeout=60, isolation_level=None
+            )
+            self._connexion.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    item TEXT PRIMARY KEY,
+                    luid TEXT,
+                    status TEXT NOT NULL,
+                    pipeline_hash TEXT NOT NULL,
+                    time_spent REAL NOT NULL,
+                    error_message TEXT NOT NULL,
+                    updated REAL NOT NULL
+                )
+                """)
+        return self._connexion
+
+    def record(
+        self,
+        item,
+        status: str,
+        pipeline_hash: str,
+        time_spent: float = 0,
+        error_message: str = "",
+    ):
+        """Stores item status, replacing previous one
+
+        Arguments:
+            item {str, tuple} -- file path or (file path, luid) tuple
+            status {str} -- JOB_OK or JOB_FAILED
+            pipeline_hash {str} -- hash of the pipeline used
+        """
+        self._get_connexion().execute(
+            "INSERT OR REPLACE INTO jobs "
+            "(item, luid, status, pipeline_hash, time_spent, error_message, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                get_item_key(item),
+                None if isinstance(item, str) else item[1],
+                status,
+                pipeline_hash,
+                time_spent,
+                error_message,
+                time(),
+            ),
+        )
+
+    def get_status(self, item) -> dict:
+        """Returns item journal entry, None if item was never processed"""
+        cursor = self._get_connexion().execute(
+            "SELECT * FROM jobs WHERE item = ?", (get_item_key(item),)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([c[0] for c in cursor.description], row))
+
+    def get_completed(self, pipeline_hash: str) -> set:
+        """Returns items successfully processed with the pipeline"""
+        return {
+            row[0]
+            for row in self._get_connexion().execute(
+                "SELECT item FROM jobs WHERE status = ? AND pipeline_hash = ?",
+                (JOB_OK, pipeline_hash),
+            )
+        }
+
+    def filter_pending(self, items: list, pipeline_hash: str) -> list:
+        """Returns items that failed, are stale or were never processed"""
+        completed = self.get_completed(pipeline_hash)
+        return [item for item in items if get_item_key(item) not in completed]
+
+    def close(self):
+        if self._connexion is not None:
+            self._connexion.close()
+            self._connexion = None
@@ -0,0 +1,73 @@
+import os
+
+import pandas as pd
+
+import logging
+
+logger = logging.getLogger(os.path.splitext(__name__)[-1].replace(".", ""))
+
+# "csv" writes one partial file per image, other formats send rows back to the
+#  main process and write a single columnar file next to the merged CSV
+RESULT_SINK_FORMATS = ["csv", "parquet", "feather"]
+
+
+class ResultSink:
+    """Collects result rows sent back by the workers
+
+    Rows are grouped by header so that merging does not need to realign
+    columns row by row.
+    """
+
+    def __init__(self) -> None:
+        self._rows = {}
+
+    def add(self, header: list, row: list):
+        self._rows.setdefault(tuple(header), []).append(list(row))
+
+    def add_rows(self, rows):
+        """Adds (header, row) tuples"""
+        for header, row in rows:
+            self.add(header, row)
+
+    def clear(self):
+        self._rows = {}
+
+    def __len__(self) -> int:
+        return sum(len(rows) for rows in self._rows.values())
+
+    @property
+    def partials(self) -> list:
+        """Returns (header, rows) tuples, same as partial result files"""
+        return [(list(header), rows) for header, rows in self._rows.items()]
+
+
+def get_columnar_file_path(csv_file_path: str, file_format: str) -> str:
+    return f"{os.path.splitext(csv_file_path)[0]}.{file_format}"
+
+
+def write_columnar_file(
+    dataframe: pd.DataFrame, file_path: str, file_format: str
+) -> bool:
+    """Writes dataframe as a Parquet or Feather file, requires pyarrow, or
+    fastparquet for Parquet
+
+    Returns:
+        bool -- True if the file was written
+    """
+    try:
+        if file_format == "parquet":
+            dataframe.to_parquet(file_path, index=False)
+        elif file_format == "feather":
+            dataframe.reset_index(drop=True).to_feather(file_path)
+        else:
+            logger.error(f"Unknown columnar format {file_format}")
+            return False
+    except ImportError as e:
+        logger.error(
+            f"Unable to write {file_format} file, missing dependency: {repr(e)}"
+        )
+        return False
+    except Exception as e:
+        logger.exception(f"Unable to write {file_format} file: {repr(e)}")
+        return False
+    return True
@@ -26,6 +26,7 @@ logging.getLogger().addHandler(
 logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
 
 from ipso_phen.ipapi.base.pipeline_launcher import launch
+from ipso_phen.ipapi.tools.result_sink import RESULT_SINK_FORMATS
 
 
 class StoreTrueOnly(argparse.Action):
@@ -193,6 +194,33 @@ def run_cli():
         dest="save_mosaics",
     )
 
+    parser.add_argument(
+        "--mosaic-max-width",
+        required=False,
+        help="Shrink mosaic tiles so that mosaics fit this width, full size if not set",
+        default=None,
+        type=int,
+        dest="mosaic_max_width",
+    )
+
+    parser.add_argument(
+        "--result-sink",
+        required=False,
+        help="How image results are collected, csv writes one partial file per image, "
+        + "parquet and feather also write a single columnar file (requires pyarrow)",
+        default=None,
+        choices=RESULT_SINK_FORMATS,
+        dest="result_sink",
+    )
+
+    parser.add_argument(
+        "--node-cache",
+        required=False,
+        help="Store pipeline node results on disk, reruns only process nodes after a change",
+        action=StoreTrueOnly,
+        dest="node_cache",
+    )
+
     args = vars(parser.parse_args())
     logger.info("Retrieved parameters")
     for k, v in args.items():
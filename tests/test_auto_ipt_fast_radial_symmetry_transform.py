@@ -4,6 +4,11 @@ import unittest
 
 from ipso_phen.ipapi.ipt.ipt_fast_radial_symmetry_transform import (
     IptFastRadialSymmetryTransform,
+    accumulate_projections,
+    get_affected_offsets,
+    get_radial_projections,
+    gradx,
+    grady,
 )
 from ipso_phen.ipapi.base.ip_abstract import BaseImageProcessor
 from ipso_phen.ipapi.base.ipt_loose_pipeline import LoosePipeline
@@ -29,3 +34,50 @@ class TestIptFastRadialSymmetryTransform(unittest.TestCase):
                 op.process_wrapper.__doc__,
                 "Missing docstring for Fast Radial Symmetry Transform",
             )
+
+    def test_projections(self):
+        """Fast Radial Symmetry Transform: Votes match a pixel by pixel accumulation"""
+        wrapper = BaseImageProcessor(
+            "./ipso_phen/ipapi/samples/images/arabido_small.jpg",
+            database=None,
+        )
+        img = wrapper.get_channel(src_img=wrapper.current_image, channel="l")[
+            200:280, 300:400
+        ]
+        gx, gy = gradx(img), grady(img)
+        gnorms = np.sqrt(gx * gx + gy * gy)
+        gthresh = np.amax(gnorms) * 0.03
+        for radius in [2, 5]:
+            gpx, gpy = get_affected_offsets(gx, gy, gnorms, radius)
+            working_dims = tuple((e + 2 * radius) for e in img.shape)
+            O_n = np.zeros(working_dims, np.int16)
+            M_n = np.zeros(working_dims, np.int16)
+            for (i, j), gnorm in np.ndenumerate(gnorms):
+                if gnorm > gthresh:
+                    ppve = (i + gpx[i, j], j + gpy[i, j])
+                    O_n[ppve] += 1
+                    M_n[ppve] += gnorm
+                    pnve = (i - gpx[i, j], j - gpy[i, j])
+                    O_n[pnve] -= 1
+                    M_n[pnve] -= gnorm
+            res_O, res_M = accumulate_projections(
+                gnorms, gpx, gpy, gthresh, radius, True, True
+            )
+            self.assertTrue(np.array_equal(res_O, O_n))
+            self.assertTrue(np.array_equal(res_M, M_n))
+            projections = get_radial_projections(img, [2, 5], 0.03)
+            self.assertTrue(np.array_equal(projections[radius][1], M_n))
+
+    def test_process(self):
+        """Fast Radial Symmetry Transform: Test that an image is returned"""
+        op = IptFastRadialSymmetryTransform()
+        wrapper = BaseImageProcessor(
+            "./ipso_phen/ipapi/samples/images/arabido_small.jpg",
+            database=None,
+        )
+        self.assertTrue(op.process_wrapper(wrapper=wrapper))
+        self.assertIsInstance(op.result, np.ndarray)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+import cv2
+import numpy as np
+
+import ipso_phen.ipapi.base.ip_common as ipc
+from ipso_phen.ipapi.base.ip_abstract import BaseImageProcessor
+
+
+class TestColorFeatures(unittest.TestCase):
+    def setUp(self):
+        self.wrapper = BaseImageProcessor(
+            "./ipso_phen/ipapi/samples/images/arabido_small.jpg",
+            database=None,
+        )
+        img = self.wrapper.current_image
+        self.mask = (cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) > 90).astype(np.uint8) * 255
+
+    def test_histograms(self):
+        """Histograms built from value counts match calcHist"""
+        channel = self.wrapper.get_channel(channel="v")
+        counts = np.bincount(channel[self.mask > 0], minlength=256)
+        for bin_count in [4, 10, 147, 256]:
+            np.testing.assert_array_equal(
+                ipc.histogram_from_counts(counts, bin_count),
+                cv2.calcHist([channel], [0], self.mask, [bin_count], [0, 255])[:, 0],
+            )
+        mean, std_dev = cv2.meanStdDev(channel, mask=self.mask)
+        np.testing.assert_allclose(
+            ipc.mean_std_from_counts(counts),
+            (mean[0][0], std_dev[0][0]),
+        )
+
+    def test_analyze_color(self):
+        """Colour features are computed from masked pixels only"""
+        wrapper = self.wrapper
+        wrapper.init_csv_writer()
+        for key in ["color_mean", "color_std_dev", "quantile_color_5"]:
+            wrapper.csv_data_holder.data_list[key] = None
+        wrapper.analyze_color(wrapper.current_image, self.mask)
+        data = wrapper.csv_data_holder.data_list
+
+        lab = cv2.cvtColor(wrapper.current_image, cv2.COLOR_BGR2Lab)
+        mean, std_dev = cv2.meanStdDev(lab[:, :, 1], mask=self.mask)
+        self.assertAlmostEqual(data["LAB_a_mean"], mean[0][0])
+        self.assertAlmostEqual(data["LAB_a_std_dev"], std_dev[0][0])
+        self.assertAlmostEqual(
+            sum(data[f"quantile_color_HSV_h_{i}_5_percent"] for i in range(1, 6)),
+            100,
+        )
+        self.assertNotIn("color_mean", data)
+
+
+if __name__ == "__main__":
+    unittest.main()
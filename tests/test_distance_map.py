@@ -0,0 +1,74 @@
+import unittest
+
+import cv2
+import numpy as np
+
+import ipso_phen.ipapi.base.ip_common as ipc
+from ipso_phen.ipapi.tools.distance_map import DistanceMap
+
+
+def get_contours():
+    rng = np.random.default_rng(0)
+    mask = np.zeros((200, 260), np.uint8)
+    for x, y, r in rng.integers((0, 0, 1), (260, 200, 12), (40, 3)):
+        cv2.circle(mask, (int(x), int(y)), int(r), 255, -1)
+    return ipc.get_contours(
+        mask=mask, retrieve_mode=cv2.RETR_LIST, method=cv2.CHAIN_APPROX_SIMPLE
+    )
+
+
+def exact_distance(cnt, references):
+    return min(
+        max(-cv2.pointPolygonTest(ref, (int(x), int(y)), True), 0)
+        for ref in references
+        for x, y in cnt.reshape(-1, 2)
+    )
+
+
+class TestDistanceMap(unittest.TestCase):
+    def setUp(self):
+        self.contours = get_contours()
+        self.references = self.contours[:5]
+        self.others = self.contours[5:]
+
+    def test_min_distances(self):
+        """Distances match point to polygon distances within a pixel"""
+        dist_map = DistanceMap((200, 260), self.references)
+        dists = dist_map.min_distances(self.others)
+        for cnt, dist in zip(self.others, dists):
+            self.assertAlmostEqual(dist, exact_distance(cnt, self.references), delta=1)
+        self.assertTrue(np.all(dist_map.min_distances(self.references) == 0))
+
+    def test_max_distance(self):
+        """Distances up to max_distance are those of the whole map"""
+        # Few contours, each one is measured in a window around it
+        others = self.others[:4]
+        dists, closest = DistanceMap((200, 260), self.references).min_distances(
+            others, max_distance=20, return_closest=True
+        )
+        expected = DistanceMap((200, 260), self.references).min_distances(others)
+        np.testing.assert_array_equal(dists[expected <= 20], expected[expected <= 20])
+        self.assertTrue(np.all(dists[expected > 20] > 20))
+        for cnt, point in zip(others, closest):
+            self.assertTrue(np.any(np.all(cnt.reshape(-1, 2) == point, axis=1)))
+
+    def test_offset(self):
+        """Maps cropped from a mask take contours in mask coordinates"""
+        mask = np.zeros((200, 260), np.uint8)
+        cv2.drawContours(mask, self.references, -1, 255, -1)
+        cropped = DistanceMap.from_mask(mask[20:, 30:], offset=(30, 20))
+        mask[:20] = 0
+        mask[:, :30] = 0
+        full = DistanceMap.from_mask(mask)
+        inside = [cnt for cnt in self.others if np.all(cnt.reshape(-1, 2) >= (30, 20))]
+        np.testing.assert_array_equal(
+            cropped.min_distances(inside), full.min_distances(inside)
+        )
+        self.assertEqual(len(DistanceMap((10, 10)).min_distances([])), 0)
+        self.assertTrue(
+            np.isinf(DistanceMap((200, 260)).min_distances(self.others)).all()
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+import ipso_phen.ipapi.base.ip_common as ipc
+import ipso_phen.ipapi.file_handlers.fh_base as fh_base
+from ipso_phen.ipapi.base.ip_abstract import BaseImageProcessor
+from ipso_phen.ipapi.ipt.ipt_horizontal_line_remover import IptHorizontalLineDetector
+
+
+class TestFileHandlers(unittest.TestCase):
+    def setUp(self):
+        self.wrapper = BaseImageProcessor(
+            "./ipso_phen/ipapi/samples/images/arabido_small.jpg",
+            database=None,
+        )
+
+    def test_shared_images(self):
+        """Images are shared as read only views, setters do not alias their input"""
+        img = self.wrapper.current_image
+        self.assertFalse(img.flags.writeable)
+        self.assertTrue(np.shares_memory(img, self.wrapper.current_image))
+        self.assertTrue(np.shares_memory(img, self.wrapper.source_image))
+        with self.assertRaises(ValueError):
+            img[0, 0] = 0
+
+        new_img = img.copy()
+        self.wrapper.current_image = new_img
+        new_img[0, 0] = 0
+        self.assertFalse(np.shares_memory(new_img, self.wrapper.current_image))
+        self.assertTrue(np.shares_memory(img, self.wrapper.source_image))
+
+    def test_check_shared_images(self):
+        """Debug mode detects writes into shared buffers"""
+        fh = self.wrapper.file_handler
+        _ = self.wrapper.current_image
+        fh_base.CHECK_SHARED_IMAGES = True
+        try:
+            self.assertTrue(fh.check_shared_images())
+            fh._source_image.setflags(write=True)
+            fh._source_image[0, 0] = 255 - fh._source_image[0, 0]
+            self.assertFalse(fh.check_shared_images())
+            self.assertTrue(fh.check_shared_images())
+        finally:
+            fh_base.CHECK_SHARED_IMAGES = False
+
+    def test_channel_cache(self):
+        """Colour space conversions of the current image are reused until it changes"""
+        wrapper = self.wrapper
+        h = wrapper.get_color_space_planes(color_space=ipc.HSV)[0]
+        self.assertIs(h, wrapper.get_color_space_planes(color_space=ipc.HSV)[0])
+        self.assertFalse(h.flags.writeable)
+        channel = wrapper.get_channel(channel="h")
+        self.assertTrue(channel.flags.writeable)
+        np.testing.assert_array_equal(channel, h)
+        channel[:] = 0
+        np.testing.assert_array_equal(wrapper.get_channel(channel="h"), h)
+        np.testing.assert_array_equal(
+            wrapper.get_channel(channel="a"),
+            cv2.cvtColor(wrapper.current_image, cv2.COLOR_BGR2Lab)[:, :, 1],
+        )
+        np.testing.assert_array_equal(
+            wrapper.get_channel(channel="rd"), wrapper.current_image[:, :, 2]
+        )
+
+        wrapper.current_image = 255 - wrapper.current_image
+        new_h = wrapper.get_color_space_planes(color_space=ipc.HSV)[0]
+        self.assertIsNot(h, new_h)
+        np.testing.assert_array_equal(
+            new_h, cv2.cvtColor(wrapper.current_image, cv2.COLOR_BGR2HSV)[:, :, 0]
+        )
+
+        img = wrapper.current_image.copy()
+        self.assertIsNot(
+            wrapper.get_color_space_planes(src_img=img)[0],
+            wrapper.get_color_space_planes(src_img=img)[0],
+        )
+
+    def test_channel_in_place(self):
+        """Tools writing into the channels of the current image leave it unchanged"""
+        h = self.wrapper.get_color_space_planes(color_space=ipc.HSV)[0].copy()
+        op = IptHorizontalLineDetector(channel="h", min_line_size=10)
+        self.assertTrue(op.process_wrapper(wrapper=self.wrapper))
+        self.assertIsInstance(op.result, np.ndarray)
+        np.testing.assert_array_equal(
+            self.wrapper.get_color_space_planes(color_space=ipc.HSV)[0], h
+        )
+
+
+class FhJpg(fh_base.FileHandlerDefault):
+    probe_calls = []
+
+    @classmethod
+    def probe(cls, file_path, database):
+        cls.probe_calls.append(file_path)
+        return 100 if file_path.endswith(".jpg") else 0
+
+
+class FhPng(fh_base.FileHandlerDefault):
+    @classmethod
+    def probe(cls, file_path, database):
+        return 100 if file_path.endswith(".png") else 0
+
+
+class TestFileHandlerClasses(unittest.TestCase):
+    def setUp(self):
+        FhJpg.probe_calls = []
+        patchers = [
+            mock.patch.object(fh_base, "_file_handlers_classes", [FhJpg, FhPng]),
+            mock.patch.dict(fh_base._file_handler_class_memo, clear=True),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_classes_registry(self):
+        """File handler classes are collected once, refresh rescans the package"""
+        fh_base._file_handlers_classes = None
+        classes = fh_base.get_file_handlers_classes()
+        self.assertIn(fh_base.FileHandlerDefault, classes)
+        self.assertIs(classes, fh_base.get_file_handlers_classes())
+        fh_base.refresh_file_handlers()
+        self.assertIsNot(classes, fh_base.get_file_handlers_classes())
+        self.assertEqual(classes, fh_base.get_file_handlers_classes())
+
+    def test_memo(self):
+        """Memoized probes return the same class without probing again"""
+        cls = fh_base.get_file_handler_class("a.jpg", None, use_memo=True)
+        self.assertIs(cls, FhJpg)
+        self.assertIs(fh_base.get_file_handler_class("a.jpg", None, use_memo=True), cls)
+        self.assertEqual(FhJpg.probe_calls, ["a.jpg"])
+        self.assertIsInstance(
+            fh_base.file_handler_factory("a.jpg", None, use_memo=True), FhJpg
+        )
+        self.assertEqual(FhJpg.probe_calls, ["a.jpg"])
+
+        fh_base.get_file_handler_class("a.jpg", None)
+        self.assertEqual(FhJpg.probe_calls, ["a.jpg", "a.jpg"])
+
+    def test_memo_keys(self):
+        """Other paths, extensions and databases are probed, not served stale"""
+        fh_base.get_file_handler_class("a.jpg", None, use_memo=True)
+        self.assertIs(
+            fh_base.get_file_handler_class("a.png", None, use_memo=True), FhPng
+        )
+        self.assertIs(
+            fh_base.get_file_handler_class("b.jpg", None, use_memo=True), FhJpg
+        )
+        self.assertIs(
+            fh_base.get_file_handler_class("a.jpg", object(), use_memo=True), FhJpg
+        )
+        self.assertEqual(FhJpg.probe_calls, ["a.jpg", "a.png", "b.jpg", "a.jpg"])
+        self.assertIs(
+            fh_base.get_file_handler_class("a.tiff", None, use_memo=True),
+            fh_base.FileHandlerDefault,
+        )
+
+        fh_base.refresh_file_handlers()
+        self.assertEqual(len(fh_base._file_handler_class_memo), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import itertools
+import os
+import threading
+import unittest
+from contextlib import closing
+
+from ipso_phen.ipapi.base.ip_abstract import BaseImageProcessor
+from ipso_phen.ipapi.base.ipt_loose_pipeline import LoosePipeline
+from ipso_phen.ipapi.base.grid_search import (
+    get_grid_search_combinations,
+    run_grid_search,
+)
+
+SAMPLES_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "ipso_phen", "ipapi", "samples", ""
+)
+
+
+class TestGridSearch(unittest.TestCase):
+    def setUp(self):
+        self.pipeline = LoosePipeline.load(
+            os.path.join(SAMPLES_PATH, "pipelines", "sample_pipeline_arabidopsis.json")
+        )
+        self.module = [
+            node
+            for node in self.pipeline.root.iter_items(types=("modules",))
+            if node.name.startswith("Range threshold")
+        ][0]
+        self.module.tool.find_by_name("min_t").grid_search_options = "0|100;10"
+        self.module.tool.find_by_name("max_t").grid_search_options = "150|250;50"
+
+    def test_combinations(self):
+        """Combinations follow itertools.product order, sampling is capped"""
+        tool = self.module.tool
+        product = [
+            [int(v) if str.isdigit(v) else v for v in values]
+            for values in itertools.product(
+                *[p.decode_grid_search_options() for p in tool.gizmos]
+            )
+        ]
+        combinations = get_grid_search_combinations(tool)
+        self.assertEqual([list(c.values()) for c in combinations], product)
+        sample = get_grid_search_combinations(
+            tool, random_sampling=True, max_combinations=5
+        )
+        self.assertEqual(len(sample), 5)
+        self.assertTrue(all(list(c.values()) in product for c in sample))
+
+    def test_abort(self):
+        """Closing the results stops pending evaluations"""
+        evaluated = []
+        lock = threading.Lock()
+
+        def evaluate(params):
+            with lock:
+                evaluated.append(params)
+            return params
+
+        with closing(
+            run_grid_search(evaluate, [{"i": i} for i in range(100)], max_workers=2)
+        ) as results:
+            for i, _ in enumerate(results):
+                if i == 2:
+                    break
+        self.assertLess(len(evaluated), 100)
+
+    def test_module_grid_search(self):
+        """All combinations are sent back through the pipeline callback"""
+        results = []
+
+        def call_back(res, msg, data, step, total):
+            if res == "GRID_SEARCH_OK":
+                results.append(data["params"])
+
+        wrapper = BaseImageProcessor(
+            os.path.join(SAMPLES_PATH, "images", "arabido_small.jpg"),
+            database=None,
+        )
+        self.pipeline.execute(
+            src_image=wrapper,
+            silent_mode=True,
+            target_module=self.module.uuid,
+            grid_search_mode=True,
+            call_back=call_back,
+        )
+        self.assertEqual(len(results), 33)
+        self.assertEqual(
+            sorted((p["min_t"], p["max_t"]) for p in results),
+            sorted(itertools.product(range(0, 101, 10), range(150, 251, 50))),
+        )
+
+    def test_batch_grid_search(self):
+        """Combinations are scored over several images"""
+        file_list = [
+            os.path.join(SAMPLES_PATH, "images", "arabido_small.jpg"),
+            os.path.join(os.path.dirname(__file__), "input_files", "plant001_rgb.png"),
+        ]
+        df = self.pipeline.grid_search(
+            file_list=file_list,
+            target_module=self.module.uuid,
+            max_grid_search=4,
+        )
+        self.assertEqual(len(df), 4)
+        self.assertListEqual(df["images"].tolist(), [2] * 4)
+        self.assertListEqual(df["failures"].tolist(), [0] * 4)
+        self.assertListEqual(df["min_t"].tolist(), [0, 0, 0, 10])
+        self.assertTrue((df["mask_area_mean"] > 0).all())
+        self.assertTrue((df["mask_area_var"] > 0).all())
+        self.assertTrue((df["runtime_total"] > 0).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
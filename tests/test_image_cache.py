@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ipso_phen.ipapi.tools.image_cache import ImageCache
+
+
+class TestImageCache(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = ImageCache(root=self.root, budget=1000, min_free_space=0)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.root)
+
+    def test_put_get(self):
+        """Stored bytes are returned unchanged, hits and misses are counted"""
+        data = os.urandom(300)
+        self.assertIsNone(self.cache.get("robot/exp/a.jpg"))
+        self.assertTrue(self.cache.put("robot/exp/a.jpg", data))
+        self.assertEqual(self.cache.get("robot/exp/a.jpg"), data)
+        self.assertEqual(
+            os.listdir(os.path.join(self.root, "robot", "exp")),
+            ["a.jpg"],
+        )
+        stats = self.cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_corrupted_file(self):
+        """Truncated files are discarded"""
+        self.cache.put("a.jpg", os.urandom(300))
+        with open(self.cache.file_path("a.jpg"), "r+b") as f:
+            f.truncate(100)
+        self.assertIsNone(self.cache.get("a.jpg"))
+        self.assertFalse(os.path.isfile(self.cache.file_path("a.jpg")))
+        self.assertEqual(self.cache.get_stats()["corrupted"], 1)
+
+    def test_batched_access(self):
+        """Hits do not write to the index until flushed"""
+        self.cache.put("a", os.urandom(300))
+        self.cache.flush()
+        connexion = self.cache._get_connexion()
+        changes = connexion.total_changes
+        for _ in range(10):
+            self.assertIsNotNone(self.cache.get("a"))
+        self.assertEqual(connexion.total_changes, changes)
+        self.assertEqual(self.cache.get_stats()["hits"], 10)
+        self.assertGreater(connexion.total_changes, changes)
+
+    def test_lru_eviction(self):
+        """Least recently used files are evicted to stay within budget"""
+        for name in ["a", "b", "c"]:
+            self.cache.put(name, os.urandom(300))
+        self.cache.get("a")
+        self.cache.put("d", os.urandom(300))
+        self.assertTrue(self.cache.contains("a"))
+        self.assertFalse(self.cache.contains("b"))
+        self.assertTrue(self.cache.contains("d"))
+        self.assertLessEqual(self.cache.size, 1000)
+        self.assertEqual(self.cache.get_stats()["evictions"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
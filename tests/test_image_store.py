@@ -0,0 +1,157 @@
+import os
+import pickle
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ipso_phen.ipapi.tools.image_store import ImageStore, SpilledImage, StoredImage
+from ipso_phen.ipapi.base.ip_abstract import BaseImageProcessor
+
+
+def random_image(shape, dtype=np.uint8):
+    return np.random.default_rng(0).integers(0, 200, shape).astype(dtype)
+
+
+class TestImageStore(unittest.TestCase):
+    def test_spill(self):
+        """Oldest images are spilled over budget and reloaded unchanged"""
+        images = [
+            random_image((50, 40, 3)),
+            random_image((50, 40)),
+            random_image((50, 40, 1)),
+            random_image((50, 40), np.float64),
+            random_image((50, 40, 3)),
+        ]
+        store = ImageStore(budget=images[-1].nbytes * 2)
+        for i, image in enumerate(images):
+            store.append(dict(name=f"Step_{i}", image=image.copy(), written=False))
+        self.assertLessEqual(store.memory_size, store.budget)
+        spilled = dict.get(store[0], "image")
+        self.assertIsInstance(spilled, SpilledImage)
+        file_path = spilled.file_path
+        self.assertTrue(os.path.isfile(file_path))
+        del spilled
+        for dic, image in zip(store, images):
+            np.testing.assert_array_equal(dic["image"], image)
+            self.assertEqual(dic["image"].dtype, image.dtype)
+
+        store.remove_named("STEP_0")
+        self.assertIsNone(store.get_named("Step_0"))
+        self.assertIs(store.get_named("STEP_1"), store[0])
+        self.assertFalse(os.path.isfile(file_path))
+        self.assertEqual(store._memory_size, store.memory_size)
+
+    def test_spilled_access(self):
+        """Spilled images never leak out of their entry"""
+        image = random_image((50, 40, 3))
+        dic = StoredImage(name="step", image=image.copy())
+        dic.spill()
+        self.assertIsInstance(dict.get(dic, "image"), SpilledImage)
+        for value in (
+            dict(dic)["image"],
+            {**dic}["image"],
+            dic.copy()["image"],
+            dict(dic.items())["image"],
+            list(dic.values())[1],
+            pickle.loads(pickle.dumps(dic))["image"],
+            dic.pop("image"),
+        ):
+            np.testing.assert_array_equal(value, image)
+
+    def test_wrapper(self):
+        """Wrapper image lists are image stores, replaced names are removed"""
+        wrapper = BaseImageProcessor(
+            "./ipso_phen/ipapi/samples/images/arabido_small.jpg",
+            database=None,
+        )
+        wrapper.store_images = True
+        wrapper.store_image(wrapper.current_image, "step")
+        dic = wrapper.store_image(wrapper.current_image.copy(), "step")
+        self.assertEqual(len(wrapper.image_list), 1)
+        self.assertIsInstance(dic, StoredImage)
+        self.assertIs(wrapper.retrieve_image_dict("STEP"), dic)
+
+        wrapper.image_list = None
+        self.assertIsInstance(wrapper.image_list, ImageStore)
+        self.assertEqual(len(wrapper.image_list), 0)
+
+    def test_lazy_images(self):
+        """Image builders are only called when images are stored"""
+        wrapper = BaseImageProcessor(
+            "./ipso_phen/ipapi/samples/images/arabido_small.jpg",
+            database=None,
+        )
+        calls = []
+
+        def build():
+            calls.append(1)
+            return wrapper.current_image
+
+        wrapper.store_images = False
+        self.assertFalse(wrapper.is_kept_image("step"))
+        self.assertEqual(wrapper.store_image(build, "step"), {})
+        self.assertTrue(wrapper.is_kept_image("step", force_store=True))
+        self.assertIn("image", wrapper.store_image(build, "step", force_store=True))
+        wrapper.store_images = True
+        self.assertTrue(wrapper.is_kept_image("step"))
+        wrapper.store_image(build, "other_step")
+        self.assertEqual(len(calls), 2)
+
+    def test_is_store_image(self):
+        """Image paths are only built for stored images, mosaic has its own option"""
+        wrapper = BaseImageProcessor(
+            "./ipso_phen/ipapi/samples/images/arabido_small.jpg",
+            database=None,
+        )
+        wrapper.store_images = True
+        wrapper.store_mosaic = "none"
+        self.assertTrue(wrapper.is_store_image("step"))
+        self.assertFalse(wrapper.is_store_image("mosaic"))
+        self.assertTrue(wrapper.is_kept_image("mosaic"))
+        wrapper.store_mosaic = "result"
+        self.assertTrue(wrapper.is_store_image("mosaic"))
+        wrapper.store_images = False
+        self.assertFalse(wrapper.is_store_image("step"))
+
+    def test_list_methods(self):
+        """Inherited list methods keep the name index up to date"""
+        store = ImageStore(budget=0)
+        store += [dict(name="a", image=None), dict(name="b", image=None)]
+        store.insert(0, dict(name="B", image=None))
+        self.assertIsInstance(store[0], StoredImage)
+        self.assertIs(store.get_named("b"), store[0])
+        del store[0]
+        self.assertEqual(store.get_named("b")["name"], "b")
+        store[1] = dict(name="c", image=None)
+        self.assertIsNone(store.get_named("b"))
+        self.assertIs(store.get_named("c"), store[1])
+        self.assertEqual(store.pop(0)["name"], "a")
+        self.assertIsNone(store.get_named("a"))
+        store[:] = [dict(name="d", image=None)]
+        self.assertEqual(list(store._index), ["d"])
+
+        copy = pickle.loads(pickle.dumps(store))
+        self.assertIsInstance(copy, ImageStore)
+        self.assertEqual(copy.get_named("d")["name"], "d")
+
+    def test_threads(self):
+        """Images stored from several threads are all indexed and kept in budget"""
+        image = random_image((50, 40, 3))
+        store = ImageStore(budget=image.nbytes * 4)
+
+        def store_images(thread):
+            for i in range(20):
+                store.append(dict(name=f"{thread}_{i}", image=image.copy()))
+                store.remove_named(f"{thread}_{i - 1}")
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(store_images, range(4)))
+        self.assertEqual(len(store), 4)
+        self.assertEqual(sorted(store._index), sorted(dic["name"] for dic in store))
+        self.assertLessEqual(store.memory_size, store.budget)
+        self.assertEqual(store._memory_size, store.memory_size)
+
+
+if __name__ == "__main__":
+    unittest.main()
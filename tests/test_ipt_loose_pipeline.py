@@ -1,7 +1,10 @@
 import os
 import sys
+import shutil
+import tempfile
 import numpy as np
 import unittest
+from unittest import mock
 
 abspath = os.path.abspath(__file__)
 fld_name = os.path.dirname(abspath)
@@ -9,8 +12,14 @@ sys.path.insert(0, fld_name)
 sys.path.insert(0, os.path.dirname(fld_name))
 sys.path.insert(0, os.path.join(os.path.dirname(fld_name), "ipso_phen", ""))
 
+import ipso_phen.ipapi.base.ip_common as ipc
 from ipso_phen.ipapi.base.ip_abstract import BaseImageProcessor
 from ipso_phen.ipapi.base.ipt_loose_pipeline import LoosePipeline
+from ipso_phen.ipapi.tools.image_cache import ImageCache
+from ipso_phen.ipapi.tools.comand_line_wrapper import ArgWrapper
+from ipso_phen.ipapi.ipt.ipt_threshold_otsu import IptOtsu
+from ipso_phen.ipapi.ipt.ipt_clean_horizontal_noise import IptCleanHorizontalNoise
+from ipso_phen.ipapi.ipt.ipt_heliasen_quality_control import IptHeliasenQualityControl
 
 
 class TestIptKeepCountoursNearRois(unittest.TestCase):
@@ -151,6 +160,170 @@ class TestIptKeepCountoursNearRois(unittest.TestCase):
             len(wrapper.csv_data_holder.data_list), 0, "Non features extracted"
         )
 
+    def test_parallel_branches(self):
+        """Loose pipeline: Concurrent merge groups branches give the same result"""
+        results = []
+        for parallel_branches in [False, True]:
+            pipeline = LoosePipeline.load(
+                os.path.join(
+                    self.pipeline_dir_path,
+                    "sample_pipeline_arabidopsis.json",
+                )
+            )
+            pipeline.parallel_branches = parallel_branches
+            pipeline.debug_mode = True
+            wrapper = BaseImageProcessor(
+                os.path.join(
+                    os.path.dirname(__file__),
+                    "..",
+                    "ipso_phen",
+                    "ipapi",
+                    "samples",
+                    "images",
+                    "arabido_small.jpg",
+                ),
+                database=None,
+            )
+            self.assertTrue(pipeline.execute(src_image=wrapper, silent_mode=True))
+            results.append(
+                (
+                    dict(wrapper.csv_data_holder.data_list),
+                    wrapper.mask,
+                    [dic["name"] for dic in wrapper.image_list],
+                )
+            )
+        self.assertEqual(results[0][0], results[1][0])
+        self.assertTrue(np.array_equal(results[0][1], results[1][1]))
+        self.assertEqual(results[0][2], results[1][2])
+
+    def test_parallel_branches_failure(self):
+        """Loose pipeline: Branches not started are cancelled when one raises"""
+        pipeline = LoosePipeline.load(
+            os.path.join(
+                self.pipeline_dir_path,
+                "sample_pipeline_arabidopsis.json",
+            )
+        )
+        pipeline.parallel_branches = True
+        group = next(
+            group
+            for group in pipeline.root.iter_items(types=("groups",))
+            if group.merge_mode == ipc.MERGE_MODE_AND
+        )
+        first, second = [node for node in group.nodes if node.enabled][:2]
+        wrapper = BaseImageProcessor(
+            os.path.join(
+                os.path.dirname(__file__),
+                "..",
+                "ipso_phen",
+                "ipapi",
+                "samples",
+                "images",
+                "arabido_small.jpg",
+            ),
+            database=None,
+        )
+        with mock.patch("os.cpu_count", return_value=1), mock.patch.object(
+            first.tool, "process_wrapper", side_effect=RuntimeError("branch failure")
+        ), mock.patch.object(second.tool, "process_wrapper") as second_process:
+            with self.assertRaises(RuntimeError):
+                pipeline.execute(src_image=wrapper, silent_mode=True)
+        second_process.assert_not_called()
+
+    def test_node_cache(self):
+        """Loose pipeline: Reruns reuse stored node results up to the first change"""
+        cache_root = tempfile.mkdtemp()
+        cache = ImageCache(root=cache_root, min_free_space=0)
+        results = []
+        try:
+            for i in range(3):
+                pipeline = LoosePipeline.load(
+                    os.path.join(
+                        self.pipeline_dir_path,
+                        "sample_pipeline_arabidopsis.json",
+                    )
+                )
+                modules = list(pipeline.root.iter_items(types=("modules",)))
+                if i == 2:
+                    modules[-1].tool.set_value_of("perimeter", 0)
+                wrapper = BaseImageProcessor(
+                    os.path.join(
+                        os.path.dirname(__file__),
+                        "..",
+                        "ipso_phen",
+                        "ipapi",
+                        "samples",
+                        "images",
+                        "arabido_small.jpg",
+                    ),
+                    database=None,
+                )
+                with mock.patch(
+                    "ipso_phen.ipapi.base.ipt_loose_pipeline.get_node_cache",
+                    return_value=cache,
+                ):
+                    pipeline.execute(
+                        src_image=wrapper,
+                        silent_mode=True,
+                        options=ArgWrapper(node_cache=True),
+                    )
+                results.append((dict(wrapper.csv_data_holder.data_list), wrapper.mask))
+                if i == 0:
+                    cached_count = cache.get_stats()["writes"]
+            self.assertEqual(results[0][0], results[1][0])
+            self.assertTrue(np.array_equal(results[0][1], results[1][1]))
+            self.assertNotIn("perimeter", results[2][0])
+            stats = cache.get_stats()
+            self.assertEqual(stats["hits"], cached_count * 2 - 1)
+            self.assertEqual(stats["writes"], cached_count + 1)
+        finally:
+            cache.close()
+            shutil.rmtree(cache_root)
+
+    def test_node_cache_data_output(self):
+        """Loose pipeline: Cached nodes restore the data read by downstream tools"""
+        cache_root = tempfile.mkdtemp()
+        cache = ImageCache(root=cache_root, min_free_space=0)
+        pipeline = LoosePipeline()
+        pipeline.add_module(IptOtsu(channel="l"))
+        pipeline.add_module(IptCleanHorizontalNoise(min_line_size=4))
+        pipeline.add_module(IptHeliasenQualityControl())
+        data_outputs = []
+        try:
+            for i in range(2):
+                # Only the last node changes, the others come from the cache
+                run = pipeline.copy()
+                modules = list(run.root.iter_items(types=("modules",)))
+                modules[-1].tool.set_value_of("binary_error", i)
+                wrapper = BaseImageProcessor(
+                    os.path.join(
+                        os.path.dirname(__file__),
+                        "..",
+                        "ipso_phen",
+                        "ipapi",
+                        "samples",
+                        "images",
+                        "arabido_small.jpg",
+                    ),
+                    database=None,
+                )
+                with mock.patch(
+                    "ipso_phen.ipapi.base.ipt_loose_pipeline.get_node_cache",
+                    return_value=cache,
+                ):
+                    run.execute(
+                        src_image=wrapper,
+                        silent_mode=True,
+                        options=ArgWrapper(node_cache=True),
+                    )
+                data_outputs.append(dict(wrapper.data_output))
+            self.assertEqual(cache.get_stats()["hits"], 2)
+            self.assertIn("hor_pixels_removed", data_outputs[1])
+            self.assertEqual(data_outputs[0], data_outputs[1])
+        finally:
+            cache.close()
+            shutil.rmtree(cache_root)
+
 
 if __name__ == "__main__":
     unittest.main()
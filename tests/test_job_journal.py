@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from ipso_phen.ipapi.base.pipeline_processor import (
+    PipelineProcessor,
+    _execute_pipeline,
+)
+from ipso_phen.ipapi.base.ipt_loose_pipeline import LoosePipeline
+from ipso_phen.ipapi.tools.job_journal import (
+    JobJournal,
+    JOB_OK,
+    JOB_FAILED,
+    get_pipeline_hash,
+)
+
+SAMPLES_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "ipso_phen", "ipapi", "samples", ""
+)
+
+
+class TestJobJournal(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_filter_pending(self):
+        """Only items successfully processed by the same pipeline are filtered"""
+        journal = JobJournal(os.path.join(self.root, "journal.sqlite"))
+        journal.record(item="a.jpg", status=JOB_OK, pipeline_hash="h1")
+        journal.record(item=("b.jpg", "luid_b"), status=JOB_FAILED, pipeline_hash="h1")
+        items = ["a.jpg", ("b.jpg", "luid_b"), "c.jpg"]
+        self.assertEqual(journal.filter_pending(items, "h1"), items[1:])
+        self.assertEqual(journal.filter_pending(items, "h2"), items)
+        self.assertEqual(journal.get_status("b.jpg")["luid"], "luid_b")
+        self.assertIsNone(journal.get_status("c.jpg"))
+        journal.close()
+
+    def test_resume(self):
+        """Processor skips items done by the same pipeline, reruns others"""
+        image = os.path.join(SAMPLES_PATH, "images", "arabido_small.jpg")
+        pp = PipelineProcessor(database=None, dst_path=self.root, report_progress=False)
+        pp.script = LoosePipeline.load(
+            os.path.join(SAMPLES_PATH, "pipelines", "sample_pipeline_arabidopsis.json")
+        )
+        self.assertEqual(pp.filter_processed_groups([image]), [image])
+        pp.process_groups([image])
+        self.assertEqual(pp.job_journal.get_status(image)["status"], JOB_OK)
+
+        self.assertEqual(pp.filter_processed_groups([image]), [])
+        pp.script.description = "Modified pipeline"
+        self.assertEqual(pp.filter_processed_groups([image]), [image])
+        self.assertFalse(pp.options.overwrite)
+        with mock.patch(
+            "ipso_phen.ipapi.base.pipeline_processor._execute_pipeline",
+            wraps=_execute_pipeline,
+        ) as execute:
+            pp.process_groups([image], overwrite=True)
+        self.assertIs(execute.call_args.kwargs["overwrite"], True)
+        self.assertEqual(pp.filter_processed_groups([image]), [])
+        pp.job_journal.close()
+
+    def test_columnar_sink(self):
+        """Runs collecting rows in memory are neither recorded nor resumed"""
+        image = os.path.join(SAMPLES_PATH, "images", "arabido_small.jpg")
+        pp = PipelineProcessor(
+            database=None,
+            dst_path=self.root,
+            report_progress=False,
+            result_sink="parquet",
+        )
+        pp.script = LoosePipeline.load(
+            os.path.join(SAMPLES_PATH, "pipelines", "sample_pipeline_arabidopsis.json")
+        )
+        pp.process_groups([image])
+        self.assertEqual(len(pp.result_sink), 1)
+        self.assertIsNone(pp.job_journal.get_status(image))
+
+        pp.job_journal.record(
+            item=image, status=JOB_OK, pipeline_hash=get_pipeline_hash(pp.script)
+        )
+        self.assertFalse(pp.can_resume)
+        self.assertEqual(pp.filter_processed_groups([image]), [image])
+        pp.job_journal.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
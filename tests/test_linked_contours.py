@@ -0,0 +1,81 @@
+import unittest
+
+import cv2
+import numpy as np
+
+import ipso_phen.ipapi.base.ip_common as ipc
+from ipso_phen.ipapi.base.ip_abstract import BaseImageProcessor
+
+
+def noisy_mask():
+    rng = np.random.default_rng(0)
+    mask = np.zeros((200, 260), np.uint8)
+    cv2.circle(mask, (130, 120), 40, 255, -1)
+    cv2.circle(mask, (130, 120), 10, 0, -1)
+    cv2.circle(mask, (130, 120), 3, 255, -1)
+    cv2.circle(mask, (40, 40), 20, 255, 3)
+    cv2.circle(mask, (40, 40), 5, 255, -1)
+    for x, y, r in rng.integers((0, 0, 1), (260, 200, 8), (60, 3)):
+        cv2.circle(mask, (int(x), int(y)), int(r), 255, -1)
+    return mask
+
+
+def get_hulls(mask):
+    contours = ipc.get_contours(
+        mask=mask, retrieve_mode=cv2.RETR_LIST, method=cv2.CHAIN_APPROX_SIMPLE
+    )
+    return [
+        cv2.approxPolyDP(cnt, 0.001 * cv2.arcLength(cnt, True), True)
+        for cnt in contours
+    ]
+
+
+class TestLinkedContours(unittest.TestCase):
+    def setUp(self):
+        self.wrapper = BaseImageProcessor(
+            "./ipso_phen/ipapi/samples/images/arabido_small.jpg",
+            database=None,
+        )
+        self.mask = noisy_mask()
+
+    def test_classify_hulls(self):
+        """Hulls compared in bulk get the same classification as one at a time"""
+        hulls = get_hulls(self.mask)
+        master = max(hulls, key=cv2.contourArea)
+        for dilation_iter, tolerance_distance, tolerance_area in [
+            (0, 0, 0),
+            (0, 12, 30),
+            (-1, 30, 100),
+        ]:
+            kwargs = dict(
+                mask=self.mask,
+                tolerance_area=tolerance_area,
+                tolerance_distance=tolerance_distance,
+                dilation_iter=dilation_iter,
+                area_override_size=500,
+            )
+            results = self.wrapper.classify_hulls(
+                cmp_hulls=hulls, master_hulls=[master], **kwargs
+            )
+            expected = [
+                self.wrapper.check_hull(cmp_hull=hull, master_hull=master, **kwargs)
+                for hull in hulls
+            ]
+            self.assertEqual(results, expected)
+
+    def test_keep_linked_contours(self):
+        """Fragments far from the main blob are removed"""
+        mask = self.wrapper.keep_linked_contours(
+            src_image=cv2.cvtColor(self.mask, cv2.COLOR_GRAY2BGR),
+            src_mask=self.mask.copy(),
+            tolerance_distance=5,
+            tolerance_area=50,
+            roi=None,
+        )
+        self.assertEqual(mask[120, 130], 255)
+        self.assertEqual(mask[40, 40], 0)
+        self.assertLess(np.count_nonzero(mask), np.count_nonzero(self.mask))
+
+
+if __name__ == "__main__":
+    unittest.main()
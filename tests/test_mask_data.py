@@ -0,0 +1,128 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from ipso_phen.ipapi.base.ip_common import (
+    MaskData,
+    MaskLineData,
+    remove_horizontal_noise_pass,
+)
+
+
+class TestMaskData(unittest.TestCase):
+    def setUp(self):
+        img = cv2.imread("./ipso_phen/ipapi/samples/images/arabido_small.jpg")
+        self.mask = cv2.inRange(
+            cv2.cvtColor(img, cv2.COLOR_BGR2HSV), (30, 40, 40), (90, 255, 255)
+        )
+        self.mask[:20] = 0
+        self.mask[-20:] = 0
+        self.mask[300] = 0
+        self.mask_data = MaskData(self.mask)
+
+    def test_lines_data(self):
+        """Lines match those built one by one, from first to last non empty line"""
+        rows = np.flatnonzero(np.count_nonzero(self.mask, axis=1))
+        md = self.mask_data
+        self.assertEqual((md.top_index, md.bottom_index), (rows[0], rows[-1]))
+        self.assertEqual(len(md.lines_data), rows[-1] - rows[0] + 1)
+        last_span = 0
+        for ld in md.lines_data:
+            expected = MaskLineData(ld.height_pos, self.mask[ld.height_pos], last_span)
+            last_span = expected.nz_span
+            self.assertEqual(ld, expected)
+            self.assertEqual(
+                (ld.nz_span, ld.nz_count, ld.solidity, ld.last_span),
+                (
+                    expected.nz_span,
+                    expected.nz_count,
+                    expected.solidity,
+                    expected.last_span,
+                ),
+            )
+        self.assertIsNone(md.find_by_height(rows[0] - 1))
+        self.assertIsNone(md.find_by_height(rows[-1] + 1))
+        self.assertIs(md.find_by_height(300), md.lines_data[300 - rows[0]])
+        self.assertEqual(md.area, np.count_nonzero(self.mask))
+
+    def test_to_mask(self):
+        """Mask is rebuilt from lines data"""
+        self.assertTrue(np.array_equal(self.mask_data.to_mask(), self.mask))
+        quantiles = [self.mask_data.height_quantile_mask(3, i) for i in range(3)]
+        self.assertTrue(
+            np.array_equal(quantiles[0] | quantiles[1] | quantiles[2], self.mask)
+        )
+        self.assertFalse(np.any(quantiles[0] & quantiles[1]))
+
+    def test_width_quantile_stats(self):
+        """Width statistics use spans and counts of each line"""
+        md = self.mask_data
+        spans = np.array([ld.nz_span for ld in md.lines_data])
+        area, hull, solidity, min_, max_, avg, std = md.width_quantile_stats(
+            1, 0, tag=0
+        )
+        self.assertEqual(area, np.count_nonzero(self.mask))
+        self.assertEqual(hull, spans.sum())
+        self.assertEqual((min_, max_), (0, md.width))
+        self.assertAlmostEqual(avg, spans.mean())
+        self.assertAlmostEqual(std, spans.std())
+        self.assertTrue(all(ld.tag == 0 for ld in md.lines_data))
+
+    def test_merge(self):
+        """Line merges work on positions"""
+        line1 = MaskLineData(0, np.array([0, 1, 1, 0, 1, 0]), 0)
+        line2 = MaskLineData(1, np.array([1, 1, 0, 0, 1, 1]), 0)
+        self.assertFalse(line1.is_inside(line2))
+        line = MaskLineData(2, np.array([0, 1, 0, 0, 1, 0]), 0)
+        self.assertTrue(line.is_inside(line1))
+        line.merge_and(line1, line2)
+        self.assertListEqual(list(line.nz_pos), [1, 4])
+        line.merge_or(line1, line2)
+        self.assertListEqual(list(line.nz_pos), [0, 1, 2, 4, 5])
+        self.assertEqual((line.nz_span, line.nz_count), (6, 5))
+
+    def test_remove_horizontal_noise(self):
+        """Noise removal pass matches line by line removal"""
+
+        def remove_lines(c, min_line_size, fully_isolated):
+            all_lines = []
+            msk_data = MaskData(mask=c)
+            for l in msk_data.lines_data:
+                if (l.solidity >= 0.99) and (l.nz_span >= msk_data.mask_width - 4):
+                    ld_up, ld_down = msk_data.find_top_bottom_non_full_lines(
+                        l.height_pos
+                    )
+                    l.merge_or(ld_up, ld_down)
+                    all_lines.append([(l.height_pos, 0, msk_data.mask_width)])
+                    c[l.height_pos] = 0
+                    c[l.height_pos][l.nz_pos.astype(int)] = 255
+                else:
+                    lines = msk_data.horizontal_lines_at(
+                        l.height_pos, min_line_size, fully_isolated
+                    )
+                    if lines:
+                        all_lines.append(lines)
+                        for line in lines:
+                            c[line[0], line[1] : line[2] + 1] = 0
+            return all_lines
+
+        mask = self.mask.copy()
+        mask[100, 50:400] = 255
+        mask[200, 10:] = 255
+        mask[250] = 255
+        for min_line_size in [5, 20]:
+            for fully_isolated in [True, False]:
+                expected_mask = mask.copy()
+                expected = remove_lines(expected_mask, min_line_size, fully_isolated)
+                cleaned_mask = mask.copy()
+                lines, stable = remove_horizontal_noise_pass(
+                    cleaned_mask, min_line_size, fully_isolated
+                )
+                self.assertListEqual(lines, expected)
+                self.assertTrue(np.array_equal(cleaned_mask, expected_mask))
+                self.assertFalse(stable)
+
+
+if __name__ == "__main__":
+    unittest.main()
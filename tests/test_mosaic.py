@@ -0,0 +1,52 @@
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+from ipso_phen.ipapi.base.ip_abstract import BaseImageProcessor
+
+
+class TestMosaic(unittest.TestCase):
+    def setUp(self):
+        self.wrapper = BaseImageProcessor(
+            "./ipso_phen/ipapi/samples/images/arabido_small.jpg",
+            database=None,
+        )
+        gray = cv2.cvtColor(self.wrapper.current_image, cv2.COLOR_BGR2GRAY)
+        self.wrapper.mask = np.where(gray > 90, 255, 0).astype(np.uint8)
+
+    def test_images_dict(self):
+        """Images found in images_dict are not retrieved"""
+        with mock.patch.object(
+            self.wrapper, "retrieve_stored_image", return_value=None
+        ) as retrieve:
+            self.wrapper.build_mosaic(
+                image_names=[["source", "mask"]],
+                images_dict={"source": self.wrapper.current_image},
+            )
+        retrieve.assert_called_once()
+        self.assertEqual(retrieve.call_args[0][0], "mask")
+
+    def test_thumbnail(self):
+        """Mosaics fit max_width and generated tiles are drawn at tile size"""
+        image_names = [["source", "mask_on_exp_fixed_bw_with_morph"]]
+        full = self.wrapper.build_mosaic(image_names=image_names)
+        self.assertEqual(full.shape[1], self.wrapper.width * 2 + 6)
+
+        thumbnail = self.wrapper.build_mosaic(image_names=image_names, max_width=300)
+        self.assertLessEqual(thumbnail.shape[1], 300)
+        self.assertAlmostEqual(
+            thumbnail.shape[0] / thumbnail.shape[1],
+            full.shape[0] / full.shape[1],
+            places=1,
+        )
+
+        tile = self.wrapper.retrieve_stored_image(
+            "mask_on_exp_fixed_bw", target_size=(100, 100)
+        )
+        self.assertLessEqual(max(tile.shape[:2]), 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
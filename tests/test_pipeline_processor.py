@@ -1,9 +1,24 @@
 import os
 import shutil
 import unittest
+from unittest import mock
+from importlib.util import find_spec
+import multiprocessing as mp
 
-from ipso_phen.ipapi.base.pipeline_launcher import launch
+import pandas as pd
 
+from ipso_phen.ipapi.base.pipeline_launcher import launch
+from ipso_phen.ipapi.base.pipeline_processor import (
+    PipelineProcessor,
+    get_worker_pool,
+    close_worker_pool,
+    get_worker_count,
+    get_available_memory,
+    MIN_WORKER_MEMORY,
+    _execute_pipeline,
+)
+from ipso_phen.ipapi.base.ipt_loose_pipeline import LoosePipeline
+from ipso_phen.ipapi.tools.comand_line_wrapper import ArgWrapper
 
 ROOT_PATH = os.path.join(os.path.dirname(__file__), "")
 
@@ -34,6 +49,151 @@ class TestPipelineProcessor(unittest.TestCase):
         )
         self.assertTrue(os.path.isfile(os.path.join(dst_fld, f"{csv_file}.csv")))
 
+    def test_worker_pool_reuse(self):
+        """Worker pool is reused while the pipeline does not change"""
+        pipeline = LoosePipeline.load(
+            os.path.join(
+                ROOT_PATH,
+                "..",
+                "ipso_phen",
+                "ipapi",
+                "samples",
+                "pipelines",
+                "test_cleaners.json",
+            )
+        )
+        options = ArgWrapper(dst_path=os.path.join(ROOT_PATH, "output_files", ""))
+        try:
+            pool = get_worker_pool(
+                processes=2, options=options, script=pipeline, database=None
+            )
+            self.assertIs(
+                pool,
+                get_worker_pool(
+                    processes=2, options=options, script=pipeline, database=None
+                ),
+            )
+            pipeline.description = "Modified pipeline"
+            self.assertIsNot(
+                pool,
+                get_worker_pool(
+                    processes=2, options=options, script=pipeline, database=None
+                ),
+            )
+        finally:
+            close_worker_pool()
+
+    def test_worker_count(self):
+        """Worker count is bound by requested processes, items and memory"""
+        self.assertEqual(get_worker_count(requested=64, items_count=100), 64)
+        self.assertEqual(get_worker_count(requested=64, items_count=3), 3)
+        self.assertEqual(
+            get_worker_count(
+                requested=64,
+                items_count=100,
+                peak_memory=get_available_memory() // 4,
+            ),
+            3,
+        )
+        self.assertEqual(
+            get_worker_count(
+                requested=64,
+                items_count=100,
+                peak_memory=get_available_memory() * 2,
+            ),
+            1,
+        )
+
+    def test_requested_workers(self):
+        """0 and False process sequentially, True uses all cores"""
+        pp = PipelineProcessor(database=None, dst_path="", report_progress=False)
+        for multi_thread, expected in [
+            (0, 1),
+            (False, 1),
+            (1, 1),
+            (3, 3),
+            (True, mp.cpu_count()),
+        ]:
+            pp.multi_thread = multi_thread
+            self.assertEqual(pp.get_requested_workers(), expected)
+
+    def test_probe_memory(self):
+        """Probed memory is never below the minimal worker estimate"""
+        pp = PipelineProcessor(database=None, dst_path="", report_progress=False)
+        with mock.patch(
+            "ipso_phen.ipapi.base.pipeline_processor._execute_pipeline",
+            return_value="done",
+        ):
+            res, peak_memory = pp.probe_memory(item="", db=None)
+        self.assertEqual(res, "done")
+        self.assertGreaterEqual(peak_memory, MIN_WORKER_MEMORY)
+
+    def test_mosaic_max_width(self):
+        """Mosaics are full size unless a maximal width is set"""
+        script = mock.Mock()
+        script.execute.return_value = True
+        _execute_pipeline("image.jpg", ArgWrapper(), script, None)
+        self.assertEqual(script.execute.call_args.kwargs["mosaic_max_width"], 0)
+        _execute_pipeline("image.jpg", ArgWrapper(mosaic_max_width=640), script, None)
+        self.assertEqual(script.execute.call_args.kwargs["mosaic_max_width"], 640)
+
+    def test_merge_result_files(self):
+        """Partial results with different columns are merged in a single file"""
+        dst_fld = os.path.join(ROOT_PATH, "output_files", "test_merge", "")
+        if os.path.isdir(dst_fld):
+            shutil.rmtree(dst_fld)
+        pp = PipelineProcessor(database=None, dst_path=dst_fld, report_progress=False)
+        os.makedirs(pp.options.partials_path)
+        partials = [
+            pd.DataFrame({"area": [10], "plant": ["p2"], "date_time": ["2020-01-02"]}),
+            pd.DataFrame({"plant": ["p1"], "date_time": ["2020-01-01"], "height": [5]}),
+            pd.DataFrame({"experiment": ["exp"], "plant": ["p1"], "area": [3]}),
+        ]
+        for i, df in enumerate(partials):
+            df.to_csv(
+                os.path.join(pp.options.partials_path, f"{i}_result.csv"), index=False
+            )
+        open(os.path.join(pp.options.partials_path, "3_result.csv"), "w").close()
+
+        df = pp.merge_result_files(csv_file_name="merged.csv")
+        self.assertEqual(
+            list(df.columns), ["experiment", "plant", "date_time", "area", "height"]
+        )
+        self.assertEqual(list(df.plant), ["p1", "p1", "p2"])
+        self.assertEqual(
+            len(pd.read_csv(os.path.join(pp.options.dst_path, "merged.csv"))), 3
+        )
+        shutil.rmtree(dst_fld)
+
+    def test_columnar_result_sink(self):
+        """Columnar sinks collect results in memory, no partial file is written"""
+        dst_fld = os.path.join(ROOT_PATH, "output_files", "test_result_sink", "")
+        if os.path.isdir(dst_fld):
+            shutil.rmtree(dst_fld)
+        samples_fld = os.path.join(ROOT_PATH, "..", "ipso_phen", "ipapi", "samples")
+        pp = PipelineProcessor(
+            database=None,
+            dst_path=dst_fld,
+            overwrite=True,
+            result_sink="feather",
+            report_progress=False,
+        )
+        pp.script = LoosePipeline.load(
+            os.path.join(samples_fld, "pipelines", "sample_pipeline_arabidopsis.json")
+        )
+        pp.process_groups([os.path.join(samples_fld, "images", "arabido_small.jpg")])
+        self.assertEqual(len(pp.result_sink), 1)
+        self.assertEqual(os.listdir(pp.options.partials_path), [])
+
+        df = pp.merge_result_files(csv_file_name="merged.csv")
+        self.assertEqual(len(df), 1)
+        self.assertTrue(os.path.isfile(os.path.join(dst_fld, "merged.csv")))
+        if find_spec("pyarrow") is not None:
+            self.assertTrue(
+                pd.read_feather(os.path.join(dst_fld, "merged.feather")).equals(df)
+            )
+        shutil.rmtree(dst_fld)
+
 
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
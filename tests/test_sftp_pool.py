@@ -0,0 +1,98 @@
+import os
+import unittest
+
+from ipso_phen.ipapi.database.sftp_pool import SftpConnectionPool, SftpPrefetcher
+
+
+ROOT_PATH = os.path.join(os.path.dirname(__file__), "")
+
+
+class LocalSftpFile:
+    def __init__(self, path):
+        self._file = open(path, "rb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._file.close()
+
+    def stat(self):
+        return os.stat(self._file.fileno())
+
+    def prefetch(self, file_size):
+        pass
+
+    def set_pipelined(self):
+        pass
+
+    def read(self):
+        return self._file.read()
+
+
+class LocalSftpConnect:
+    """Stand in for LipmCalculConnect serving files from a local folder"""
+
+    opened = 0
+
+    def __init__(self, target_ftp: bool) -> None:
+        self._target_ftp = target_ftp
+        self.alive = False
+
+    def get_connexion(self):
+        LocalSftpConnect.opened += 1
+        self.alive = True
+        return self
+
+    def release_connexion(self):
+        self.alive = False
+
+    def is_alive(self):
+        return self.alive
+
+    def open(self, path):
+        return LocalSftpFile(os.path.join(ROOT_PATH, "input_files", path))
+
+
+class TestSftpPool(unittest.TestCase):
+    def setUp(self):
+        LocalSftpConnect.opened = 0
+        self.file_name = "plant001_rgb.png"
+        with open(os.path.join(ROOT_PATH, "input_files", self.file_name), "rb") as f:
+            self.data = f.read()
+
+    def test_connexion_reuse(self):
+        """Consecutive downloads share one connection, dead ones are replaced"""
+        pool = SftpConnectionPool(connexion_factory=LocalSftpConnect)
+        for _ in range(3):
+            self.assertEqual(pool.read_file(self.file_name, True), self.data)
+        self.assertEqual(LocalSftpConnect.opened, 1)
+
+        connexion, sftp = pool.acquire(target_ftp=True)
+        connexion.alive = False
+        pool.release(True, connexion, sftp)
+        self.assertEqual(pool.read_file(self.file_name, True), self.data)
+        self.assertEqual(LocalSftpConnect.opened, 2)
+
+        with self.assertRaises(FileNotFoundError):
+            pool.read_file("missing.jpg", True)
+        pool.close()
+
+    def test_prefetch(self):
+        """Prefetched files are served from memory"""
+        pool = SftpConnectionPool(connexion_factory=LocalSftpConnect)
+        prefetcher = SftpPrefetcher(pool=pool)
+        prefetcher.prefetch([(self.file_name, True)])
+        self.assertTrue(prefetcher.is_pending(self.file_name, True))
+        self.assertEqual(prefetcher.read_file(self.file_name, True), self.data)
+        self.assertFalse(prefetcher.is_pending(self.file_name, True))
+
+        prefetcher.prefetch([(self.file_name, True)])
+        prefetcher.prefetch([])
+        self.assertFalse(prefetcher.is_pending(self.file_name, True))
+        prefetcher.close()
+        pool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()